@@ -1,19 +1,20 @@
-import sys, getopt
+import sys, getopt, glob
 from galileo_has_decoder import conv
 from galileo_has_decoder.utils import bidict
 optDict = bidict({"s":"source", "t":"target", "f":"outFormat", "i":"modeIn", "o":"modeOut", "p":"port", "b":"baudrate", "v":"verbose", "m":"mute", "h":"help"})
 
 def printHelp():
     print("The HAS_Decoder.py offers easy access to most of the functionalities of the Galileo HAS Decoder. Below, available arguments are presented. For more options, please refer to the library documentation.\n")
-    print("Usage: python3 HAS_Decoder.py -s SOURCE -t TARGET -f OUTFORMAT [-i MODEIN -o MODEOUT -p PORT -b BAUDRATE -x MESSAGES -v VERBOSELEVEL --skip SKIPPERCENT --mute]\n")
+    print("Usage: python3 HAS_Decoder.py -s SOURCE -t TARGET -f OUTFORMAT [-i MODEIN -o MODEOUT -p PORT -b BAUDRATE -x MESSAGES -v VERBOSELEVEL --skip SKIP --skip-bytes BYTES --index --workers WORKERS --shards SHARDS --pipeline --policy POLICY --latency SECONDS --metrics PORT --profile PROFILER --profile-out FILE --mute]\n")
     print("-s arg    : Source stream to decode messages from")
     print("-t arg : Target stream to decode messages to")
     print("-f opt : Format to convert HAS messages to. Options are [1:IGS, 2:RTCM3]")
     print("-i opt : Input mode, specifying the type of input stream. Options are :",
-        "\n         [1:SBF File, 2:BINEX File, 3:SBF Serial, 4:BINEX Serial, 5:SBF TCP, 6:BINEX TCP]")
+        "\n         [1:SBF File, 2:BINEX File, 3:SBF Serial, 4:BINEX Serial, 5:SBF TCP, 6:BINEX TCP,",
+        "\n          7:SBF TCP client (asyncio), 8:BINEX TCP client (asyncio), 9:SBF TCP listener (asyncio), 10:BINEX TCP listener (asyncio)]")
     print("-o opt : Output mode, specifying the type of output stream. Options are:",
-        "\n         [1:TCP, 2:File, 3:PPPWiz File, 4:PPPWiz Stream]")
-    print("-p arg : Optional for TCP output. If not set, uses port 6947")
+        "\n         [1:TCP, 2:File, 3:PPPWiz File, 4:PPPWiz Stream, 5:NTRIP Caster]")
+    print("-p arg : Optional for TCP or NTRIP output. If not set, uses port 6947 (TCP) or 2101 (NTRIP)")
     print("-b arg : Optional for serial input, specifying the baudrate of the stream. If not set, uses 115200")
     print("-v arg : Optional, specifying the verbose level for the process")
     print("-m     : Optional, used to mute verbose-independent messages")
@@ -22,58 +23,98 @@ def printHelp():
     print("--target arg    : Target stream to decode messages to")
     print("--outFormat opt : Format to convert HAS messages to. Options are [1:IGS, 2:RTCM3]")
     print("--modeIn opt    : Input mode, specifying the type of input stream. Options are :",
-        "\n                  [1:SBF File, 2:BINEX File, 3:SBF Serial, 4:BINEX Serial, 5:SBF TCP, 6:BINEX TCP]")
+        "\n                  [1:SBF File, 2:BINEX File, 3:SBF Serial, 4:BINEX Serial, 5:SBF TCP, 6:BINEX TCP,",
+        "\n                   7:SBF TCP client (asyncio), 8:BINEX TCP client (asyncio), 9:SBF TCP listener (asyncio), 10:BINEX TCP listener (asyncio)]")
     print("--modeOut opt   : Output mode, specifying the type of output stream. Options are:",
-        "\n                  [1:TCP, 2:File, 3:PPPWiz File, 4:PPPWiz Stream]")
-    print("--port arg      : Optional for TCP output. If not set, uses port 6947")
+        "\n                  [1:TCP, 2:File, 3:PPPWiz File, 4:PPPWiz Stream, 5:NTRIP Caster]")
+    print("--port arg      : Optional for TCP or NTRIP output. If not set, uses port 6947 (TCP) or 2101 (NTRIP)")
     print("--baudrate arg  : Optional for serial input, specifying the baudrate of the stream. If not set, uses 115200")
-    print("--skip arg      : Optional, used to skip some initial portion of a read file.")
+    print("--skip arg      : Optional, used to skip some initial portion of a read file, as fraction 0.0-1.0 of the file (1.0: all of it).")
+    print("--skip-bytes arg : Optional, number of bytes to skip at the start of a read file (added to --skip).")
+    print("--workers arg   : Optional for several source files (comma-separated or a quoted glob pattern), number of worker processes. If not set, uses all CPUs (1 with --profile cprofile|pyinstrument)")
+    print("--shards arg    : Optional for a single SBF/BINEX source file, number of shards read in parallel processes")
+    print("--index         : Optional for SBF file input, reads via a block index kept next to the file (FILE.idx.npy).")
+    print("--pipeline      : Optional for file, serial and TCP input, decodes, converts and outputs in a pipeline of threads")
+    print("--policy opt    : Optional with --pipeline, for full encode/write queues (pages are never dropped before decoding). Options are: [block, drop]. If not set, uses block")
+    print("--latency arg   : Optional, measures the latency of every HAS message from page arrival to output, printing its percentiles every arg seconds (0: on exit)")
+    print("--metrics arg   : Optional, serves Prometheus metrics of the converter on http://localhost:arg/metrics (or ADDRESS:PORT)")
+    print("--profile opt   : Optional, profiles the conversion, written on exit and on SIGUSR1. Options are: [cprofile, pyinstrument, stages]")
+    print("--profile-out arg : Optional with --profile, the profile file. If not set, uses haslib.prof (cprofile) or haslib.speedscope.json (pyinstrument)")
     print("--verbose arg   : Optional, specifying the verbose level for the process")
     print("--mute          : Optional, used to mute verbose-independent messages")
     print("--help          : Displaying this help message")
     exit()
 
-try:
-    options, remainder = getopt.getopt(sys.argv[1:], 's:t:f:i:o:p:b:x:v:hm:mm:', ['source=', 
-                                                        'target=',
-                                                        'outFormat=',
-                                                        'modeIn=',
-                                                        'modeOut=',
-                                                        'port=',
-                                                        'baudrate=',
-                                                        'verbose=',
-                                                        'skip=',
-                                                        'help',
-                                                        'mute',
-                                                        ])
-except getopt.GetoptError:
-    raise Exception("Options not recognized. Correct usage:\nHAS_Decoder.py -s SOURCE -t TARGET -f OUTFORMAT [-i MODEIN -o MODEOUT -p PORT -b BAUDRATE -x MESSAGES]")
-opts = {}
-adds = {}
-for o in options:
-    if len(o[0]) > 2:
-        try:
-            opts[optDict.inverse[o[0][2:]][0]] = o[1]
-        except KeyError:
-            adds[o[0][2:]] = o[1]
-    else:
-        opts[o[0][1:]] = o[1]
-inputs = opts.keys()
-if "h" in inputs:
-    printHelp()
+if __name__ == "__main__":
+    #Guarded, worker processes of a batch may import this module
+    try:
+        options, remainder = getopt.getopt(sys.argv[1:], 's:t:f:i:o:p:b:x:v:hm:mm:', ['source=', 
+                                                            'target=',
+                                                            'outFormat=',
+                                                            'modeIn=',
+                                                            'modeOut=',
+                                                            'port=',
+                                                            'baudrate=',
+                                                            'verbose=',
+                                                            'skip=',
+                                                            'skip-bytes=',
+                                                            'index',
+                                                            'workers=',
+                                                        'shards=',
+                                                            'pipeline',
+                                                            'policy=',
+                                                            'latency=',
+                                                            'metrics=',
+                                                            'profile=',
+                                                            'profile-out=',
+                                                            'help',
+                                                            'mute',
+                                                            ])
+    except getopt.GetoptError:
+        raise Exception("Options not recognized. Correct usage:\nHAS_Decoder.py -s SOURCE -t TARGET -f OUTFORMAT [-i MODEIN -o MODEOUT -p PORT -b BAUDRATE -x MESSAGES]")
+    opts = {}
+    adds = {}
+    for o in options:
+        if len(o[0]) > 2:
+            try:
+                opts[optDict.inverse[o[0][2:]][0]] = o[1]
+            except KeyError:
+                adds[o[0][2:]] = o[1]
+        else:
+            opts[o[0][1:]] = o[1]
+    inputs = opts.keys()
+    if "h" in inputs:
+        printHelp()
 
-if "s" not in inputs or "t" not in inputs or "f" not in inputs:
-    raise Exception("Too few options. Provide at least a source, a target and a output format. Correct usage:\nconv.py -s SOURCE -t TARGET -f OUTFORMAT [-i MODEIN -o MODEOUT -p PORT -b BAUDRATE -x MESSAGES]")
-args = ["s","t","f","i","o","p"]
-brate = opts["b"] if "b" in opts.keys() else 115200
-skip = adds["skip"] if "skip" in adds.keys() else 0.0
-mute = opts["m"] if "m" in opts.keys() else 0
+    if "s" not in inputs or "t" not in inputs or "f" not in inputs:
+        raise Exception("Too few options. Provide at least a source, a target and a output format. Correct usage:\nconv.py -s SOURCE -t TARGET -f OUTFORMAT [-i MODEIN -o MODEOUT -p PORT -b BAUDRATE -x MESSAGES]")
+    args = ["s","t","f","i","o","p"]
+    brate = opts["b"] if "b" in opts.keys() else 115200
+    skip = float(adds["skip"]) if "skip" in adds.keys() else 0.0
+    skipBytes = int(adds["skip-bytes"]) if "skip-bytes" in adds.keys() else 0
+    mute = opts["m"] if "m" in opts.keys() else 0
+    index = "index" in adds.keys()
+    workers = int(adds["workers"]) if "workers" in adds.keys() else None
+    shards = int(adds["shards"]) if "shards" in adds.keys() else None
+    pipeline = "pipeline" in adds.keys()
+    policy = adds["policy"] if "policy" in adds.keys() else "block"
+    latency = float(adds["latency"]) if "latency" in adds.keys() else None
+    metrics = adds["metrics"] if "metrics" in adds.keys() else None
+    profile = adds["profile"] if "profile" in adds.keys() else None
+    profileOut = adds["profile-out"] if "profile-out" in adds.keys() else None
+    #Several files, comma-separated and/or as quoted glob patterns, are converted as a batch
+    #(several sources of the stream modes are receivers read at once)
+    if ("," in opts["s"] or glob.has_magic(opts["s"])) and int(opts.get("i") or 0) <= 2:
+        opts["s"] = [path for pattern in opts["s"].split(",") for path in (sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern])]
 
-converter = conv.HAS_Converter(*[opts[x] if x in opts.keys() else None for x in args], baudrate=brate, skip=skip, mute=mute)
-if 'h' in inputs or "help" in inputs:
-    #Print help message
-    pass
-if "x" in inputs:
-    converter.convertX(int(opts["x"]), verbose=int(opts["v"]) if "v" in inputs else 0)
-else:
-    converter.convertAll(verbose=int(opts["v"]) if "v" in inputs else 0)
+    converter = conv.HAS_Converter(*[opts[x] if x in opts.keys() else None for x in args], baudrate=brate, skip=skip, index=index, shards=shards, pipeline=pipeline, policy=policy, latency=latency, metrics=metrics, profile=profile, profileOut=profileOut, mute=mute, workers=workers, skipBytes=skipBytes)
+    if 'h' in inputs or "help" in inputs:
+        #Print help message
+        pass
+    if "x" in inputs:
+        converter.convertX(int(opts["x"]), verbose=int(opts["v"]) if "v" in inputs else 0)
+    else:
+        converter.convertAll(verbose=int(opts["v"]) if "v" in inputs else 0)
+    if converter.modeOut == 1 or converter.modeOut == 5:
+        #Sends what is still queued for the TCP or NTRIP clients
+        converter.output.close()
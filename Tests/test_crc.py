@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+'''
+Check of the CRC helpers: the SBF CRC-16-CCITT and the RTCM3 CRC-24Q on the standard check string
+and against bit-wise computations, for all accepted buffer types and in the streaming interface.
+'''
+
+import random
+import numpy as np
+from galileo_has_decoder import crc
+
+CHECK = b"123456789"
+
+def bitwise(data, poly, width):
+  #Non-reflected CRC with initial value 0, one bit at a time
+  top, mask = 1 << (width-1), (1 << width) - 1
+  _crc = 0
+  for b in data:
+    _crc ^= b << (width-8)
+    for i in range(8):
+      _crc = ((_crc << 1) ^ poly if _crc & top else _crc << 1) & mask
+  return _crc
+
+def test_check_values():
+  #CRC-16/XMODEM and CRC-24/OPENPGP without the initial value (as used by SBF and RTCM3)
+  assert crc.compute16CCITT(CHECK) == 0x31C3
+  assert crc.crc24q(CHECK) == 0xCDE703
+  assert crc.compute16CCITT(b"") == 0
+  assert crc.crc24q(b"") == 0
+
+def test_bitwise():
+  rnd = random.Random(7)
+  for n in [1, 2, 3, 53, 500]:
+    data = bytes(rnd.randrange(256) for i in range(n))
+    assert crc.compute16CCITT(data) == bitwise(data, 0x1021, 16)
+    assert crc.crc24q(data) == bitwise(data, 0x864CFB, 24)
+
+def test_buffer_types():
+  #Lists of byte values, numpy arrays, bytearrays and memoryviews, also cut at buf_len
+  data = bytes(range(256))
+  for buf in [list(data), np.frombuffer(data, dtype="u1"), bytearray(data), memoryview(data)]:
+    assert crc.compute16CCITT(buf) == crc.compute16CCITT(data)
+    assert crc.crc24q(buf) == crc.crc24q(data)
+    assert crc.compute16CCITT(buf, 100) == crc.compute16CCITT(data[:100])
+    assert crc.crc24q(buf, 100) == crc.crc24q(data[:100])
+
+def test_streaming():
+  data = bytes(range(256)) * 3
+  for cls, oneShot in [(crc.CRC16CCITT, crc.compute16CCITT), (crc.CRC24Q, crc.crc24q)]:
+    stream = cls(data[:10])
+    copied = stream.copy()
+    stream.update(data[10:300]).update(data[300:])
+    assert stream.value() == oneShot(data)
+    assert stream.digest() == oneShot(data).to_bytes(cls.width//8, "big")
+    assert copied.update(data[10:]).value() == oneShot(data)
+
+if __name__ == "__main__":
+  test_check_values()
+  test_bitwise()
+  test_buffer_types()
+  test_streaming()
+  print("CRC helpers: OK")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+'''
+Check of the GF(256) backends: the native tables have to give the same results as the galois
+package, for the arithmetic and for decoding HAS messages from any set of pages. Skipped without the
+optional galois package.
+'''
+
+import random
+import numpy as np
+import pytest
+from galileo_has_decoder.has_classes import HAS, GF256_Native, GF256_Galois, genMatrix, setGFBackend
+from galileo_has_decoder.utils_testing import constructSSRmsg, encodePages, constructCNAVPage
+
+#The galois backend is optional (pip install galois)
+pytest.importorskip("galois")
+
+def test_arithmetic():
+  native, gal = GF256_Native(), GF256_Galois()
+  rng = np.random.default_rng(4)
+  a, b = rng.integers(0, 256, (2, 256, 256), dtype="u1")
+  assert np.array_equal(native.multiply(a, b), gal.multiply(a, b))
+  A, B = rng.integers(0, 256, (2, 32, 32), dtype="u1")
+  assert np.array_equal(native.matmul(A, B), gal.matmul(A, B))
+  assert np.array_equal(native.matmul(A, B[:, 0]), gal.matmul(A, B[:, 0]))
+  #Sub-matrices of the generator matrix are the matrices inverted when decoding (rows mSize..31 are
+  #zero in the first mSize columns, they are never sent)
+  genMat = genMatrix()
+  for mSize in [1, 5, 17, 32]:
+    rows = sorted(rng.choice(list(range(mSize)) + list(range(32, 255)), mSize, replace=False))
+    sub = genMat[rows, :mSize]
+    inv = native.inv(sub)
+    assert np.array_equal(inv, gal.inv(sub))
+    assert np.array_equal(native.matmul(inv, sub), np.eye(mSize, dtype="u1"))
+
+def decodeAll(backend, messages):
+  setGFBackend(backend)
+  decoded = []
+  for msg, pids in messages:
+    pages, mSize = encodePages(msg, pids)
+    has = HAS()
+    for pid, page in zip(pids, pages):
+      has.addPage(constructCNAVPage(1, pid, mSize, page)[14:462])
+    decoded += [has.decode()]
+  return decoded
+
+def test_decode():
+  rnd = random.Random(4)
+  messages = []
+  for k in range(20):
+    msg = constructSSRmsg({0: list(range(1, 9)), 2: list(range(1, 11))}, rnd=rnd)
+    mSize = -(-len(msg)//53)
+    #Systematic and parity pages in any combination
+    pids = rnd.sample(list(range(1, mSize+1)) + list(range(33, 256)), mSize)
+    messages += [(msg, pids)]
+  try:
+    native = decodeAll("native", messages)
+    gal = decodeAll("galois", messages)
+  finally:
+    setGFBackend("native")
+  assert native == gal
+  for (msg, _), deco in zip(messages, native):
+    assert deco[:len(msg)] == msg
+
+if __name__ == "__main__":
+  test_arithmetic()
+  test_decode()
+  print("GF(256) backends: OK")
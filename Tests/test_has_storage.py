@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+'''
+Check of the page deduplication of HAS_Storage: with several receivers, pages of a message decoded
+already are dropped by (mID, pageID, TOW window), while a new message reusing the mID is decoded. With
+a single receiver, pages are used as they always were. Readers of identical recordings sharing one
+storage give the output of a single reader.
+'''
+
+import os
+import random
+import tempfile
+from galileo_has_decoder.has_classes import HAS_Storage
+from galileo_has_decoder.multi_reading import Multi_Reader
+from galileo_has_decoder.sbf_reading import SBF_Reader
+from galileo_has_decoder.ssr_converter import SSR_Converter
+from galileo_has_decoder.utils_testing import constructSSRmsg, encodePages, constructCNAVPage, writeRecording, resetSSRState
+
+class Sink:
+  def __init__(self):
+    self.out = []
+
+  def write(self, msg, *args):
+    self.out += [bytes(msg)]
+
+def cnavPages(msg, pids, mid):
+  pages, mSize = encodePages(msg, pids)
+  return [constructCNAVPage(mid, pid, mSize, page) for pid, page in zip(pids, pages)]
+
+def decodeAll(storage, pages):
+  decoded = []
+  for k, page in enumerate(pages):
+    if storage.feedMessage(page, 0.5*(k+1)):
+      decoded += [storage.lastMessage]
+  return decoded
+
+def test_dedupe():
+  rnd = random.Random(1)
+  m1, m2, m3 = [constructSSRmsg({0: [1, 2, 3], 2: [1, 2, 3, 4]}, rnd=rnd) for k in range(3)]
+  #m1 (mID 5), m3 (mID 6), the pages of m1 from a receiver lagging behind (with more parity pages),
+  #then a new message m2 with mID 5. Parity pages only: systematic pages mSize+1..32 are never sent.
+  pages = (cnavPages(m1, range(40, 47), 5) + cnavPages(m3, range(40, 47), 6)
+           + cnavPages(m1, range(40, 52), 5) + cnavPages(m2, range(40, 50), 5))
+  storage = HAS_Storage(receivers=2)
+  decoded = decodeAll(storage, pages)
+  assert [msg[:len(m1)] for msg in decoded] == [m1, m3, m2]
+  assert storage.duplicates > 0
+  #A single receiver decodes the repeated message again
+  storage = HAS_Storage()
+  decoded = decodeAll(storage, pages)
+  assert [msg[:len(m1)] for msg in decoded] == [m1, m3, m1]
+  assert storage.duplicates == 0
+
+def readAll(reader):
+  resetSSRState()
+  sink = Sink()
+  counts = reader.read(converter=SSR_Converter(2, True), output=sink)
+  reader.close()
+  return counts, b"".join(sink.out)
+
+def test_multi_reader():
+  with tempfile.TemporaryDirectory() as tmp:
+    source = os.path.join(tmp, "has.sbf")
+    writeRecording(source, seed=3)
+    single = readAll(SBF_Reader(source))
+    multi = readAll(Multi_Reader([SBF_Reader(source), SBF_Reader(source)]))
+    assert len(single[1]) > 0
+    assert multi[1] == single[1], "Two identical receivers give other output than one"
+    assert multi[0][:2] == (2*single[0][0], 2*single[0][1])
+    assert multi[0][2] == single[0][2]
+
+if __name__ == "__main__":
+  test_dedupe()
+  test_multi_reader()
+  print("HAS_Storage deduplication: OK")
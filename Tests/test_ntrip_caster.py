@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+'''
+Check of the NTRIP caster with scripted localhost clients: the sourcetable and the mountpoint over
+NTRIP v1 and v2, with and without basic authentication. The clients have to receive the RTCM3 frames
+written to the caster byte-identical.
+'''
+
+import base64
+import random
+import socket
+from galileo_has_decoder.ntrip_caster import NTRIP_Caster
+from galileo_has_decoder.ssr_converter import SSR_Converter
+from galileo_has_decoder.utils_testing import constructSSRmsg, resetSSRState
+
+def rtcmFrames(messages=4):
+  #RTCM3 SSR frames of SSR_Converter (mode 2), as written to a File_Writer
+  rnd = random.Random(16)
+  resetSSRState()
+  converter = SSR_Converter(2, True)
+  frames = []
+  for k in range(messages):
+    converter.feedMessage(constructSSRmsg({0: [1, 2, 3], 2: [1, 2, 3, 4]}, toh=k, rnd=rnd))
+    frames += converter.convert(tow=k)
+  resetSSRState()
+  return [bytes(frame) for frame in frames]
+
+def request(port, path, v2=False, user=None, password=None):
+  #Connected socket after sending the request
+  sock = socket.create_connection(("localhost", port), timeout=5)
+  lines = ["GET /" + path + (" HTTP/1.1" if v2 else " HTTP/1.0"), "Host: localhost", "User-Agent: NTRIP HASlibTest/1.0"]
+  if v2:
+    lines += ["Ntrip-Version: Ntrip/2.0"]
+  if user is not None:
+    lines += ["Authorization: Basic " + base64.b64encode((user + ":" + password).encode()).decode()]
+  sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode())
+  return sock
+
+def readExactly(sock, n, data=b""):
+  while len(data) < n:
+    chunk = sock.recv(n-len(data))
+    assert len(chunk) > 0, "Connection closed early"
+    data += chunk
+  return data
+
+def readHead(sock):
+  #Status line and headers, and the data received behind them
+  data = b""
+  while b"\r\n\r\n" not in data:
+    chunk = sock.recv(4096)
+    assert len(chunk) > 0, "Connection closed before the end of the header"
+    data += chunk
+  head, _, rest = data.partition(b"\r\n\r\n")
+  return head.decode("latin-1").split("\r\n"), rest
+
+def readAll(sock, data=b""):
+  while True:
+    chunk = sock.recv(4096)
+    if len(chunk) == 0:
+      return data
+    data += chunk
+
+def readChunked(sock, n, data=b""):
+  #n bytes of payload of an HTTP chunked stream
+  payload = b""
+  while len(payload) < n:
+    while b"\r\n" not in data:
+      data = readExactly(sock, len(data)+1, data)
+    size, _, data = data.partition(b"\r\n")
+    size = int(size, 16)
+    data = readExactly(sock, size+2, data)
+    assert data[size:size+2] == b"\r\n"
+    payload, data = payload + data[:size], data[size+2:]
+  return payload, data
+
+def test_sourcetable():
+  caster = NTRIP_Caster(port=0, mountpoint="HAS")
+  try:
+    for v2 in [False, True]:
+      sock = request(caster.port, "", v2=v2)
+      head, rest = readHead(sock)
+      body = readAll(sock, rest)
+      sock.close()
+      assert head[0] == ("HTTP/1.1 200 OK" if v2 else "SOURCETABLE 200 OK")
+      assert body == caster.sourcetable().encode()
+      assert body.startswith(b"STR;HAS;") and body.endswith(b"ENDSOURCETABLE\r\n")
+  finally:
+    caster.close()
+
+def streamTo(caster, clients, frames):
+  #Writes frames to the caster, returns what every client (socket, v2, data after the header) received
+  for frame in frames:
+    caster.write(frame)
+  n = sum(len(frame) for frame in frames)
+  received = []
+  for sock, v2, rest in clients:
+    if v2:
+      received += [readChunked(sock, n, rest)[0]]
+    else:
+      received += [readExactly(sock, n, rest)]
+  return received
+
+def test_mountpoint():
+  frames = rtcmFrames()
+  assert len(frames) > 0
+  caster = NTRIP_Caster(port=0, mountpoint="HAS")
+  try:
+    clients = []
+    for v2 in [False, True]:
+      sock = request(caster.port, "HAS", v2=v2)
+      head, rest = readHead(sock)
+      assert head[0] == ("HTTP/1.1 200 OK" if v2 else "ICY 200 OK")
+      if v2:
+        assert "Transfer-Encoding: chunked" in head
+      clients += [(sock, v2, rest)]
+    for data in streamTo(caster, clients, frames):
+      assert data == b"".join(frames)
+  finally:
+    caster.close()
+  #The v2 stream ends with the last chunk
+  sock, v2, rest = clients[1]
+  assert readAll(sock) == b"0\r\n\r\n"
+  for sock, v2, rest in clients:
+    sock.close()
+
+def test_authentication():
+  frames = rtcmFrames()
+  caster = NTRIP_Caster(port=0, mountpoint="HAS", user="rover", password="secret")
+  try:
+    for v2 in [False, True]:
+      for user, password in [(None, None), ("rover", "wrong")]:
+        sock = request(caster.port, "HAS", v2=v2, user=user, password=password)
+        head, rest = readHead(sock)
+        sock.close()
+        assert "401 Unauthorized" in head[0]
+    clients = []
+    for v2 in [False, True]:
+      sock = request(caster.port, "HAS", v2=v2, user="rover", password="secret")
+      head, rest = readHead(sock)
+      assert head[0] == ("HTTP/1.1 200 OK" if v2 else "ICY 200 OK")
+      clients += [(sock, v2, rest)]
+    for data in streamTo(caster, clients, frames):
+      assert data == b"".join(frames)
+    for sock, v2, rest in clients:
+      sock.close()
+  finally:
+    caster.close()
+
+if __name__ == "__main__":
+  test_sourcetable()
+  test_mountpoint()
+  test_authentication()
+  print("NTRIP caster: OK")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+'''
+Check of the indexed SBF reading: the output and the C/Nav and HAS counts have to be identical to
+searching the file block by block, also with garbage between the blocks, blocks of other types and
+blocks with a CRC error, and when the index is loaded from its sidecar.
+'''
+
+import os
+import tempfile
+from galileo_has_decoder.sbf_reading import SBF_Index
+from galileo_has_decoder.utils_testing import constructSBFBlock, writeRecording, convertFile
+
+def writeBrokenRecording(path):
+  writeRecording(path, seed=11)
+  with open(path, "rb") as f:
+    data = f.read()
+  #Garbage with a false sync pattern, a PVTGeodetic (4007) block and a C/Nav block with a CRC error
+  broken = bytearray(data[:data.index(b"$@", 1)])
+  broken[20] ^= 0xFF
+  junk = b"$@\x00\x01garbage" + constructSBFBlock(4007, bytes(88)) + bytes(broken)
+  half = data.index(b"$@", len(data)//2)
+  with open(path, "wb") as f:
+    f.write(junk + data[:half] + junk + data[half:])
+
+def test_indexed_equals_sequential():
+  with tempfile.TemporaryDirectory() as tmp:
+    source = os.path.join(tmp, "has.sbf")
+    writeBrokenRecording(source)
+    for outFormat in [1, 2]:
+      sequential = convertFile(source, os.path.join(tmp, "sequential.out"), outFormat, index=False)
+      indexed = convertFile(source, os.path.join(tmp, "indexed.out"), outFormat, index=True)
+      assert len(sequential[1]) > 0
+      assert indexed[1] == sequential[1], "Indexed reading differs from the sequential one (format " + str(outFormat) + ")"
+      #C/Nav and HAS message counts. The sequential count of blocks includes the rejected candidates,
+      #the false sync pattern and the broken block of both inserts
+      assert indexed[0][1:] == sequential[0][1:]
+      assert indexed[0][0] == sequential[0][0] - 4
+    #The second indexed run loaded the sidecar written by the first one
+    assert os.path.exists(source + SBF_Index.SUFFIX)
+    assert SBF_Index(source, save=False).blocks.tolist() == SBF_Index(source, rebuild=True, save=False).blocks.tolist()
+
+if __name__ == "__main__":
+  test_indexed_equals_sequential()
+  print("Indexed SBF reading: OK")
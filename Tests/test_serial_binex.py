@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+'''
+Check of the serial BINEX reading: a recording streamed through a pseudo-terminal has to give the
+output of reading the file.
+'''
+
+import os
+import tempfile
+import threading
+from galileo_has_decoder.binex_reading import Binex_Reader
+from galileo_has_decoder.load_generator import Pty_Output
+from galileo_has_decoder.serial_reading import Serial_Binex_Reader
+from galileo_has_decoder.ssr_converter import SSR_Converter
+from galileo_has_decoder.utils_testing import writeRecording, resetSSRState
+
+class Sink:
+  def __init__(self):
+    self.out = []
+
+  def write(self, msg, *args):
+    self.out += [bytes(msg)]
+
+def readAll(reader, x=None):
+  resetSSRState()
+  sink = Sink()
+  counts = reader.read(converter=SSR_Converter(2, True), output=sink, x=x)
+  return counts, b"".join(sink.out)
+
+def test_pty_equals_file():
+  with tempfile.TemporaryDirectory() as tmp:
+    source = os.path.join(tmp, "has.bnx")
+    writeRecording(source, fmt="binex")
+    reader = Binex_Reader(source)
+    single = readAll(reader)
+    reader.close()
+    pty = Pty_Output()
+    try:
+      reader = Serial_Binex_Reader(pty.name)
+      #Records are parsed with 20 bytes behind them, the stream is padded
+      with open(source, "rb") as f:
+        writer = threading.Thread(target=pty.write, args=(f.read() + bytes(100),))
+      writer.start()
+      serial = readAll(reader, x=single[0][1])
+      writer.join()
+      reader.serial.close()
+    finally:
+      pty.close()
+    assert len(single[1]) > 0
+    assert serial[1] == single[1], "Serial BINEX reading differs from reading the file"
+    assert serial[0][1:] == single[0][1:]
+
+if __name__ == "__main__":
+  test_pty_equals_file()
+  print("Serial BINEX reading: OK")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+'''
+Check of the sharded file reading: the output has to be byte-identical to reading the file in one
+process, also with "do not use" clock corrections, which change the masks of later messages. The shard
+edges fall inside blocks/records, so the serial walk joins the walk of every shard after the edge.
+'''
+
+import os
+import tempfile
+from galileo_has_decoder.utils_testing import writeRecording, convertFile
+
+def test_sharded_equals_serial_with_dnu_clocks():
+  with tempfile.TemporaryDirectory() as tmp:
+    for fmt, modeIn in [("sbf", 1), ("binex", 2)]:
+      source = os.path.join(tmp, "dnu." + fmt)
+      writeRecording(source, messages=120, dnu=0.2, fmt=fmt)
+      for outFormat in [1, 2]:
+        serial = convertFile(source, os.path.join(tmp, "serial.out"), outFormat, modeIn=modeIn)[1]
+        sharded = convertFile(source, os.path.join(tmp, "sharded.out"), outFormat, modeIn=modeIn, shards=7)[1]
+        assert len(serial) > 0
+        assert sharded == serial, "Sharded output differs from the serial one (" + fmt + ", format " + str(outFormat) + ")"
+
+if __name__ == "__main__":
+  test_sharded_equals_serial_with_dnu_clocks()
+  print("Sharded reading: OK")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+'''
+Check of the listening TCP readers of several receivers: the readers are built without any receiver
+connected, the receivers connect in any order, and the output is that of reading the recording from
+the file.
+'''
+
+import os
+import socket
+import tempfile
+import threading
+from galileo_has_decoder.multi_reading import Multi_Reader
+from galileo_has_decoder.sbf_reading import SBF_Reader
+from galileo_has_decoder.tcp_sbf_reading import TCP_SBF_Reader
+from galileo_has_decoder.ssr_converter import SSR_Converter
+from galileo_has_decoder.utils_testing import writeRecording, resetSSRState
+
+class Sink:
+  def __init__(self):
+    self.out = []
+
+  def write(self, msg, *args):
+    self.out += [bytes(msg)]
+
+def readAll(reader):
+  resetSSRState()
+  sink = Sink()
+  counts = reader.read(converter=SSR_Converter(2, True), output=sink)
+  reader.close()
+  return counts, b"".join(sink.out)
+
+def send(port, data):
+  sock = socket.create_connection(("localhost", port), timeout=5)
+  sock.sendall(data)
+  sock.close()
+
+def test_connect_in_any_order():
+  with tempfile.TemporaryDirectory() as tmp:
+    source = os.path.join(tmp, "has.sbf")
+    writeRecording(source, seed=17)
+    single = readAll(SBF_Reader(source))
+    with open(source, "rb") as f:
+      data = f.read()
+    #Port 0: the servers listen on free ports, without waiting for a connection
+    readers = [TCP_SBF_Reader("localhost:0"), TCP_SBF_Reader("localhost:0")]
+    result = []
+    thread = threading.Thread(target=lambda: result.append(readAll(Multi_Reader(readers))))
+    thread.start()
+    #The second receiver sends the recording before the first one connects (and sends nothing)
+    send(readers[1].source.port, data)
+    send(readers[0].source.port, b"")
+    thread.join(60)
+    assert not thread.is_alive(), "The TCP readers did not finish"
+    assert len(single[1]) > 0
+    assert result[0][1] == single[1], "The TCP readers give other output than reading the file"
+    assert result[0][0][1:] == single[0][1:]
+
+if __name__ == "__main__":
+  test_connect_in_any_order()
+  print("TCP reading: OK")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+'''
+Throughput benchmark of the memory-mapped BINEX file reader
+
+Usage: python3 benchmarks/binex_reading.py FILE [SIZE_MB]
+FILE is tiled into a temporary file of at least SIZE_MB (default 1024) megabytes if it is smaller.
+Reported are the sync search alone and the record parsing (sync search, record and subrecord
+decoding, without HAS decoding), in MB/s and records/s, as well as the memory use.
+'''
+
+import os
+import sys
+import time
+import resource
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from galileo_has_decoder.binex_reading import Binex_Reader, FileError
+from galileo_has_decoder.utils_binex import Binex_Record, BinexError
+
+def tile(path, size):
+  #Repeat the records of path until the output holds at least size bytes
+  with open(path, "rb") as f:
+    chunk = f.read()
+  fd, out = tempfile.mkstemp(suffix=".bnx")
+  with os.fdopen(fd, "wb") as f:
+    written = 0
+    block = chunk * max(1, (16 << 20) // len(chunk))
+    while written < size:
+      f.write(block)
+      written += len(block)
+  return out
+
+def scan(reader):
+  #Sync search only
+  i = hits = 0
+  try:
+    while True:
+      i = reader.findMessage(i)+1
+      hits += 1
+  except FileError:
+    pass
+  return hits
+
+def parse(reader):
+  #Sync search, record and subrecord decoding
+  data = reader.file.view
+  i = records = cnavs = 0
+  while True:
+    try:
+      reader.pos = reader.findMessage(i)
+    except FileError:
+      break
+    binex = Binex_Record()
+    try:
+      i = binex.readBlock(data, reader.pos)
+    except (BinexError, IndexError):
+      #As Binex_Reader.read: IndexError is raised by false sync bytes and records cut off by the file end
+      i = reader.pos+1
+      continue
+    records += 1
+    if binex.decodeBlock():
+      cnavs += 1
+  return records, cnavs
+
+def memory():
+  #Anonymous (heap) memory in MB; mapped file pages are shared page cache and not counted
+  try:
+    with open("/proc/self/status") as f:
+      for line in f:
+        if line.startswith("RssAnon:"):
+          return int(line.split()[1])/1e3
+  except OSError:
+    pass
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1e3
+
+def report(name, n, unit, size, dt):
+  print("%-8s %12d %-8s %8.1fs %8.1f MB/s %10.0f %s/s" % (name, n, unit, dt, size/dt/1e6, n/dt, unit))
+
+if __name__ == "__main__":
+  if len(sys.argv) < 2:
+    print(__doc__)
+    exit()
+  size = int(float(sys.argv[2])*1e6) if len(sys.argv) > 2 else 1024*10**6
+  path, tmp = sys.argv[1], None
+  if os.path.getsize(path) < size:
+    tmp = path = tile(path, size)
+  try:
+    size = os.path.getsize(path)
+    print("BINEX file:", path, "(%.1f MB)" % (size/1e6))
+    reader = Binex_Reader(path)
+    t = time.time()
+    hits = scan(reader)
+    report("sync", hits, "syncs", size, time.time()-t)
+    reader.close()
+    reader = Binex_Reader(path)
+    t = time.time()
+    records, cnavs = parse(reader)
+    report("records", records, "records", size, time.time()-t)
+    print("C/NAV records:", cnavs)
+    print("Process memory (excl. mapped file): %.1f MB" % memory())
+    reader.close()
+  finally:
+    if tmp is not None:
+      os.remove(tmp)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+'''
+Synthetic HAS load generator
+
+Usage: python3 benchmarks/load_generator.py -t TARGET [-f FORMAT] [--messages N | --seconds N] [--speed X] [options]
+Broadcasts synthetic HAS messages as C/Nav pages of a receiver, to be decoded by HAS_Converter.
+  -t TARGET        a file path, "tcp:ADDRESS:PORT" (connect to a decoder in input mode 5, 6, 9, 10),
+                   "listen:ADDRESS:PORT" (a decoder in input mode 7, 8 connects) or "pty" (a
+                   pseudo-terminal, of which the decoder opens the printed name in input mode 3
+                   or 4)
+  -f FORMAT        sbf (default) or binex
+  --messages N     HAS messages to send (default 600), or
+  --seconds N      epochs (seconds of GNSS time) to send
+  --speed X        epochs per second, i.e. multiple of real-time (default 1, 0: as fast as possible)
+  --gps N          GPS satellites in the mask (default 8)
+  --gal N          Galileo satellites in the mask (default 10)
+  --signals N      signals per system (default 2)
+  --contents LIST  comma-separated content flags (mask, orbit, full clock, clock subset, code and
+                   phase bias) of the messages, used in turn (default 111111,011100,000110,000001)
+  --transmitters N satellites broadcasting HAS pages each epoch (default 8)
+  --overhead X     pages sent per page needed (default 1.0)
+  --loss P         probability of a page to be lost (default 0)
+  --duplicate P    probability of a page to be received twice (default 0)
+  --seed N         seed of the random values
+'''
+
+import os
+import sys
+import getopt
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from galileo_has_decoder.load_generator import HAS_Load_Generator, openTarget
+
+if __name__ == "__main__":
+  try:
+    options, args = getopt.gnu_getopt(sys.argv[1:], "ht:f:", ["messages=", "seconds=", "speed=", "gps=", "gal=", "signals=", "contents=",
+                                      "transmitters=", "overhead=", "loss=", "duplicate=", "seed=", "help"])
+  except getopt.GetoptError:
+    print(__doc__)
+    exit(2)
+  opts = dict(options)
+  if "-h" in opts or "--help" in opts or "-t" not in opts:
+    print(__doc__)
+    exit()
+  seconds = int(opts["--seconds"]) if "--seconds" in opts else None
+  messages = int(opts.get("--messages", 600)) if seconds is None else None
+  try:
+    generator = HAS_Load_Generator(opts.get("-f", "sbf").lower(), int(opts.get("--gps", 8)), int(opts.get("--gal", 10)),
+                                   int(opts.get("--signals", 2)), opts.get("--contents", "111111,011100,000110,000001").split(","),
+                                   int(opts.get("--transmitters", 8)), float(opts.get("--overhead", 1.0)), float(opts.get("--loss", 0.0)),
+                                   float(opts.get("--duplicate", 0.0)), int(opts["--seed"]) if "--seed" in opts else None)
+  except ValueError as e:
+    print(e)
+    exit(2)
+  output = openTarget(opts["-t"])
+  try:
+    stats = generator.run(output, messages, seconds, float(opts.get("--speed", 1.0)))
+  except (BrokenPipeError, ConnectionError) as e:
+    print("Output closed: " + str(e))
+    exit(1)
+  except KeyboardInterrupt:
+    exit(1)
+  finally:
+    output.close()
+  print("%d epochs in %.3f s (%.1fx real-time): %d HAS messages (%d decodable), %d pages (%d lost, %d duplicated), %d blocks, %.1f kB"
+        % (stats["epochs"], stats["elapsed"], stats["speed"] or 0, stats["messages"], stats["decodable"], stats["pages"], stats["lost"],
+           stats["duplicated"], stats["blocks"], stats["bytes"]/1e3))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+'''
+Replay of SBF/BINEX recordings on their GNSS time cadence
+
+Usage: python3 benchmarks/replay.py FILE -t TARGET [-f FORMAT] [--speed X] [--loops N] [options]
+Writes the recording FILE to a decoder as a receiver would, paced by the time stamps of the blocks
+(SBF TOW/WNc, BINEX C/Nav transmission time).
+  -t TARGET        "tcp:ADDRESS:PORT" (connect to a decoder in input mode 5, 6, 9, 10),
+                   "listen:ADDRESS:PORT" (a decoder in input mode 7, 8 connects), "pty" (a
+                   pseudo-terminal, of which the decoder opens the printed name in input mode 3) or
+                   a file path
+  -f FORMAT        sbf or binex. If not set, from the file ending
+  --speed X        multiple of real-time (default 1, 0: as fast as possible)
+  --loops N        times the recording is replayed (default 1)
+  --interval S     seconds between progress reports (default 10)
+  --max-gap S      time stamp gaps beyond S seconds (and time going back) are not waited for (default 10)
+  --drain S        seconds to wait in the end for the decoder to receive everything (default 5)
+Reported are the achieved speed and data rate, how far the writes ran behind schedule (the decoder
+not keeping up holds them up) and the decoder's lag: the bytes it has not received yet and the span
+of GNSS time these hold.
+'''
+
+import os
+import sys
+import getopt
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from galileo_has_decoder.replay import Recording_Replay
+from galileo_has_decoder.load_generator import openTarget
+
+if __name__ == "__main__":
+  try:
+    options, files = getopt.gnu_getopt(sys.argv[1:], "ht:f:", ["speed=", "loops=", "interval=", "max-gap=", "drain=", "help"])
+  except getopt.GetoptError:
+    print(__doc__)
+    exit(2)
+  opts = dict(options)
+  if "-h" in opts or "--help" in opts or "-t" not in opts or len(files) != 1:
+    print(__doc__)
+    exit()
+  try:
+    replay = Recording_Replay(files[0], opts.get("-f"), float(opts.get("--max-gap", 10.0)))
+  except ValueError as e:
+    print(e)
+    exit(2)
+  print("%s: %d epochs, %.1f s of GNSS time" % (files[0], replay.epochs(), replay.duration()))
+  output = openTarget(opts["-t"])
+  try:
+    stats = replay.run(output, float(opts.get("--speed", 1.0)), int(opts.get("--loops", 1)), float(opts.get("--interval", 10.0)),
+                       float(opts.get("--drain", 5.0)))
+  except (BrokenPipeError, ConnectionError) as e:
+    print("Output closed: " + str(e))
+    exit(1)
+  except KeyboardInterrupt:
+    exit(1)
+  finally:
+    output.close()
+    replay.close()
+  print("%.1f s of GNSS time in %.3f s (%.1fx real-time), %d epochs, %.1f kB (%.1f kB/s)"
+        % (stats["span"], stats["elapsed"], stats["speed"] or 0, stats["epochs"], stats["bytes"]/1e3, (stats["rate"] or 0)/1e3))
+  print("Behind schedule: mean %.3f s, max %.3f s. Decoder lag: max %d bytes, max %.1f s of GNSS time, received all %s"
+        % (stats["behind"], stats["maxBehind"], stats["maxPending"], stats["maxLag"],
+           "%.3f s after the last write" % stats["drained"] if stats["drained"] is not None else "not within the drain time"))
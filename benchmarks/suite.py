@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+'''
+Benchmark suite of the decoding stages
+
+Usage: python3 benchmarks/suite.py [FILE ...] [--synthetic MESSAGES] [--repeat N] [--json OUT] [--compare BASELINE] [--tolerance T]
+Every SBF FILE is processed stage by stage, each stage timed on its own on the results of the
+previous one:
+  scan        SBF_Reader.read, without feeding the HAS pages to a HAS storage: sync search, CRC
+              check and unpacking of all blocks (without returnBinary)
+  index       sync search and CRC check by the vectorized SBF_Index
+  returnBinary  SBF_Block.returnBinary of the C/Nav blocks, as called by SBF_Reader.read
+  feedMessage HAS_Storage.feedMessage of the pages, without HAS.decode
+  decode      HAS.decode of the complete HAS messages
+  parse       SSR_HAS parsing of the HAS messages
+  rtcm, igs   SSR_RTCM/SSR_IGS encoding (SSR_Converter.convert) of the parsed messages
+  bits2Bytes  bits2Bytes of the HAS pages
+  output      File_Writer.write of the RTCM messages
+Without FILE, the Tests recordings (galileo_ssr000.sbf, galileo_ssr003.sbf, also from
+TestRecordings.zip) are used if present. A synthetic recording of MESSAGES HAS messages
+(default 600) is always added. The best of N (default 5) runs is reported.
+--json writes the results to OUT, --compare compares them with a saved BASELINE (a file written
+by --json) and exits with 1 if a stage became slower by more than T (default 0.1, i.e. 10%).
+'''
+
+import os
+import sys
+import time
+import json
+import getopt
+import random
+import re
+import shutil
+import subprocess
+import zipfile
+import platform
+import datetime
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from galileo_has_decoder.sbf_reading import SBF_Reader, SBF_Index
+from galileo_has_decoder.utils_sbf import SBF_Block
+from galileo_has_decoder.has_classes import HAS, HAS_Storage
+from galileo_has_decoder.ssr_classes import SSR, SSR_HAS
+from galileo_has_decoder.ssr_converter import SSR_Converter
+from galileo_has_decoder.file_write import File_Writer
+from galileo_has_decoder.utils import bits2Bytes
+from galileo_has_decoder.utils_testing import constructHASmsg, encodePages, constructCNAVPage, constructSBF4024, constructSBFBlock
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Tests")
+RECORDINGS = ["galileo_ssr000.sbf", "galileo_ssr003.sbf"]
+
+def recordings(tmp):
+  #The Tests recordings, unzipped into tmp if only the archive is there
+  paths = []
+  archive = os.path.join(TESTS, "TestRecordings.zip")
+  for name in RECORDINGS:
+    path = os.path.join(TESTS, name)
+    if not os.path.exists(path) and os.path.exists(archive):
+      with zipfile.ZipFile(archive) as z:
+        members = [m for m in z.namelist() if os.path.basename(m) == name]
+        if len(members) > 0:
+          path = z.extract(members[0], tmp)
+    if os.path.exists(path):
+      paths += [path]
+  return paths
+
+def synthetic(path, messages=600, sats=8, seed=1):
+  #SBF recording of HAS messages, one per second, each broadcast by sats satellites with one parity
+  #page each, and a non-C/Nav block per second. The messages carry masks, orbits, clocks and code
+  #biases (constructHASmsg).
+  rnd = random.Random(seed)
+  tow = 345600000
+  with open(path, "wb") as f:
+    for k in range(messages):
+      msg = constructHASmsg("111110")
+      pids = [33 + (k*sats+s) % 223 for s in range(sats)]
+      pages, mSize = encodePages(msg, pids)
+      for s in range(sats):
+        f.write(constructSBF4024(constructCNAVPage(k % 32, pids[s], mSize, pages[s]), tow+k*1000, 2200, 71+s))
+      f.write(constructSBFBlock(4027, bytes(rnd.getrandbits(8) for _ in range(200))))
+
+class Timed:
+  #Replaces cls.name by a version summing up its run time, until restored
+  def __init__(self, cls, name):
+    self.cls, self.name = cls, name
+    self.func = getattr(cls, name)
+    self.seconds = 0.0
+    timed = self
+    def wrapper(*args, **kwargs):
+      t = time.perf_counter()
+      try:
+        return timed.func(*args, **kwargs)
+      finally:
+        timed.seconds += time.perf_counter()-t
+    setattr(cls, name, wrapper)
+  def restore(self):
+    setattr(self.cls, self.name, self.func)
+
+def resetState():
+  SSR_HAS.HAS_MASKS[:] = None
+  SSR_HAS.HAS_IODs[:] = None
+
+def run(path, out):
+  #One pass over all stages: {stage: (seconds, items, unit)}
+  res = {}
+  #The reader's own walk, the pages are collected instead of fed to its HAS storage (as
+  #Pipeline.attach replaces feedPage)
+  reader = SBF_Reader(path)
+  pages = []
+  def collect(has_msg, tow, *args):
+    pages.append((has_msg, tow))
+    return False
+  reader.feedPage = collect
+  binary = Timed(SBF_Block, "returnBinary")
+  t = time.perf_counter()
+  try:
+    blocks = reader.read()[0]
+  finally:
+    binary.restore()
+    reader.close()
+  res["scan"] = (time.perf_counter()-t-binary.seconds, blocks, "blocks")
+  res["returnBinary"] = (binary.seconds, len(pages), "pages")
+
+  t = time.perf_counter()
+  index = SBF_Index(path, rebuild=True, save=False)
+  res["index"] = (time.perf_counter()-t, len(index.blocks), "blocks")
+
+  storage = HAS_Storage()
+  decode = Timed(HAS, "decode")
+  t = time.perf_counter()
+  messages = []
+  try:
+    for page, tow in pages:
+      if storage.feedMessage(page, tow):
+        messages += [(storage.lastMessage, storage.lastMessage_tow)]
+  finally:
+    decode.restore()
+  res["feedMessage"] = (time.perf_counter()-t-decode.seconds, len(pages), "pages")
+  res["decode"] = (decode.seconds, len(messages), "messages")
+
+  resetState()
+  t = time.perf_counter()
+  for msg, tow in messages:
+    SSR_HAS(msg, SSR())
+  res["parse"] = (time.perf_counter()-t, len(messages), "messages")
+
+  converted = []
+  for fmt, mode in [("rtcm", 2), ("igs", 1)]:
+    resetState()
+    converter = SSR_Converter(mode, True)
+    seconds = 0.0
+    n = 0
+    for msg, tow in messages:
+      converter.feedMessage(msg)
+      t = time.perf_counter()
+      msgs = converter.convert(tow=tow)
+      seconds += time.perf_counter()-t
+      n += len(msgs)
+      if mode == 2:
+        converted += msgs
+    res[fmt] = (seconds, n, "SSR messages")
+
+  t = time.perf_counter()
+  for page, tow in pages:
+    bits2Bytes(page[38:462])
+  res["bits2Bytes"] = (time.perf_counter()-t, len(pages), "pages")
+
+  writer = File_Writer(out)
+  t = time.perf_counter()
+  for msg in converted:
+    writer.write(msg)
+  writer.close()
+  res["output"] = (time.perf_counter()-t, len(converted), "SSR messages")
+  resetState()
+  return res
+
+def benchmark(path, repeat, out):
+  runs = [run(path, out) for _ in range(repeat)]
+  stages = {}
+  for stage in runs[0]:
+    seconds = sorted(r[stage][0] for r in runs)
+    items, unit = runs[0][stage][1], runs[0][stage][2]
+    stages[stage] = {"seconds": seconds[0], "median": seconds[len(seconds)//2], "items": items, "unit": unit,
+                     "rate": items/seconds[0] if seconds[0] > 0 else None}
+  return {"path": path, "bytes": os.path.getsize(path), "stages": stages}
+
+def report(name, result):
+  print("%s (%.1f kB)" % (name, result["bytes"]/1e3))
+  for stage, s in result["stages"].items():
+    print("  %-13s %10.3f ms %10.3f ms (median) %8d %-12s %12.0f /s" % (stage, s["seconds"]*1e3, s["median"]*1e3,
+          s["items"], s["unit"], s["rate"] or 0))
+
+def compare(results, baseline, tolerance):
+  #Prints current against baseline timings, returns the number of regressions
+  regressions = 0
+  print("Comparison with the baseline (version %s, %s):" % (baseline.get("version"), baseline.get("date")))
+  for name, result in results["datasets"].items():
+    base = baseline.get("datasets", {}).get(name)
+    if base is None:
+      print("  %s: not in the baseline" % name)
+      continue
+    for stage, s in result["stages"].items():
+      b = base["stages"].get(stage)
+      if b is None or not b["seconds"]:
+        continue
+      ratio = s["seconds"]/b["seconds"]
+      status = ""
+      if ratio > 1+tolerance:
+        status = "SLOWER"
+        regressions += 1
+      elif ratio < 1-tolerance:
+        status = "faster"
+      print("  %-24s %-13s %10.3f ms %10.3f ms %6.2fx %s" % (name, stage, b["seconds"]*1e3, s["seconds"]*1e3, ratio, status))
+  return regressions
+
+def version():
+  #Version of the code measured, the checkout the suite is run from: the version in its setup.py
+  #(that of the installed package without one) and the git commit, if it is a git checkout
+  root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+  ver = None
+  try:
+    with open(os.path.join(root, "setup.py")) as f:
+      match = re.search(r"version\s*=\s*['\"]([^'\"]+)['\"]", f.read())
+    ver = match.group(1) if match else None
+  except OSError:
+    pass
+  if ver is None:
+    try:
+      from importlib.metadata import version as packageVersion
+      ver = packageVersion("galileo_has_decoder")
+    except Exception:
+      pass
+  try:
+    commit = subprocess.run(["git", "describe", "--tags", "--always", "--dirty"], cwd=root,
+                            capture_output=True, text=True, timeout=10)
+    if commit.returncode == 0 and commit.stdout.strip():
+      ver = (ver + "+" if ver else "") + commit.stdout.strip()
+  except (OSError, subprocess.SubprocessError):
+    pass
+  return ver
+
+if __name__ == "__main__":
+  try:
+    options, files = getopt.gnu_getopt(sys.argv[1:], "h", ["synthetic=", "repeat=", "json=", "compare=", "tolerance=", "help"])
+  except getopt.GetoptError:
+    print(__doc__)
+    exit(2)
+  opts = dict(options)
+  if "-h" in opts or "--help" in opts:
+    print(__doc__)
+    exit()
+  repeat = int(opts.get("--repeat", 5))
+  tmp = tempfile.mkdtemp()
+  try:
+    if len(files) == 0:
+      files = recordings(tmp)
+    datasets = [(os.path.basename(f), f) for f in files]
+    syn = os.path.join(tmp, "synthetic.sbf")
+    synthetic(syn, int(opts.get("--synthetic", 600)))
+    datasets += [("synthetic", syn)]
+    results = {"version": version(), "date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(), "platform": platform.platform(), "repeat": repeat, "datasets": {}}
+    for name, path in datasets:
+      results["datasets"][name] = benchmark(path, repeat, os.path.join(tmp, "output.rtcm"))
+      report(name, results["datasets"][name])
+  finally:
+    shutil.rmtree(tmp)
+  if "--json" in opts:
+    with open(opts["--json"], "w") as f:
+      json.dump(results, f, indent=1)
+  if "--compare" in opts:
+    with open(opts["--compare"]) as f:
+      baseline = json.load(f)
+    if compare(results, baseline, float(opts.get("--tolerance", 0.1))) > 0:
+      exit(1)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+
+'''
+Asyncio TCP reading class
+
+SBF or BINEX streams are read with asyncio, either connecting to receivers/casters as a client or
+listening for receivers to connect. Several streams are read in one event loop without threads:
+  1. Received data is appended to a Stream_Buffer, a bytearray from which parsed bytes are consumed
+     by moving an offset. The consumed head is only dropped now and then (compaction).
+  2. A stream parser takes the complete blocks/records from the buffer and returns None as soon
+     as more data is needed, so no read ever waits for a timeout.
+  3. Async_TCP_Reader.readBlocks is an async iterator over the parsed blocks of a stream. read feeds
+     the HAS pages of all streams to one HAS_Storage, which decodes every HAS message once from the
+     pages of all receivers, and converts completed messages.
+'''
+
+import asyncio
+import struct
+from galileo_has_decoder.utils import gpst2time, Page_Feeding
+from galileo_has_decoder.utils_sbf import crcValid, SBF_Block
+from galileo_has_decoder.utils_binex import Binex_Record, BinexError
+from galileo_has_decoder.has_classes import HAS_Storage
+
+class StreamError(Exception):
+  #Base Stream Error class
+  pass
+
+class Stream_Buffer:
+  #Received bytes in data[start:]. Consumed bytes are dropped once they take up more than COMPACT
+  #bytes and half of the buffer, so appending and consuming stay cheap. offset counts the bytes
+  #consumed since the stream began.
+  COMPACT = 1 << 16
+  data = None
+  start = None
+  offset = None
+  def __init__(self):
+    self.data = bytearray()
+    self.start = 0
+    self.offset = 0
+
+  def __len__(self):
+    return len(self.data) - self.start
+
+  def feed(self, data):
+    self.data += data
+
+  def consume(self, n):
+    #Drops the next n bytes and returns them
+    n = min(n, len(self))
+    part = bytes(self.data[self.start:self.start+n])
+    self.start += n
+    self.offset += n
+    if self.start > self.COMPACT and self.start*2 > len(self.data):
+      del self.data[:self.start]
+      self.start = 0
+    return part
+
+  def find(self, sub, i=0):
+    #Offset of sub at or after offset i (relative to the unconsumed bytes), -1 if not found
+    idx = self.data.find(sub, self.start+i)
+    return idx - self.start if idx != -1 else -1
+
+  def peek(self, i, n):
+    return bytes(self.data[self.start+i:self.start+i+n])
+
+class SBF_Stream_Parser:
+  #Parses SBF blocks from a Stream_Buffer. next() returns None if more data is needed, else
+  #(raw, block, cnav, page): raw are the consumed bytes to pass through to the PPP Wizard (those of
+  #C/Nav blocks are not), block is True if a valid block was read, cnav if it was a C/Nav block and
+  #page is (HAS page, tow, epoch) of a valid C/Nav page, else None.
+  SYNC = b'$@'
+  RAW_FORMAT = 12
+  buffer = None
+  rejectedBlocks = None
+  def __init__(self, buffer=None):
+    self.buffer = buffer if buffer is not None else Stream_Buffer()
+    self.rejectedBlocks = 0
+
+  def next(self, verbose=0):
+    buf = self.buffer
+    idx = buf.find(self.SYNC)
+    if idx == -1:
+      #A trailing '$' may be the first sync byte
+      n = len(buf) - (buf.data[-1:] == b'$')
+      return (buf.consume(n), False, False, None) if n > 0 else None
+    if idx > 0:
+      return (buf.consume(idx), False, False, None)
+    if len(buf) < 8:
+      return None
+    header = list(struct.unpack("<HHH", buf.peek(2, 6)))
+    if header[2] % 4 != 0 or header[2] < 8:
+      if verbose >= 5:
+        print("SBF Reader: Invalid header, continuing search...")
+      return (buf.consume(2), False, False, None)
+    if len(buf) < header[2]:
+      return None
+    block = buf.peek(0, header[2])
+    if not crcValid(header[0], block[4:]):
+      if verbose >= 5:
+        print("SBF Reader: Block CRC error, continuing search...")
+      self.rejectedBlocks += 1
+      return (buf.consume(2), False, False, None)
+    if header[1] != 4024:
+      if verbose >= 5:
+        print("   Err: Non-CNAV block: " + str(header[1]))
+      return (buf.consume(header[2]), True, False, None)
+    buf.consume(header[2])
+    return (b'', True, True, self.page(header, block, verbose))
+
+  def page(self, header, block, verbose=0):
+    hasbyteL = 4+2+6*1+16*4
+    if header[2]-8 < hasbyteL:
+      return None
+    line = list(struct.unpack_from("<IHBBBBBB16I", block, 8))
+    if verbose >= 5:
+      print("   CNAV Block")
+    #Use Septentrio CRC check
+    if line[3] != 1:
+      if verbose >= 5:
+        print("SBF Reader: CRC error: "+str(line[3]))
+      return None
+    sbf = SBF_Block(header, line)
+    return sbf.returnBinary(), line[0]/1000, gpst2time(line[1], line[0]/1000)
+
+class Binex_Stream_Parser:
+  #Parses BINEX records from a Stream_Buffer, with the results of SBF_Stream_Parser.next. A record
+  #is read from the WAIT bytes following its sync byte, until these have arrived it is waited for.
+  SYNC_PATTERNS = [b'\xc2\x01', b'\xe2\x01', b'\xd2\x01', b'\xf2\x01', b'\xb4', b'\xb0']
+  RAW_FORMAT = 10
+  WAIT = 4096
+  buffer = None
+  rejectedBlocks = None
+  syncHits = None
+  def __init__(self, buffer=None):
+    self.buffer = buffer if buffer is not None else Stream_Buffer()
+    self.rejectedBlocks = 0
+    self.syncHits = {}
+
+  def findSync(self, sync):
+    #Like Binex_Reader.findMessage, the next occurrence of each pattern is remembered (as stream
+    #offset) and the search continues where it ended, so the received data is scanned once per pattern
+    buf = self.buffer
+    hit, resume = self.syncHits.get(sync, (None, buf.offset))
+    if hit is not None and hit >= buf.offset:
+      return hit - buf.offset
+    idx = buf.find(sync, max(resume, buf.offset) - buf.offset)
+    if idx == -1:
+      self.syncHits[sync] = (None, buf.offset + max(len(buf)-len(sync)+1, 0))
+    else:
+      self.syncHits[sync] = (buf.offset + idx, buf.offset + idx + 1)
+    return idx
+
+  def next(self, verbose=0):
+    buf = self.buffer
+    hits = [hit for hit in (self.findSync(sync) for sync in self.SYNC_PATTERNS) if hit != -1]
+    if len(hits) == 0:
+      #A trailing sync byte may be followed by the record ID
+      n = len(buf) - (len(buf) > 0 and buf.data[-1] in Binex_Record.syncbytes)
+      return (buf.consume(n), False, False, None) if n > 0 else None
+    idx = min(hits)
+    if idx > 0:
+      return (buf.consume(idx), False, False, None)
+    data = buf.peek(0, self.WAIT)
+    binex = Binex_Record()
+    try:
+      i = binex.readBlock(data, 0)
+    except BinexError as e:
+      if "ran out" in str(e) and len(buf) < self.WAIT:
+        return None
+      if verbose >= 5:
+        print("   Err:", e)
+      return (buf.consume(1), False, False, None)
+    except IndexError:
+      #A false sync byte, or a record cut off at the end of the received data
+      if len(buf) < self.WAIT:
+        return None
+      return (buf.consume(1), False, False, None)
+    raw = buf.consume(i)
+    if binex.decodeBlock(verbose):
+      return (b'', True, True, (binex.returnBinary(), binex.subrecord.tow, binex.subrecord.epochTime()))
+    if verbose >= 5:
+      print("   Err: Non-CNAV block.")
+    return (raw, True, False, None)
+
+class Async_TCP_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
+  #sources: "host:port" or a list of them (or a comma-separated string), fmt: "sbf" or "binex".
+  #As a client, one connection is opened to every source. With listen, a server is started on each
+  #source address, and streams (number of receiver connections) are read before reading ends.
+  sources = None
+  fmt = None
+  listen = None
+  streams = None
+  rejectedBlocks = None
+  CHUNK = 1 << 16
+  def __init__(self, sources, fmt="sbf", listen=False, streams=1, msgnum=0):
+    if isinstance(sources, str):
+      sources = sources.split(",")
+    self.sources = [self.address(src) for src in sources]
+    self.fmt = fmt.lower()
+    if self.fmt not in ["sbf", "binex"]:
+      raise StreamError("Stream format must be 'sbf' or 'binex'")
+    self.listen = listen
+    self.streams = streams
+    self.has_storage = HAS_Storage(receivers=streams if listen else len(self.sources))
+    self.msgnum = msgnum
+    self.pppWiz = False
+    self.rejectedBlocks = 0
+
+  def address(self, src):
+    addr, port = str(src).strip().rsplit(":", 1)
+    return addr, int(port)
+
+  def parser(self):
+    return SBF_Stream_Parser() if self.fmt == "sbf" else Binex_Stream_Parser()
+
+  async def readBlocks(self, reader, parser=None, verbose=0):
+    #Async iterator over the parsed blocks of an asyncio.StreamReader, ends when the stream closes
+    if parser is None:
+      parser = self.parser()
+    while True:
+      item = parser.next(verbose)
+      if item is not None:
+        yield item
+        continue
+      data = await reader.read(self.CHUNK)
+      if not data:
+        return
+      parser.buffer.feed(data)
+
+  def read(self, src=None, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #Reads all streams until x messages (mode 'm') or x seconds (mode 't') or until they are closed
+    if src != None:
+      self.__init__(src, self.fmt, self.listen, self.streams, self.msgnum)
+    if converter is not None and converter.pppWiz:
+      self.pppWiz = True
+    return asyncio.run(self.readAsync(converter, output, mode, x, compact, HRclk, lowerUDI, verbose))
+
+  async def readAsync(self, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    self.counts = [0, 0, 0]
+    timeout = None
+    if x != None:
+      if mode == "m":
+        self.msgnum = x
+      elif mode == "t":
+        timeout = x
+    self.done = asyncio.Event()
+    args = (converter, output, compact, HRclk, lowerUDI, verbose)
+    servers = []
+    if self.listen:
+      self.connected = self.closed = 0
+      for addr, port in self.sources:
+        servers += [await asyncio.start_server(lambda r, w: self.serve(r, w, *args), addr, port)]
+      tasks = []
+    else:
+      tasks = [asyncio.ensure_future(self.connect(addr, port, *args)) for addr, port in self.sources]
+      asyncio.ensure_future(self.finish(tasks))
+    try:
+      await asyncio.wait_for(self.done.wait(), timeout)
+    except asyncio.TimeoutError:
+      pass
+    for server in servers:
+      server.close()
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    j, cnavs, hasnum = self.counts
+    if verbose>=1:
+      if self.rejectedBlocks > 0:
+        print(str(self.rejectedBlocks)+" SBF blocks were rejected due to a CRC error.")
+      print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
+        +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
+
+  async def finish(self, tasks):
+    await asyncio.gather(*tasks, return_exceptions=True)
+    self.done.set()
+
+  async def connect(self, addr, port, *args):
+    try:
+      reader, writer = await asyncio.open_connection(addr, port)
+    except OSError as e:
+      print("Connection to " + addr + ":" + str(port) + " failed: " + str(e))
+      return
+    await self.readStream(reader, writer, addr + ":" + str(port), *args)
+
+  async def serve(self, reader, writer, *args):
+    self.connected += 1
+    peer = writer.get_extra_info("peername")
+    await self.readStream(reader, writer, str(peer), *args)
+    self.closed += 1
+    if self.closed >= self.streams:
+      self.done.set()
+
+  async def readStream(self, reader, writer, name, converter=None, output=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #Reads one stream to its end
+    if verbose >= 1:
+      print("Reading stream " + name)
+    parser = self.parser()
+    rejected = 0
+    try:
+      async for item in self.readBlocks(reader, parser, verbose):
+        if parser.rejectedBlocks > rejected:
+          self.rejectedBlocks += parser.rejectedBlocks - rejected
+          rejected = parser.rejectedBlocks
+        raw, block, cnav, page = item
+        if self.pppWiz and output != None and len(raw) > 0:
+          output.write(raw, 1, parser.RAW_FORMAT)
+        if not block:
+          continue
+        self.counts[0] += 1
+        self.blocks += 1
+        if verbose >= 5:
+          print("Message no. " + str(self.counts[0]))
+        if cnav:
+          self.counts[1] += 1
+          self.cnavBlocks += 1
+        if page is not None and self.feedPage(*page, converter, output, compact, HRclk, lowerUDI, verbose):
+          self.counts[2] += 1
+        if self.msgnum != 0 and self.counts[0] >= self.msgnum:
+          self.done.set()
+          break
+    except (ConnectionError, asyncio.IncompleteReadError):
+      pass
+    finally:
+      writer.close()
+    if verbose >= 1:
+      print("TCP closed and last message read: " + name)
+
+  def close(self):
+    pass
@@ -8,9 +8,8 @@ VER   DATE        AUTHOR
 '''
 
 import struct
-import math
-from galileo_has_decoder.utils import bits2Bytes, gpst2time
-from galileo_has_decoder.utils_binex import Binex_Record, splitStream
+from galileo_has_decoder.utils import gpst2time, Mapped_File, Page_Feeding
+from galileo_has_decoder.utils_binex import Binex_Record, BinexError
 from galileo_has_decoder.has_classes import HAS_Storage
 from galileo_has_decoder.ssr_converter import SSR_Converter
 from galileo_has_decoder.tcp_server import TCP_Server
@@ -19,15 +18,27 @@ class FileError(Exception):
   #Base File Error class
   pass
 
-class Binex_Reader:
+class Binex_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
   file = None
-  def __init__(self, path, msgnum=0, skip=0):
-    self.file = open(path, "rb")
-    lines = self.file.readlines()
-    lines = lines[int(skip*len(lines)):]
-    self.pNum = math.ceil(len(lines) / 20000)
-    self.fileC = b''.join(lines)
-    self.pages = splitStream(self.fileC, self.pNum)
+  pos = None
+  nextPos = None
+  syncHits = None
+  #Optional: offset at which the search for further records stops, and a list to which the search
+  #state of every record is appended (used to read a file in shards)
+  end = None
+  trace = None
+  #Record starts: forward sync bytes followed by record ID 0x01, or reverse terminators
+  SYNC_PATTERNS = [b'\xc2\x01', b'\xe2\x01', b'\xd2\x01', b'\xf2\x01', b'\xb4', b'\xb0']
+  def __init__(self, path, msgnum=0, skip=0, skipBytes=0):
+    self.file = Mapped_File(path)
+    #Byte offset of the current record (or of the first byte to search from)
+    self.pos = self.file.offset(skip, skipBytes)
+    #Byte offset to search the next record from
+    self.nextPos = self.pos
+    self.syncHits = {}
     self.has_storage = HAS_Storage()
     self.msgnum = msgnum
     self.pppWiz = False
@@ -37,81 +48,77 @@ class Binex_Reader:
         raise Exception("File Reading does only support message-number constraints")
     if x != None: self.msgnum = x
     if path != None:
-      self.file = open(path, "rb")
-      self.fileC = b''.join(self.file.readlines())
-      self.pages = splitStream(self.fileC, self.pNum)
+      self.file.close()
+      self.file = Mapped_File(path)
+      self.pos = self.nextPos = 0
+      self.syncHits = {}
 
     if converter is not None:
         if converter.pppWiz:
             self.output = output
             self.pppWiz = True
 
-    i = 0
+    data = self.file.view
+    i = self.nextPos
     j = 0
-    pC = 0
-    content = self.pages[pC]
     cnavs = 0
     hasnum=0
     while j<self.msgnum or self.msgnum==0:
+        if self.end is not None and i >= self.end:
+            break
+        if self.trace is not None:
+            self.trace.append((i, self.pos))
         j += 1
+        self.blocks += 1
         if verbose >= 5:
             print("Message " + str(j))
         try:
-            content, pC = self.findMessage(content, pC, i, verbose)
+            self.pos = self.findMessage(i, verbose)
         except FileError:
             if verbose >= 1:
                 print("EOF REACHED: Ending operation")
             break
-        i = 1
         if verbose >= 5:
             print("   Found start of block")
         binex = Binex_Record()
-        i = binex.readBlock(content)
+        try:
+            #Parsed in place, the record's message is a view into the mapped file
+            i = binex.readBlock(data, self.pos)
+        except (BinexError, IndexError) as e:
+            #IndexError: a false sync byte, e.g. when starting in the middle of the file
+            if verbose >= 5:
+                print("   Err:", e)
+            i = self.pos+1
+            continue
         if binex.decodeBlock(verbose):
             cnavs+=1
-            if self.has_storage.feedMessage(binex.returnBinary(), binex.subrecord.tow, verbose=verbose):
+            self.cnavBlocks += 1
+            if self.feedPage(binex.returnBinary(), binex.subrecord.tow, binex.subrecord.epochTime(), converter, output, compact, HRclk, lowerUDI, verbose):
                 hasnum += 1
-                if converter != None:
-                    decoded_msg = self.has_storage.lastMessage
-                    tow = self.has_storage.lastMessage_tow
-                    converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
-                    if output != None and converted != None:
-                        for msg_conv in converted:
-                            msg_bytes = bits2Bytes(msg_conv)
-                            if self.pppWiz:
-                                output.write(msg_bytes, 2, 1, binex.subrecord.epochTime())
-                            else:
-                                output.write(msg_bytes)   
         elif verbose >= 5:
             print("   Err: Non-CNAV block.")
+    self.nextPos = i
     if verbose>=1:
         print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
           +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
 
-  def findMessage(self, stream, pC, i, verbose=0):
-    syncbytes = [0xc2, 0xe2, 0xd2, 
-                 0xf2, 0xb4, 0xb0]
-    self.checkEnd(stream, i, pC)
-    while True:
-        while stream[i] not in syncbytes:
-            i += 1
-            if self.checkEnd(stream, i, pC):
-                pC += 1
-                stream = stream[i:] + self.pages[pC]
-                i = 0
-                if verbose >= 2:
-                    print("Next page")
-                continue
-        if (stream[i+1] == 1 and stream[i] in syncbytes[:-2]) or (stream[i] in syncbytes[-2:]):
-            break
-        i+=1
-    if self.pppWiz and i>0:
-        self.output.write(stream[:i], 1, 10)
-    return stream[i:], pC
+  def findMessage(self, i, verbose=0):
+    #Next record start at or after byte offset i. Each sync pattern is searched with mmap.find and
+    #its next occurrence is remembered, so the file is scanned only once per pattern.
+    idx = -1
+    for sync in self.SYNC_PATTERNS:
+      hit = self.syncHits.get(sync)
+      if hit is None or (hit != -1 and hit < i):
+        hit = self.file.map.find(sync, i)
+        self.syncHits[sync] = hit
+      if hit != -1 and (idx == -1 or hit < idx):
+        idx = hit
+    if idx == -1 or self.file.size-idx < 78:
+      raise FileError("EOF REACHED: Ending operation")
+    if self.pppWiz and idx>self.pos:
+      self.output.write(self.file.view[self.pos:idx], 1, 10)
+    return idx
 
-  def checkEnd(self, stream, i, pC):
-      if len(stream[i:]) < 78:
-        if pC >= self.pNum-1:
-            raise FileError("EOF REACHED: Ending operation")
-        return True
-      return False
\ No newline at end of file
+  def close(self):
+    self.file.close()
@@ -11,10 +11,27 @@ from galileo_has_decoder.sbf_reading import SBF_Reader
 from galileo_has_decoder.binex_reading import Binex_Reader
 from galileo_has_decoder.tcp_sbf_reading import TCP_SBF_Reader
 from galileo_has_decoder.tcp_binex_reading import TCP_Binex_Reader
+from galileo_has_decoder.async_tcp_reading import Async_TCP_Reader
 from galileo_has_decoder.serial_reading import Serial_SBF_Reader, Serial_Binex_Reader
-from galileo_has_decoder.tcp_server import TCP_Server
+from galileo_has_decoder.shard_reading import Sharded_Reader
+from galileo_has_decoder.multi_reading import Multi_Reader
+from galileo_has_decoder.pipeline import Pipeline
+from galileo_has_decoder.latency import Latency_Monitor
+from galileo_has_decoder.metrics import Metrics_Registry, Metrics_Server
+from galileo_has_decoder.profiling import Code_Profiler, Stage_Timer, Profiling_Error
+from galileo_has_decoder.tcp_server import Broadcast_Server
+from galileo_has_decoder.ntrip_caster import NTRIP_Caster
 from galileo_has_decoder.ssr_converter import SSR_Converter
 from galileo_has_decoder.file_write import File_Writer, PPP_Wiz_Writer
+from galileo_has_decoder.ssr_classes import SSR_HAS
+from galileo_has_decoder.utils import processContext
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
 import serial
 
 class Source_Error(Exception):
@@ -24,11 +41,52 @@ class Mode_Error(Exception):
     #Basic error when determining the mode of the converter
     pass
 
+def convertFile(job):
+    #Batch worker: converts one file into a temporary output file with its own HAS storage and SSR
+    #converter. Masks and IODs are class-level state of SSR_HAS and are reset, so a file's output
+    #does not depend on the files converted before in the same process.
+    #Returns (path, size, (messages, C/Nav messages, HAS messages), seconds, log, error).
+    path, target, outFormat, modeIn, modeOut, index, x, compact, HRclk, lowerUDI, verbose = job
+    SSR_HAS.HAS_MASKS[:] = None
+    SSR_HAS.HAS_IODs[:] = None
+    log = io.StringIO()
+    t = time.time()
+    counts, error = None, None
+    try:
+        size = os.path.getsize(path)
+        with contextlib.redirect_stdout(log):
+            converter = HAS_Converter(path, target, outFormat, modeIn=modeIn, modeOut=modeOut, index=index, mute=1)
+            try:
+                counts = converter.convertX(x, compact=compact, HRclk=HRclk, lowerUDI=lowerUDI, verbose=verbose)
+            finally:
+                converter.reader.close()
+                converter.output.close()
+    except Exception as e:
+        size, error = 0, repr(e)
+    return path, size, counts, time.time()-t, log.getvalue(), error
+
 class HAS_Converter:
     reader = None
     converter = None
     tcp = None
-    def __init__(self, source, target, outFormat, modeIn=None, modeOut=None, port=None, baudrate=115200, skip=0.0, mute=0):
+    sources = None
+    batchModeIn = None
+    pipeline = None
+    latency = None
+    metrics = None
+    profiler = None
+    workers = None
+    def __init__(self, source, target, outFormat, modeIn=None, modeOut=None, port=None, baudrate=115200, skip=0.0, index=False, shards=None, pipeline=False, maxQueue=64, policy="block", latency=None, metrics=None, profile=None, profileOut=None, mute=0, workers=None, skipBytes=0):
+        #A list of files is a batch, converted with convertFiles (internally modeIn 0)
+        if isinstance(source, (list, tuple)):
+            if modeIn != None and int(modeIn) not in [1, 2]:
+                raise Source_Error("Error: Batches of sources are only supported for SBF or BINEX files [1, 2]")
+            self.sources = [str(path) for path in source]
+            self.batchModeIn = modeIn
+            modeIn = 0
+        self.index = index
+        self.mute = mute
+        self.workers = workers
         #Source Initialization
         if modeIn == None:
             if str(source).replace(".", "").isnumeric() or 'localhost' in str(source).lower():
@@ -41,31 +99,53 @@ class HAS_Converter:
             else: 
                 raise Source_Error("Error: For serial communication, please specify modeIn to be [3, 4] for SBF or BINEX")
         self.modeIn = modeIn = int(modeIn)
-        if modeIn == 1:
+        if modeIn == 0:
+            inp = "batch of " + str(len(self.sources)) + " files"
+        elif shards != None and (modeIn == 1 or modeIn == 2):
+            inp = ("SBF" if modeIn == 1 else "BINEX") + " file in " + str(shards) + " shards"
+            self.reader = Sharded_Reader(source, modeIn, int(shards), skip=float(skip), skipBytes=int(skipBytes))
+        elif modeIn == 1:
             inp = "SBF file"
-            self.reader = SBF_Reader(source, skip=float(skip))
+            self.reader = SBF_Reader(source, skip=float(skip), index=index, skipBytes=int(skipBytes))
         elif modeIn == 2:
             inp = "BINEX file"
-            self.reader = Binex_Reader(source, skip=float(skip))
+            self.reader = Binex_Reader(source, skip=float(skip), skipBytes=int(skipBytes))
             pass
-        elif modeIn == 3:
-            inp = "Serial SBF Stream on port " + str(source)
-            try:
-                self.reader = Serial_SBF_Reader(source, int(baudrate))
-            except serial.serialutil.SerialException:
-                raise Source_Error("Error: There was an error opening the SBF serial port indicated.")
-        elif modeIn == 4:
-            inp = "Serial BINEX Stream on port " + str(source)
-            try:
-                self.reader = Serial_Binex_Reader(source, int(baudrate))
-            except serial.serialutil.SerialException:
-                raise Source_Error("Error: There was an error opening BINEX the serial port indicated.")
-        elif modeIn == 5:
-            inp = "SBF TCP stream on " + str(source)
-            self.reader = TCP_SBF_Reader(source)
-        elif modeIn == 6:
-            inp = "BINEX TCP stream on " + str(source)
-            self.reader = TCP_Binex_Reader(source)
+        elif modeIn >= 3 and modeIn <= 6:
+            #Several receivers (comma-separated sources) are read at once and decoded together
+            readers, inps = [], []
+            for src in str(source).split(","):
+                src = src.strip()
+                if modeIn == 3:
+                    inps += ["Serial SBF Stream on port " + str(src)]
+                    try:
+                        readers += [Serial_SBF_Reader(src, int(baudrate))]
+                    except serial.serialutil.SerialException:
+                        raise Source_Error("Error: There was an error opening the SBF serial port indicated.")
+                elif modeIn == 4:
+                    inps += ["Serial BINEX Stream on port " + str(src)]
+                    try:
+                        readers += [Serial_Binex_Reader(src, int(baudrate))]
+                    except serial.serialutil.SerialException:
+                        raise Source_Error("Error: There was an error opening BINEX the serial port indicated.")
+                elif modeIn == 5:
+                    inps += ["SBF TCP stream on " + str(src)]
+                    readers += [TCP_SBF_Reader(src)]
+                elif modeIn == 6:
+                    inps += ["BINEX TCP stream on " + str(src)]
+                    readers += [TCP_Binex_Reader(src)]
+            if len(readers) == 1:
+                inp = inps[0]
+                self.reader = readers[0]
+            else:
+                inp = "set of " + str(len(readers)) + " receivers (" + ", ".join(inps) + ")"
+                self.reader = Multi_Reader(readers)
+        elif modeIn >= 7 and modeIn <= 10:
+            #asyncio streams, source may be a comma-separated list of "address:port"
+            fmt = "sbf" if modeIn % 2 == 1 else "binex"
+            listen = modeIn >= 9
+            inp = fmt.upper() + " TCP stream(s) " + ("listening on " if listen else "from ") + str(source)
+            self.reader = Async_TCP_Reader(source, fmt, listen=listen)
         #Target Initialization
         if modeOut == None:
             if target.replace(".", "").isnumeric() or target == 'localhost':
@@ -74,11 +154,12 @@ class HAS_Converter:
                 modeOut = 4
             else:
                 modeOut = 2
-        modeOut = int(modeOut)
+        self.modeOut = modeOut = int(modeOut)
         if modeOut == 1:
             if port==None: port = 6947
             else: port = int(port)
-            self.output = TCP_Server(target, port)
+            #Any number of clients, the decoder does not wait for them
+            self.output = Broadcast_Server(target, port)
             out = "TCP server on address " + str(target) + ", port " + str(port)
         elif modeOut == 2:
             self.output = File_Writer(target)
@@ -89,8 +170,15 @@ class HAS_Converter:
         elif modeOut == 4:
             out = "stream in PPP Wizard format"
             self.output = PPP_Wiz_Writer(target, mode=4)
+        elif modeOut == 5:
+            #target: "address" or "address/mountpoint"
+            if port==None: port = 2101
+            else: port = int(port)
+            addr, mountpoint = (target.split("/", 1) + [None])[:2]
+            self.output = NTRIP_Caster(addr, port, mountpoint)
+            out = "NTRIP caster on address " + str(addr) + ", port " + str(port) + ", mountpoint /" + self.output.mountpoint
         else:
-            raise Mode_Error("The output mode could not be recognized. Possibilities are: [1:TCP, 2:File, 3:PPP Wizard Stream]")
+            raise Mode_Error("The output mode could not be recognized. Possibilities are: [1:TCP, 2:File, 3:PPP Wizard File, 4:PPP Wizard Stream, 5:NTRIP Caster]")
 
         #Converter Initialization
         if outFormat == 1 or str(outFormat).upper() == "IGS" or outFormat == "1":
@@ -102,6 +190,59 @@ class HAS_Converter:
         else:
             raise Mode_Error("The output format could not be recognized. Possibilities are: [1:IGS, 2:RTCM3]")
         
+        #Pipelined runtime: decoding, conversion and output in threads of their own
+        if pipeline:
+            if modeIn == 0 or shards != None:
+                raise Mode_Error("The pipeline is not available for batches of files or sharded reading.")
+            self.pipeline = Pipeline(self.reader.has_storage, self.converter, self.output, maxQueue=maxQueue, policy=policy)
+            self.pipeline.attach(self.reader)
+            out += " (pipelined)"
+
+        #Latency instrumentation, summaries every latency seconds (0: on exit only)
+        if latency != None or metrics != None:
+            if modeIn == 0 or shards != None:
+                raise Mode_Error("Latencies and metrics are not measured for batches of files or sharded reading.")
+            if latency != None:
+                self.latency = Latency_Monitor(interval=float(latency) if float(latency) > 0 else None)
+            else:
+                self.latency = Latency_Monitor(atExit=False)
+            self.latency.attach(self.reader.has_storage, self.converter, self.output)
+            if self.pipeline != None:
+                self.pipeline.latency = self.latency
+
+        #Metrics served on a local HTTP port ("port" or "address:port")
+        if metrics != None:
+            registry = Metrics_Registry()
+            registry.addReader(self.reader)
+            registry.addStorage(self.reader.has_storage)
+            registry.addConverter(self.converter)
+            registry.addOutput(self.output)
+            registry.addLatency(self.latency)
+            if self.pipeline != None:
+                registry.addPipeline(self.pipeline)
+            addr, _, mport = str(metrics).rpartition(":")
+            self.metrics = Metrics_Server(registry, addr or None, mport)
+
+        #Profiling of the convert calls, written on exit and on SIGUSR1
+        if profile != None:
+            try:
+                if profile == "stages":
+                    if modeIn == 0 or shards != None:
+                        raise Mode_Error("Stage times are not measured for batches of files or sharded reading.")
+                    self.profiler = Stage_Timer(profileOut, threaded=self.pipeline != None)
+                    self.profiler.attach(self.reader.has_storage, self.converter, self.output)
+                else:
+                    #Batches are profiled converting the files in the calling process
+                    if modeIn == 0 and workers != None and workers > 1:
+                        raise Mode_Error("Batches of files are profiled in one process, use 1 worker.")
+                    self.profiler = Code_Profiler(profile, profileOut)
+            except Profiling_Error as e:
+                raise Mode_Error(str(e))
+            self.convertX = self.profiler.wrap(self.convertX)
+            self.convertAll = self.profiler.wrap(self.convertAll)
+            self.convertUntil = self.profiler.wrap(self.convertUntil)
+            self.convertFiles = self.profiler.wrap(self.convertFiles)
+
         if modeOut != 4 and not mute:
             print("--- Set up converter ---\nReading HAS messages from a " + inp
                 + " and converting to " + fmt + ". Output will be written to a " + out + ".")
@@ -110,30 +251,119 @@ class HAS_Converter:
         #Convert all messages available from the source
         if verbose != 0 and self.converter != None:
             self.converter.setVerbose(verbose)
-        if self.modeIn == 1 or self.modeIn == 2 or self.modeIn == 5 or self.modeIn == 6:
-            self.reader.read(converter=self.converter, output=self.output, compact=compact, HRclk=HRclk, verbose=verbose)
+        if self.modeIn == 0:
+            return self.convertFiles(compact=compact, HRclk=HRclk, lowerUDI=lowerUDI, verbose=verbose)
+        if self.modeIn == 1 or self.modeIn == 2 or self.modeIn >= 5:
+            return self.readSource(compact=compact, HRclk=HRclk, verbose=verbose)
         elif self.modeIn == 3 or self.modeIn == 4:
-            self.reader.read(converter=self.converter, output=self.output, compact=compact, HRclk=HRclk, verbose=verbose)
+            return self.readSource(compact=compact, HRclk=HRclk, verbose=verbose)
         pass
 
     def convertX(self, x, compact=True, HRclk=False, lowerUDI=True, verbose=0):
         if verbose != 0 and self.converter != None:
             self.converter.setVerbose(verbose)
         #Convert X messages from the source
-        if self.modeIn == 1 or self.modeIn == 2 or self.modeIn == 5 or self.modeIn == 6:
-            self.reader.read(converter=self.converter, output=self.output, x=x, compact=compact, HRclk=HRclk, verbose=verbose)
+        if self.modeIn == 0:
+            return self.convertFiles(x=x, compact=compact, HRclk=HRclk, lowerUDI=lowerUDI, verbose=verbose)
+        if self.modeIn == 1 or self.modeIn == 2 or self.modeIn >= 5:
+            return self.readSource(x=x, compact=compact, HRclk=HRclk, verbose=verbose)
         elif self.modeIn == 3 or self.modeIn == 4:
-            self.reader.read(converter=self.converter, output=self.output, x=x, compact=compact, HRclk=HRclk, verbose=verbose)
+            return self.readSource(x=x, compact=compact, HRclk=HRclk, verbose=verbose)
         pass
 
+    def readSource(self, **kwargs):
+        #Reads from the source, through the pipeline if there is one: the reader only reads, and the
+        #HAS messages are counted by the pipeline once it has processed everything read
+        if self.pipeline == None:
+            return self.reader.read(converter=self.converter, output=self.output, **kwargs)
+        hasnum = self.pipeline.hasnum
+        res = self.reader.read(converter=self.converter, output=self.pipeline, **kwargs)
+        self.pipeline.flush()
+        hasnum = self.pipeline.hasnum - hasnum
+        if kwargs.get("verbose", 0) >= 1:
+            print("Pipeline: " + str(hasnum) + " HAS messages have been decoded and converted.")
+            self.pipeline.printMetrics()
+        if res != None:
+            res = (res[0], res[1], hasnum)
+        return res
+
+    def convertFiles(self, paths=None, workers=None, x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+        #Convert a batch of SBF/BINEX files on a pool of worker processes. Every file is converted
+        #independently and the outputs are merged into the target in the order of paths.
+        #x: Optional message limit per file. Returns (path, messages, C/Nav messages, HAS messages) per file.
+        if paths == None:
+            paths = self.sources
+        if workers == None:
+            workers = self.workers
+        if self.profiler != None:
+            #The profiler only sees the calling process
+            if workers != None and workers > 1:
+                raise Mode_Error("Batches of files are profiled in one process, use 1 worker.")
+            workers = 1
+        if workers == None:
+            workers = os.cpu_count() or 1
+        #Workers write PPP Wizard output to files as well, the stream is printed when merging
+        modeOut = 3 if self.converter.pppWiz else 2
+        tmpdir = tempfile.mkdtemp(prefix="has_batch_")
+        jobs = [(path, os.path.join(tmpdir, str(i)+".out"), self.converter.mode, self.batchModeIn, modeOut,
+                 self.index, x, compact, HRclk, lowerUDI, verbose) for i, path in enumerate(paths)]
+        results = []
+        size = messages = hasnum = 0
+        pool = None
+        t = time.time()
+        try:
+            if workers <= 1:
+                done = map(convertFile, jobs)
+            else:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=processContext())
+                done = (future.result() for future in [pool.submit(convertFile, job) for job in jobs])
+            #Results are taken in submission order, so the merge does not depend on the scheduling
+            for job, (path, fsize, counts, dt, log, error) in zip(jobs, done):
+                if verbose >= 1:
+                    print(path + ":\n" + log, end="")
+                if error != None:
+                    print("Error: " + path + " could not be converted: " + error)
+                    continue
+                self.mergeOutput(job[1])
+                os.remove(job[1])
+                results += [(path,) + tuple(counts)]
+                size += fsize
+                messages += counts[0]
+                hasnum += counts[2]
+        finally:
+            if pool != None:
+                pool.shutdown(cancel_futures=True)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        dt = max(time.time()-t, 1e-9)
+        if verbose >= 1 or not self.mute:
+            print("Converted " + str(len(results)) + " of " + str(len(paths)) + " files (" + "{:.1f}".format(size/1e6)
+                  + " MB) in " + "{:.1f}".format(dt) + " s with " + str(workers) + " worker(s): "
+                  + "{:.0f}".format(messages/dt) + " blocks/s, " + "{:.1f}".format(hasnum/dt) + " HAS messages/s, "
+                  + "{:.1f}".format(size/dt/1e6) + " MB/s.")
+        return results
+
+    def mergeOutput(self, path):
+        #Append the output of a batch worker to the target
+        with open(path, "rb") as f:
+            if self.modeOut == 2:
+                shutil.copyfileobj(f, self.output.file)
+                return
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                if self.modeOut == 1 or self.modeOut == 5:
+                    self.output.write(chunk)
+                elif self.modeOut == 3:
+                    self.output.file.write(chunk.decode())
+                else:
+                    print(chunk.decode(), end="")
+
     def convertUntil(self, s, compact=True, HRclk=False, lowerUDI=True, verbose=0):
         if verbose != 0 and self.converter != None:
             self.converter.setVerbose(verbose)
         #Convert messages from the source for s seconds
         if self.modeIn == 1 or self.modeIn == 2:
             raise Mode_Error("ERROR: Timed constraint not available for file reading.")
-        elif self.modeIn >= 3 and self.modeIn <= 6:
-            self.reader.read(converter=self.converter, output=self.output, mode="t", x=s, compact=compact, HRclk=HRclk, verbose=verbose)
+        elif self.modeIn >= 3 and self.modeIn <= 10:
+            return self.readSource(mode="t", x=s, compact=compact, HRclk=HRclk, verbose=verbose)
         pass
 
     
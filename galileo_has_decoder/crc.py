@@ -8,41 +8,7 @@ VER   DATE        AUTHOR
 
 import numpy as np
 import sys
-from galileo_has_decoder.utils import xor_int, bits2Bytes, bytes2bits
-
-CRC_16CCIT_LookUp = [
-  0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50a5, 0x60c6, 0x70e7,
-  0x8108, 0x9129, 0xa14a, 0xb16b, 0xc18c, 0xd1ad, 0xe1ce, 0xf1ef,
-  0x1231, 0x0210, 0x3273, 0x2252, 0x52b5, 0x4294, 0x72f7, 0x62d6,
-  0x9339, 0x8318, 0xb37b, 0xa35a, 0xd3bd, 0xc39c, 0xf3ff, 0xe3de,
-  0x2462, 0x3443, 0x0420, 0x1401, 0x64e6, 0x74c7, 0x44a4, 0x5485,
-  0xa56a, 0xb54b, 0x8528, 0x9509, 0xe5ee, 0xf5cf, 0xc5ac, 0xd58d,
-  0x3653, 0x2672, 0x1611, 0x0630, 0x76d7, 0x66f6, 0x5695, 0x46b4,
-  0xb75b, 0xa77a, 0x9719, 0x8738, 0xf7df, 0xe7fe, 0xd79d, 0xc7bc,
-  0x48c4, 0x58e5, 0x6886, 0x78a7, 0x0840, 0x1861, 0x2802, 0x3823,
-  0xc9cc, 0xd9ed, 0xe98e, 0xf9af, 0x8948, 0x9969, 0xa90a, 0xb92b,
-  0x5af5, 0x4ad4, 0x7ab7, 0x6a96, 0x1a71, 0x0a50, 0x3a33, 0x2a12,
-  0xdbfd, 0xcbdc, 0xfbbf, 0xeb9e, 0x9b79, 0x8b58, 0xbb3b, 0xab1a,
-  0x6ca6, 0x7c87, 0x4ce4, 0x5cc5, 0x2c22, 0x3c03, 0x0c60, 0x1c41,
-  0xedae, 0xfd8f, 0xcdec, 0xddcd, 0xad2a, 0xbd0b, 0x8d68, 0x9d49,
-  0x7e97, 0x6eb6, 0x5ed5, 0x4ef4, 0x3e13, 0x2e32, 0x1e51, 0x0e70,
-  0xff9f, 0xefbe, 0xdfdd, 0xcffc, 0xbf1b, 0xaf3a, 0x9f59, 0x8f78,
-  0x9188, 0x81a9, 0xb1ca, 0xa1eb, 0xd10c, 0xc12d, 0xf14e, 0xe16f,
-  0x1080, 0x00a1, 0x30c2, 0x20e3, 0x5004, 0x4025, 0x7046, 0x6067,
-  0x83b9, 0x9398, 0xa3fb, 0xb3da, 0xc33d, 0xd31c, 0xe37f, 0xf35e,
-  0x02b1, 0x1290, 0x22f3, 0x32d2, 0x4235, 0x5214, 0x6277, 0x7256,
-  0xb5ea, 0xa5cb, 0x95a8, 0x8589, 0xf56e, 0xe54f, 0xd52c, 0xc50d,
-  0x34e2, 0x24c3, 0x14a0, 0x0481, 0x7466, 0x6447, 0x5424, 0x4405,
-  0xa7db, 0xb7fa, 0x8799, 0x97b8, 0xe75f, 0xf77e, 0xc71d, 0xd73c,
-  0x26d3, 0x36f2, 0x0691, 0x16b0, 0x6657, 0x7676, 0x4615, 0x5634,
-  0xd94c, 0xc96d, 0xf90e, 0xe92f, 0x99c8, 0x89e9, 0xb98a, 0xa9ab,
-  0x5844, 0x4865, 0x7806, 0x6827, 0x18c0, 0x08e1, 0x3882, 0x28a3,
-  0xcb7d, 0xdb5c, 0xeb3f, 0xfb1e, 0x8bf9, 0x9bd8, 0xabbb, 0xbb9a,
-  0x4a75, 0x5a54, 0x6a37, 0x7a16, 0x0af1, 0x1ad0, 0x2ab3, 0x3a92,
-  0xfd2e, 0xed0f, 0xdd6c, 0xcd4d, 0xbdaa, 0xad8b, 0x9de8, 0x8dc9,
-  0x7c26, 0x6c07, 0x5c64, 0x4c45, 0x3ca2, 0x2c83, 0x1ce0, 0x0cc1,
-  0xef1f, 0xff3e, 0xcf5d, 0xdf7c, 0xaf9b, 0xbfba, 0x8fd9, 0x9ff8,
-  0x6e17, 0x7e36, 0x4e55, 0x5e74, 0x2e93, 0x3eb2, 0x0ed1, 0x1ef0]
+import binascii
 
 tbl_CRC24Q=[
     0x000000,0x864CFB,0x8AD50D,0x0C99F6,0x93E6E1,0x15AA1A,0x1933EC,0x9F7F17,
@@ -78,30 +44,83 @@ tbl_CRC24Q=[
     0xE37B16,0x6537ED,0x69AE1B,0xEFE2E0,0x709DF7,0xF6D10C,0xFA48FA,0x7C0401,
     0x42FA2F,0xC4B6D4,0xC82F22,0x4E63D9,0xD11CCE,0x575035,0x5BC9C3,0xDD8538]
 
+def asBytes(buf, buf_len=None):
+    # bytes are used as they are, other buffers are viewed without copying,
+    # lists of byte values are copied once
+    if not isinstance(buf, bytes):
+        try:
+            buf = memoryview(buf).cast("B")
+        except TypeError:
+            buf = bytes(buf)
+    if buf_len is not None and buf_len < len(buf):
+        buf = buf[:buf_len]
+    return buf
+
 # SBF checksum calculation --------------------------------------------------
 
-def compute16CCITT (buf, buf_len):
-    i = 0
-    _crc = 0 # Seed is 0, as suggested by the firmware, will compute CRC in the forward direction..
-    buf8 = buf
-    for i in range(buf_len):
-        inner = CRC_16CCIT_LookUp[xor_int(_crc >> 8, buf8[i])]
-        outer = xor_int(_crc << 8, inner)
-        _crc = np.array([outer], "u2")[0]
+def update16CCITT(_crc, buf):
+    # CRC-16-CCITT (poly 0x1021, non-reflected) as implemented in C by binascii
+    return binascii.crc_hqx(buf, _crc)
+
+def compute16CCITT(buf, buf_len=None):
+    # Seed is 0, as suggested by the firmware, will compute CRC in the forward direction..
+    return update16CCITT(0, asBytes(buf, buf_len))
+
+# RTCM3 checksum calculation ------------------------------------------------
+
+def update24Q(_crc, buf):
+    # Byte-wise table lookup on plain ints (CRC-24Q, poly 0x864CFB, non-reflected)
+    tbl = tbl_CRC24Q
+    for b in buf:
+        _crc = ((_crc << 8) & 0xFFFFFF) ^ tbl[(_crc >> 16) ^ b]
     return _crc
 
-def crc24q(buff, buf_len, verb=0):
-    i = 0
-    _crc = 0
+def crc24q(buff, buf_len=None, verb=0):
+    buff = asBytes(buff, buf_len)
     if verb>=1:
         print("\nNew CRC:")
-    for i in range(buf_len):
-        inner = (_crc << 8) & 0xFFFFFF
-        idx = xor_int((_crc >> 16), buff[i])
-        _crc = xor_int(inner, tbl_CRC24Q[idx])
-        if verb>=1:
+        _crc = 0
+        for b in buff:
+            inner = (_crc << 8) & 0xFFFFFF
+            idx = (_crc >> 16) ^ b
+            _crc = inner ^ tbl_CRC24Q[idx]
             print("Inner:",inner,"Tbllook:",tbl_CRC24Q[idx],"union:",_crc)
-    return _crc
+        return _crc
+    return update24Q(0, buff)
+
+# Streaming interface -------------------------------------------------------
+
+class CRC:
+    # Incremental CRC, e.g. to checksum a frame while it is being written:
+    # CRC24Q(intro).update(body).digest()
+    width = None
+    func = None
+    crc = None
+    def __init__(self, data=None, crc=0):
+        self.crc = crc
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        self.crc = type(self).func(self.crc, asBytes(data))
+        return self
+
+    def value(self):
+        return self.crc
+
+    def digest(self):
+        return self.crc.to_bytes(self.width // 8, "big")
+
+    def copy(self):
+        return type(self)(crc=self.crc)
+
+class CRC24Q(CRC):
+    width = 24
+    func = update24Q
+
+class CRC16CCITT(CRC):
+    width = 16
+    func = update16CCITT
 
 def rev_byteorder(msg, _bitw):
   if sys.byteorder == "little":
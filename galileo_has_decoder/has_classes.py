@@ -11,16 +11,184 @@ VER   DATE        AUTHOR
 from reedsolo import RSCodec, ReedSolomonError
 import pkg_resources
 import numpy as np
-import galois
 import time
+import threading
+from collections import OrderedDict
 # import os
 
-from galileo_has_decoder.utils import bits2Bytes, bytes2bits, dataValid, readHeader
+from galileo_has_decoder.utils import bits2Bytes, dataValid, readHeader
+
+_GEN_MATRIX = None
+
+class GF256_Native:
+  #GF(2^8) arithmetic on uint8 arrays via log/antilog lookup tables.
+  #Uses the HAS field polynomial x^8+x^4+x^3+x^2+1 (0x11d) with primitive element x,
+  #i.e. the same field as galois.GF(256).
+  name = "native"
+  POLY = 0x11d
+  EXP = None
+  LOG = None
+  MUL = None
+  INV = None
+  def __init__(self):
+    if GF256_Native.MUL is None:
+      GF256_Native.buildTables()
+
+  @classmethod
+  def buildTables(cls):
+    exp = np.zeros(510, dtype="u1")
+    log = np.zeros(256, dtype=int)
+    x = 1
+    for i in range(255):
+      exp[i] = x
+      log[x] = i
+      x <<= 1
+      if x & 0x100:
+        x ^= cls.POLY
+    exp[255:] = exp[:255]
+    mul = exp[log[:, None] + log[None, :]]
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    inv = np.zeros(256, dtype="u1")
+    inv[1:] = exp[255 - log[1:]]
+    for tbl in (exp, log, mul, inv):
+      tbl.setflags(write=False)
+    cls.EXP, cls.LOG, cls.MUL, cls.INV = exp, log, mul, inv
+
+  def array(self, x):
+    return np.asarray(x, dtype="u1")
+
+  def multiply(self, a, b):
+    return self.MUL[self.array(a), self.array(b)]
+
+  def matmul(self, A, B):
+    A, B = self.array(A), self.array(B)
+    vec = B.ndim == 1
+    if vec:
+      B = B[:, None]
+    #Products of all (row, k, column) combinations, summed (xor) over k
+    res = np.bitwise_xor.reduce(self.MUL[A[:, :, None], B[None, :, :]], axis=1)
+    return res[:, 0] if vec else res
+
+  def inv(self, A):
+    A = self.array(A)
+    n = A.shape[0]
+    if A.ndim != 2 or A.shape[1] != n:
+      raise np.linalg.LinAlgError("Only square matrices can be inverted")
+    #Gauss-Jordan elimination on [A | I]
+    aug = np.concatenate((A, np.eye(n, dtype="u1")), axis=1)
+    for c in range(n):
+      nz = np.flatnonzero(aug[c:, c])
+      if len(nz) == 0:
+        raise np.linalg.LinAlgError("Matrix is singular and not invertible")
+      p = c + nz[0]
+      if p != c:
+        aug[[c, p]] = aug[[p, c]]
+      aug[c] = self.MUL[self.INV[aug[c, c]], aug[c]]
+      f = aug[:, c].copy()
+      f[c] = 0
+      aug ^= self.MUL[f[:, None], aug[c][None, :]]
+    return aug[:, n:]
+
+class GF256_Galois:
+  #GF(2^8) arithmetic using the optional galois package, e.g. for cross-validation of GF256_Native
+  name = "galois"
+  GF = None
+  def __init__(self):
+    try:
+      import galois
+    except ImportError:
+      raise HAS_Error("The galois package is required for the 'galois' GF(256) backend")
+    self.GF = galois.GF(256)
+
+  def array(self, x):
+    return self.GF(np.asarray(x, dtype="u1"))
+
+  def multiply(self, a, b):
+    return np.asarray(self.array(a) * self.array(b), dtype="u1")
+
+  def matmul(self, A, B):
+    return np.asarray(self.array(A) @ self.array(B), dtype="u1")
+
+  def inv(self, A):
+    return np.asarray(np.linalg.inv(self.array(A)), dtype="u1")
+
+GF_BACKENDS = {"native": GF256_Native, "galois": GF256_Galois}
+
+def setGFBackend(name="native"):
+  #Select the GF(256) arithmetic used by all HAS objects. Cached decoding matrices are dropped.
+  try:
+    HAS.backend = GF_BACKENDS[name]()
+  except KeyError:
+    raise HAS_Error("Unknown GF(256) backend: " + str(name) + ". Options are " + str(list(GF_BACKENDS.keys())))
+  HAS.decoCache.clear()
+  return HAS.backend
+
+def genMatrix():
+  #Shared, read-only HAS generator matrix (255x32, uint8 GF(256) elements), loaded once per process.
+  #The binary resource is preferred, the original text file is kept as a fallback.
+  global _GEN_MATRIX
+  if _GEN_MATRIX is None:
+    try:
+      stream = pkg_resources.resource_stream(__name__, 'resources/genMatrix.npy')
+      mat = np.load(stream)
+    except (OSError, ValueError):
+      stream = pkg_resources.resource_stream(__name__, 'resources/genMatrix.txt')
+      mat = np.genfromtxt(stream, dtype="u1", delimiter=",")
+    mat = np.ascontiguousarray(mat, dtype="u1")
+    mat.setflags(write=False)
+    _GEN_MATRIX = mat
+  return _GEN_MATRIX
+
+class Decoding_Matrix_Cache:
+  #LRU cache of inverted generator sub-matrices, keyed by the (sorted) received page IDs and the message size.
+  #In steady state the satellites broadcast the same page ID schedule, so the inversion mostly repeats.
+  capacity = None
+  hits = None
+  misses = None
+  matrices = None
+  def __init__(self, capacity=256):
+    self.capacity = int(capacity)
+    self.matrices = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, pageIDs, mSize, genMat, backend):
+    key = (tuple(pageIDs), mSize)
+    try:
+      mat = self.matrices[key]
+      self.matrices.move_to_end(key)
+      self.hits += 1
+      return mat
+    except KeyError:
+      self.misses += 1
+    mat = backend.inv(genMat[list(pageIDs), :mSize])
+    mat.setflags(write=False)
+    if self.capacity > 0:
+      self.matrices[key] = mat
+      if len(self.matrices) > self.capacity:
+        self.matrices.popitem(last=False)
+    return mat
+
+  def resize(self, capacity):
+    self.capacity = int(capacity)
+    while len(self.matrices) > max(self.capacity, 0):
+      self.matrices.popitem(last=False)
+
+  def clear(self):
+    self.matrices.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def info(self):
+    return {"hits": self.hits, "misses": self.misses,
+            "size": len(self.matrices), "capacity": self.capacity}
 
 class HAS:
   #Simple HAS message class, used in the decoding part on a transmission and assembly level
   TIMELIMIT = 20 #window of time[s] to receive valid pages
-  GF = galois.GF(256)
+  backend = GF256_Native()
+  decoCache = Decoding_Matrix_Cache()
   genMat = None
   status = None
   mID = None
@@ -32,8 +200,7 @@ class HAS:
   rec = None
 
   def __init__(self, msg=None):
-    stream = pkg_resources.resource_stream(__name__, 'resources/genMatrix.txt')
-    self.genMat = np.genfromtxt(stream, dtype="u1", delimiter=",")
+    self.genMat = genMatrix()
     self.pages = np.zeros(255, dtype=object)-1
     self.rec = []
     if msg != None:
@@ -41,14 +208,14 @@ class HAS:
       self.status = msg[0][:2]
       self.mType = msg[0][4:6]
       self.mID = int(msg[0][6:11], base=2)
-      self.mSize = int(msg[0][12:16], base=2)+1      
+      self.mSize = int(msg[0][11:16], base=2)+1      
 
   def addPage(self, msg, pid=None, t=None, verb=0):
     if self.mID == None:
       self.status = msg[:2]
       self.mType = msg[4:6]
       self.mID = int(msg[6:11], base=2)
-      self.mSize = int(msg[12:16], base=2)+1
+      self.mSize = int(msg[11:16], base=2)+1
 
     if self.t0 == None:
       if t != None: self.t0 = t 
@@ -99,11 +266,16 @@ class HAS:
       print("HAS Message complete. Pages received:")
       for p in self.available():
         print("Page "+str(p)+":", self.pages[p])
-    missingPages = self.missing()
+    #Only the Reed-Solomon decoder needs the erasure positions
+    missingPages = self.missing() if mode == 0 else None
     toDeco = np.array(self.pages, dtype=object)
     decoded = self.assembleMessage(toDeco, missingPages, mode=mode, _fcr=_fcr)
-    decoded = bytes2bits(decoded)
-    return decoded[:self.mSize*424]
+    return bytes(decoded[:self.mSize*53])
+
+  def encode(self, msg):
+    #Pages of a decoded message (255x53 uint8, by page ID-1): generator matrix times the message
+    _msg = np.frombuffer(msg, dtype="u1").reshape(-1, 53)
+    return self.backend.matmul(self.genMat[:, :len(_msg)], _msg)
 
   def assembleMessage(self, msgs, missing=None, mode=1, _fcr=1):
     if missing is None:
@@ -121,55 +293,115 @@ class HAS:
             msg = msg + b'\x00'
         decoded = rscoder.decode(msg, erase_pos=missing)
         decodedM[i] = decoded[0]
+      HASmsg = bytearray(np.array(decodedM).T.tobytes())
     elif mode == 1: 
-      _decodedM = []
-      _idxs = self.available()[-self.mSize:]
-      _decoPages = self.GF(np.array([np.array(x) for x in self.pages[_idxs]]))
-      _decoMat = np.linalg.inv(self.GF(self.genMat[_idxs, :self.mSize]))
-      for i in range(53):
-        decodedM += [_decoMat @ _decoPages[:, i]]
-
-    HASmsg = bytearray(np.array(decodedM).T.tobytes())
+      #Erasure decoding of all 53 byte columns at once: (mSize x mSize) @ (mSize x 53)
+      _idxs = sorted(self.available()[-self.mSize:])
+      _decoPages = np.frombuffer(b''.join(self.pages[_idxs]), dtype="u1").reshape(self.mSize, 53)
+      _decoMat = self.decoCache.get(_idxs, self.mSize, self.genMat, self.backend)
+      HASmsg = bytearray(self.backend.matmul(_decoMat, _decoPages))
     return(HASmsg)
 
 class HAS_Storage:
+    #Pages of several receivers may be fed to one storage (also from several threads), so every
+    #message is decoded once, from the pages of all receivers together. Pages are deduplicated by
+    #(mID, pageID, TOW window): a page ID received already for the message being assembled is not
+    #used again, and with more than one receiver, a page equal to page pageID of a message mID decoded
+    #within DEDUP_WINDOW seconds is dropped. With a single receiver, pages are used as they always were.
+    #The last DEDUP_KEEP decodings of each mID are kept, for receivers lagging behind. They are
+    #forgotten if a page is older than the newest one by more than DEDUP_REWIND seconds (e.g. a
+    #recording starts over). Readers sharing a storage hold lock while feeding a page and converting
+    #the message decoded.
+    DEDUP_WINDOW = HAS.TIMELIMIT
+    DEDUP_KEEP = 4
+    DEDUP_REWIND = 60
     HASobjects = None
     HASmessages = None
     lastMID = None
     lastMessage = None
     lastMessage_tow = None
-    def __init__(self):
+    receivers = 1
+    decoded = None
+    newest = None
+    duplicates = None
+    lock = None
+    #Running totals: valid pages by mID, messages decoded, messages reinitialized by a page timeout
+    pages = None
+    messages = 0
+    timeouts = 0
+    def __init__(self, receivers=1):
         self.HASobjects = np.empty(32, dtype=object)
         self.HASmessages = np.empty(32, dtype=object)
         self.lastMID = -1
-        self.lastMessage = ""
+        self.lastMessage = b""
         self.lastMessage_tow = 0
+        self.receivers = receivers
+        #Time of the last page, mSize and pages (by page ID-1) of the messages decoded, by mID
+        self.decoded = {}
+        self.duplicates = 0
+        self.pages = [0]*32
+        self.lock = threading.RLock()
         for i in range(32):
             self.HASobjects[i] = HAS()
 
+    def isDuplicate(self, mID, pageID, page, _time):
+        #Page (bit string of the header and data) of a message mID decoded within DEDUP_WINDOW. Page
+        #IDs mSize+1..32 are left out: their pages are zero, whatever the message.
+        mSize = int(page[11:16], 2)+1
+        if mSize < pageID <= 32:
+            return False
+        data = None
+        for t, size, pages in self.decoded.get(mID, ()):
+            if abs(_time-t) > self.DEDUP_WINDOW or size != mSize or pages is None:
+                continue
+            if data is None:
+                data = bits2Bytes(page[24:])
+            if pages[pageID-1].tobytes() == data:
+                return True
+        return False
+
     def feedMessage(self, has_msg, _time, verbose=0):
         hdr = readHeader(has_msg[14:])
         if not dataValid(has_msg, hdr, verbose=verbose):
             return 0
         incoming_nav = has_msg[14:492-30]
         mID = hdr[3]
-        if mID == self.lastMID:
-            return 0
-        try:
-            if self.HASobjects[mID].addPage(incoming_nav, t=_time):
-                deco = self.HASobjects[mID].decode(verbose=verbose)
-                self.HASmessages[mID] = deco 
-                self.lastMID = mID
-                if verbose>=2:
-                    print("Message",mID,"received")
-                self.lastMessage = deco
-                self.lastMessage_tow = self.HASobjects[mID].t0
+        pageID = int(incoming_nav[16:24], 2)
+        with self.lock:
+            self.pages[mID] += 1
+            if mID == self.lastMID:
+                return 0
+            if self.newest is None or _time > self.newest:
+                self.newest = _time
+            elif self.newest-_time > self.DEDUP_REWIND:
+                self.decoded = {}
+                self.newest = _time
+            if self.receivers > 1 and pageID > 0 and self.isDuplicate(mID, pageID, incoming_nav, _time):
+                #Page of a message decoded already, e.g. received by another receiver
+                self.duplicates += 1
+                return 0
+            if (pageID-1) in self.HASobjects[mID].rec:
+                #Page ID received already for this message, not used again by addPage
+                self.duplicates += 1
+            try:
+                if self.HASobjects[mID].addPage(incoming_nav, t=_time):
+                    deco = self.HASobjects[mID].decode(verbose=verbose)
+                    self.HASmessages[mID] = deco 
+                    self.lastMID = mID
+                    if verbose>=2:
+                        print("Message",mID,"received")
+                    self.lastMessage = deco
+                    self.lastMessage_tow = self.HASobjects[mID].t0
+                    pages = self.HASobjects[mID].encode(deco) if self.receivers > 1 else None
+                    self.decoded[mID] = self.decoded.get(mID, [])[1-self.DEDUP_KEEP:] + [(_time, self.HASobjects[mID].mSize, pages)]
+                    self.HASobjects[mID] = HAS()
+                    self.messages += 1
+                    return 1
+                return 0
+            except Page_timeout_Error:
+                print("A timeout error has occurred for message", mID, ". Message will be reinitialized.")
+                self.timeouts += 1
                 self.HASobjects[mID] = HAS()
-                return 1
-            return 0
-        except Page_timeout_Error:
-            print("A timeout error has occurred for message", mID, ". Message will be reinitialized.")
-            self.HASobjects[mID] = HAS()
 
 class HAS_Warning(Warning):
   #Base HAS Warning class
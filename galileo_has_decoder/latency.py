@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+'''
+Latency instrumentation classes
+
+Every HAS message is traced from the arrival of its last C/Nav page to the emission of its SSR
+messages, over the stages it passes:
+  decode:  page arrival --> HAS_Storage.feedMessage completed the message (incl. pipeline queueing)
+  convert: message completed --> SSR_Converter.convertMessage returned
+  write:   conversion returned --> the last output.write of its SSR messages returned
+  total:   page arrival --> the last output.write returned
+  age:     GNSS time of the last page --> emission, against the system clock (live sources only)
+The durations feed logarithmic histograms, of which the percentiles (p50/p95/p99) are printed
+periodically and/or on exit.
+'''
+
+import atexit
+import collections
+import math
+import threading
+import time
+
+class Latency_Histogram:
+  #Histogram of durations (seconds) in logarithmic buckets, BINS per decade from LOW to HIGH seconds.
+  #Percentiles are the upper edge of their bucket, i.e. precise to 1/BINS of a decade.
+  LOW = 1e-6
+  HIGH = 1e4
+  BINS = 20
+  count = 0
+  total = 0.0
+  low = None
+  high = None
+  def __init__(self):
+    self.buckets = [0]*(int(round(math.log10(self.HIGH/self.LOW)*self.BINS))+2)
+
+  def index(self, value):
+    if value <= self.LOW:
+      return 0
+    return min(int(math.log10(value/self.LOW)*self.BINS)+1, len(self.buckets)-1)
+
+  def edge(self, idx):
+    return self.LOW*10**(idx/self.BINS)
+
+  def add(self, value):
+    self.buckets[self.index(value)] += 1
+    self.count += 1
+    self.total += value
+    if self.low is None or value < self.low:
+      self.low = value
+    if self.high is None or value > self.high:
+      self.high = value
+
+  def percentile(self, p):
+    #Value below which p percent of the durations are
+    if self.count == 0:
+      return None
+    rank = p/100*self.count
+    seen = 0
+    for idx, n in enumerate(self.buckets):
+      seen += n
+      if seen >= rank and n > 0:
+        return min(self.edge(idx), self.high)
+    return self.high
+
+  def summary(self):
+    return {"count": self.count, "sum": self.total, "mean": self.total/self.count if self.count > 0 else None, "min": self.low,
+            "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99), "max": self.high}
+
+class Latency_Monitor:
+  #Traces the HAS messages through the has_storage, converter and output it is attached to.
+  #interval: seconds between printed summaries (None: only by dump()), atExit: print one on exit.
+  #The timestamps of the last KEEP messages are kept in traces.
+  STAGES = ["decode", "convert", "write", "total", "age"]
+  KEEP = 1000
+  MAX_AGE = 600
+  GPS_LEAP = 18
+  interval = None
+  converter = None
+  output = None
+  messages = 0
+  def __init__(self, interval=None, atExit=True):
+    self.interval = interval
+    self.histograms = {stage: Latency_Histogram() for stage in self.STAGES}
+    self.traces = collections.deque(maxlen=self.KEEP)
+    self.converting = collections.deque()
+    self.writing = collections.deque()
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.lastDump = time.perf_counter()
+    if atExit:
+      atexit.register(self.dump)
+
+  def attach(self, has_storage, converter=None, output=None):
+    #Instruments the feedMessage of has_storage, the convertMessage of converter and the write of output
+    feedMessage = has_storage.feedMessage
+    def timedFeedMessage(has_msg, _time, *args, **kwargs):
+      arrival = getattr(self.local, "arrival", None)
+      self.local.arrival = None
+      if arrival is None:
+        arrival = time.perf_counter()
+      res = feedMessage(has_msg, _time, *args, **kwargs)
+      if res:
+        self.decoded(arrival, _time)
+      return res
+    has_storage.feedMessage = timedFeedMessage
+    if converter != None:
+      self.converter = converter
+      convertMessage = converter.convertMessage
+      def timedConvertMessage(*args, **kwargs):
+        res = convertMessage(*args, **kwargs)
+        self.converted(len(res) if res != None and self.output != None else 0)
+        return res
+      converter.convertMessage = timedConvertMessage
+    if output != None:
+      self.output = output
+      write = output.write
+      def timedWrite(msg, *args, **kwargs):
+        res = write(msg, *args, **kwargs)
+        #Raw PPP Wizard pass-through data is written with other types than 2 (SSR)
+        if len(args) == 0 or args[0] == 2:
+          self.written()
+        return res
+      output.write = timedWrite
+
+  def arrived(self, arrival):
+    #Arrival time (perf_counter) of the page the current thread feeds next, if not the time of feeding
+    self.local.arrival = arrival
+
+  def decoded(self, arrival, tow):
+    now = time.perf_counter()
+    trace = {"tow": tow, "arrival": arrival, "decoded": now, "converted": None, "written": None, "pending": 0}
+    with self.lock:
+      self.histograms["decode"].add(now-arrival)
+      if self.converter != None:
+        self.converting.append(trace)
+        return
+    self.complete(trace, now)
+
+  def converted(self, n):
+    now = time.perf_counter()
+    with self.lock:
+      if len(self.converting) == 0:
+        return
+      trace = self.converting.popleft()
+      trace["converted"] = now
+      self.histograms["convert"].add(now-trace["decoded"])
+      if n > 0:
+        trace["pending"] = n
+        self.writing.append(trace)
+        return
+    self.complete(trace, now)
+
+  def written(self):
+    now = time.perf_counter()
+    with self.lock:
+      if len(self.writing) == 0:
+        return
+      trace = self.writing[0]
+      trace["pending"] -= 1
+      if trace["pending"] > 0:
+        return
+      self.writing.popleft()
+      trace["written"] = now
+      self.histograms["write"].add(now-trace["converted"])
+    self.complete(trace, now)
+
+  def complete(self, trace, now):
+    with self.lock:
+      self.histograms["total"].add(now-trace["arrival"])
+      #Age of the corrections against the system clock, in GPS time of week
+      gpst = (time.time() - 315964800.0 + self.GPS_LEAP) % 604800
+      age = (gpst - trace["tow"] + 302400) % 604800 - 302400
+      if 0 <= age < self.MAX_AGE:
+        self.histograms["age"].add(age)
+      del trace["pending"]
+      self.traces.append(trace)
+      self.messages += 1
+      due = self.interval != None and now - self.lastDump >= self.interval
+      if due:
+        self.lastDump = now
+    if due:
+      self.dump()
+
+  def summary(self):
+    #Percentiles of every stage (seconds), by name
+    with self.lock:
+      return {stage: hist.summary() for stage, hist in self.histograms.items()}
+
+  def dump(self):
+    if self.messages == 0:
+      return
+    print("Latency of " + str(self.messages) + " HAS messages (ms):")
+    for stage, s in self.summary().items():
+      if s["count"] == 0:
+        continue
+      print("  %-7s count %7d, mean %9.3f, p50 %9.3f, p95 %9.3f, p99 %9.3f, max %9.3f"
+            % (stage, s["count"], s["mean"]*1e3, s["p50"]*1e3, s["p95"]*1e3, s["p99"]*1e3, s["max"]*1e3))
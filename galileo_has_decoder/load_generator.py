@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+
+'''
+Synthetic HAS load generation classes
+
+A HAS_Load_Generator broadcasts synthetic HAS messages as a receiver would output them: every epoch
+(one second of GNSS time), each of the transmitting satellites sends one C/Nav page, as SBF
+GALRawCNAV (4024) blocks or BINEX 0x01-0x44 records. The messages carry masks, orbit, clock and
+bias corrections of configurable size (satellites, signals, content blocks). Pages can be lost or
+received twice at configurable rates. The stream is written to a file, a TCP connection (either
+side) or a pseudo-terminal, at real-time or any multiple of it, or as fast as possible.
+'''
+
+import fcntl
+import math
+import os
+import random
+import socket
+import struct
+import termios
+import time
+import tty
+from galileo_has_decoder.utils_testing import constructSSRmsg, encodePages, constructCNAVPage, constructSBF4024, constructBinexCNAV, TEST_SIGNALS
+from galileo_has_decoder.tcp_server import TCP_Server
+
+GPS_EPOCH = 315964800
+GPS_LEAP = 18
+
+def queued(fd, request):
+  #Bytes queued on fd as of the ioctl request, None if not available
+  try:
+    return struct.unpack("i", fcntl.ioctl(fd, request, b"\0\0\0\0"))[0]
+  except OSError:
+    return None
+
+class Socket_Output:
+  #Connection to a listening decoder (input modes 5, 6, 9, 10)
+  def __init__(self, addr, port):
+    self.sock = socket.create_connection((addr, int(port)))
+    print("Connected to " + str(addr) + ":" + str(port))
+
+  def write(self, data):
+    self.sock.sendall(data)
+
+  def pending(self):
+    #Bytes sent but not yet acknowledged by the decoder's host
+    return queued(self.sock, termios.TIOCOUTQ)
+
+  def close(self):
+    self.sock.close()
+
+class Listen_Output:
+  #Server a decoder connects to (input modes 7, 8)
+  def __init__(self, addr, port):
+    self.server = TCP_Server(addr, int(port))
+
+  def write(self, data):
+    self.server.client.sendall(data)
+
+  def pending(self):
+    return queued(self.server.client, termios.TIOCOUTQ)
+
+  def close(self):
+    self.server.client.close()
+    self.server.close()
+
+class Pty_Output:
+  #Pseudo-terminal, of which the decoder opens the slave as serial port (input modes 3, 4)
+  def __init__(self):
+    self.master, slave = os.openpty()
+    #Binary data, no echo or line editing
+    tty.setraw(slave)
+    self.slave = slave
+    self.name = os.ttyname(slave)
+    print("Serial port: " + self.name)
+
+  def write(self, data):
+    view = memoryview(data)
+    while len(view) > 0:
+      view = view[os.write(self.master, view):]
+
+  def pending(self):
+    #Bytes not yet read by the decoder
+    return queued(self.slave, termios.FIONREAD)
+
+  def close(self):
+    os.close(self.master)
+    os.close(self.slave)
+
+class File_Output:
+  def __init__(self, path):
+    self.file = open(path, "wb")
+
+  def write(self, data):
+    self.file.write(data)
+
+  def pending(self):
+    return 0
+
+  def close(self):
+    self.file.close()
+
+def openTarget(target):
+  #target: "tcp:ADDRESS:PORT" (connect), "listen:ADDRESS:PORT" (accept), "pty" or a file path
+  if target == "pty":
+    return Pty_Output()
+  kind, _, rest = target.partition(":")
+  if kind in ["tcp", "listen"] and ":" in rest:
+    addr, port = rest.rsplit(":", 1)
+    if kind == "tcp":
+      return Socket_Output(addr, port)
+    return Listen_Output(addr, port)
+  return File_Output(target)
+
+class HAS_Load_Generator:
+  #fmt: "sbf" or "binex". gps, gal: number of satellites in the mask of either system, signals: number
+  #of signals per system (of TEST_SIGNALS). contents: content flags of the messages, used in turn
+  #(see constructSSRmsg). transmitters: satellites broadcasting HAS pages, overhead: pages sent per
+  #page needed (>= 1.0). loss, duplicate: probability of a page to be lost or received twice.
+  #dnu: probability of a clock correction to be "do not use".
+  #start: GPS time (seconds) of the first epoch, the current time if not set.
+  fmt = "sbf"
+  transmitters = 8
+  overhead = 1.0
+  loss = 0.0
+  duplicate = 0.0
+  dnu = 0.0
+  start = None
+  def __init__(self, fmt="sbf", gps=8, gal=10, signals=2, contents=["111111", "011100", "000110", "000001"],
+               transmitters=8, overhead=1.0, loss=0.0, duplicate=0.0, seed=None, start=None, dnu=0.0):
+    if fmt not in ["sbf", "binex"]:
+      raise ValueError("The format must be 'sbf' or 'binex'")
+    if not 0 <= gps <= 32 or not 0 <= gal <= 36 or gps+gal == 0:
+      raise ValueError("Between 1 and 32 GPS and 36 Galileo satellites are supported")
+    if not 1 <= signals <= min(len(s) for s in TEST_SIGNALS.values()):
+      raise ValueError("Between 1 and " + str(min(len(s) for s in TEST_SIGNALS.values())) + " signals are supported")
+    if len(contents) == 0 or any(len(c) != 6 or set(c) - set("01") for c in contents):
+      raise ValueError("The contents must be flags of 6 bits, e.g. 111111")
+    if transmitters < 1 or overhead < 1.0:
+      raise ValueError("At least one transmitter and an overhead of 1.0 are needed")
+    self.fmt = fmt
+    self.sats = {sys: list(range(1, n+1)) for sys, n in [(0, gps), (2, gal)] if n > 0}
+    self.sigs = {sys: TEST_SIGNALS[sys][:signals] for sys in self.sats}
+    self.contents = contents
+    self.transmitters = transmitters
+    self.overhead = overhead
+    self.loss = loss
+    self.duplicate = duplicate
+    self.dnu = dnu
+    self.rnd = random.Random(seed)
+    if start is None:
+      start = int(time.time()) - GPS_EPOCH + GPS_LEAP
+    self.start = start
+    for content in contents:
+      size = math.ceil(len(constructSSRmsg(self.sats, self.sigs, content, rnd=self.rnd))/53)
+      if size > 32:
+        raise ValueError("Messages of content " + content + " would need " + str(size) + " pages, at most 32 are possible")
+
+  def block(self, page, gpst, svid):
+    #Block/record of a C/Nav page received at gpst (seconds) from Galileo satellite svid
+    if self.fmt == "sbf":
+      return constructSBF4024(page, (gpst % 604800)*1000, gpst // 604800, 70+svid)
+    return constructBinexCNAV(page, gpst // 60, (gpst % 60)*1000, svid)
+
+  def messages(self):
+    #Infinite sequence of (message ID, content, HAS message)
+    k = 0
+    while True:
+      content = self.contents[k % len(self.contents)]
+      yield k % 32, content, constructSSRmsg(self.sats, self.sigs, content, toh=(self.start+k) % 3600, rnd=self.rnd, dnu=self.dnu)
+      k += 1
+
+  def epochs(self):
+    #Infinite sequence of (epoch, blocks, stats) of the stream: one page per transmitter and epoch,
+    #a message being broadcast for as many epochs as its (overhead) pages need. stats counts the
+    #pages, lost, duplicated and decodable (enough distinct pages received) of messages completed.
+    epoch = 0
+    for mID, content, msg in self.messages():
+      pids = list(range(1, math.ceil(len(msg)/53)+1))
+      mSize = len(pids)
+      pids += list(range(33, 256))
+      epochs = math.ceil(mSize*self.overhead/self.transmitters)
+      pages, _ = encodePages(msg, [pids[n % len(pids)] for n in range(epochs*self.transmitters)])
+      received = set()
+      stats = {"pages": 0, "lost": 0, "duplicated": 0, "messages": 0, "decodable": 0}
+      for e in range(epochs):
+        blocks = []
+        for s in range(self.transmitters):
+          n = e*self.transmitters + s
+          stats["pages"] += 1
+          if self.rnd.random() < self.loss:
+            stats["lost"] += 1
+            continue
+          received.add(pids[n % len(pids)])
+          block = self.block(constructCNAVPage(mID, pids[n % len(pids)], mSize, pages[n], status="01"), self.start+epoch, s+1)
+          blocks += [block]
+          if self.rnd.random() < self.duplicate:
+            stats["duplicated"] += 1
+            blocks += [block]
+        if e == epochs-1:
+          stats["messages"] = 1
+          stats["decodable"] = int(len(received) >= mSize)
+        yield epoch, blocks, stats
+        stats = {"pages": 0, "lost": 0, "duplicated": 0, "messages": 0, "decodable": 0}
+        epoch += 1
+
+  def run(self, output, messages=None, seconds=None, speed=1.0, verbose=0):
+    #Writes the stream to output (an object with write, e.g. of openTarget) until messages HAS
+    #messages or seconds epochs are sent. speed: epochs per wall clock second (0: unpaced).
+    #Returns the statistics of the run.
+    totals = {"epochs": 0, "blocks": 0, "bytes": 0, "pages": 0, "lost": 0, "duplicated": 0, "messages": 0, "decodable": 0}
+    t0 = time.perf_counter()
+    for epoch, blocks, stats in self.epochs():
+      if seconds is not None and epoch >= seconds:
+        break
+      if speed > 0:
+        delay = t0 + epoch/speed - time.perf_counter()
+        if delay > 0:
+          time.sleep(delay)
+      data = b"".join(blocks)
+      output.write(data)
+      totals["epochs"] += 1
+      totals["blocks"] += len(blocks)
+      totals["bytes"] += len(data)
+      for key in stats:
+        totals[key] += stats[key]
+      if verbose > 0 and stats["messages"] > 0:
+        print("Epoch " + str(epoch) + ": " + str(totals["messages"]) + " messages sent")
+      if messages is not None and totals["messages"] >= messages:
+        break
+    totals["elapsed"] = time.perf_counter() - t0
+    totals["speed"] = totals["epochs"]/totals["elapsed"] if totals["elapsed"] > 0 else None
+    return totals
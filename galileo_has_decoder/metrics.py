@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+'''
+Metrics classes
+
+The readers, HAS_Storage, SSR_Converter and outputs keep running totals (plain integer attributes),
+which the Metrics_Registry only reads when the metrics are requested. Monitoring a converter thus
+costs nothing per message. The metrics are served in the Prometheus text exposition format by a
+Metrics_Server on a local HTTP port (GET /metrics).
+'''
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Metrics_Registry:
+  #Collectors are callables returning a list of (name, type, help, samples), samples being a list of
+  #(labels dict, value)
+  PREFIX = "haslib_"
+  collectors = None
+  def __init__(self):
+    self.collectors = []
+
+  def register(self, collector):
+    self.collectors.append(collector)
+
+  def addReader(self, reader):
+    #Blocks, C/Nav blocks and CRC failures of a reader, or of every reader of a Multi_Reader
+    readers = getattr(reader, "readers", None) or [reader]
+    def collect():
+      def samples(attr):
+        return [({"receiver": str(k)}, getattr(r, attr, 0) or 0) for k, r in enumerate(readers)]
+      return [("blocks_read_total", "counter", "Blocks read from the source", samples("blocks")),
+              ("cnav_blocks_total", "counter", "Galileo C/Nav blocks read", samples("cnavBlocks")),
+              ("crc_failures_total", "counter", "Blocks rejected due to a CRC error", samples("rejectedBlocks"))]
+    self.register(collect)
+
+  def addStorage(self, has_storage):
+    def collect():
+      return [("has_pages_total", "counter", "Valid HAS pages received, by message ID",
+               [({"mid": str(mID)}, n) for mID, n in enumerate(has_storage.pages) if n > 0]),
+              ("has_messages_total", "counter", "HAS messages decoded", [({}, has_storage.messages)]),
+              ("page_timeouts_total", "counter", "HAS messages reinitialized due to a page timeout", [({}, has_storage.timeouts)]),
+              ("duplicate_pages_total", "counter", "Duplicate HAS pages, e.g. received by several receivers", [({}, has_storage.duplicates)])]
+    self.register(collect)
+
+  def addConverter(self, converter):
+    fmt = {1: "igs", 2: "rtcm"}.get(getattr(converter, "mode", None), "unknown")
+    def collect():
+      return [("messages_converted_total", "counter", "HAS messages converted", [({}, converter.converted)]),
+              ("messages_discarded_total", "counter", "HAS messages discarded (mask or IOD set unavailable)", [({}, converter.discarded)]),
+              ("ssr_messages_total", "counter", "SSR messages output", [({"format": fmt}, converter.messagesOut)]),
+              ("ssr_bytes_total", "counter", "Bytes of SSR messages output", [({"format": fmt}, converter.bytesOut)])]
+    self.register(collect)
+
+  def addOutput(self, output):
+    #Messages dropped for slow clients (Broadcast_Server, NTRIP_Caster)
+    if not hasattr(output, "dropped"):
+      return
+    def collect():
+      return [("output_dropped_total", "counter", "Messages dropped for slow output clients", [({}, output.dropped)])]
+    self.register(collect)
+
+  def addLatency(self, latency):
+    #Stage timings of a Latency_Monitor, as summaries with the quantiles 0.5, 0.95 and 0.99
+    def collect():
+      samples = []
+      counts = []
+      sums = []
+      for stage, s in latency.summary().items():
+        for q in ["50", "95", "99"]:
+          if s["p"+q] is not None:
+            samples += [({"stage": stage, "quantile": "0."+q}, s["p"+q])]
+        counts += [({"stage": stage}, s["count"])]
+        sums += [({"stage": stage}, s["sum"])]
+      return [("stage_latency_seconds", "summary", "Latency of the HAS messages by stage", samples),
+              ("stage_latency_seconds_count", None, None, counts),
+              ("stage_latency_seconds_sum", None, None, sums)]
+    self.register(collect)
+
+  def addPipeline(self, pipeline):
+    def collect():
+      metrics = pipeline.metrics()
+      def samples(key):
+        return [({"stage": name}, m[key]) for name, m in metrics.items()]
+      return [("pipeline_processed_total", "counter", "Items processed by the pipeline stages", samples("processed")),
+              ("pipeline_dropped_total", "counter", "Items dropped at full pipeline queues", samples("dropped")),
+              ("pipeline_queue_depth", "gauge", "Items queued for the pipeline stages", samples("depth"))]
+    self.register(collect)
+
+  def expose(self):
+    #Text exposition format
+    lines = []
+    for collector in self.collectors:
+      for name, kind, text, samples in collector():
+        name = self.PREFIX + name
+        if kind is not None:
+          lines += ["# HELP " + name + " " + text, "# TYPE " + name + " " + kind]
+        for labels, value in samples:
+          label = ",".join(key + "=\"" + str(val) + "\"" for key, val in labels.items())
+          lines += [name + ("{" + label + "}" if label else "") + " " + repr(float(value) if isinstance(value, float) else int(value))]
+    return "\n".join(lines) + "\n"
+
+class Metrics_Server:
+  #Serves registry on http://addr:port/metrics from a thread of its own
+  server_address = 'localhost'
+  port = 9947
+  registry = None
+  def __init__(self, registry, addr=None, port=None):
+    if addr != None:
+      self.server_address = addr
+    if port != None:
+      self.port = int(port)
+    self.registry = registry
+    server = self
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        if self.path.split("?")[0] not in ["/metrics", "/"]:
+          self.send_error(404)
+          return
+        body = server.registry.expose().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+      def log_message(self, *args):
+        pass
+    self.httpd = ThreadingHTTPServer((self.server_address, self.port), Handler)
+    self.httpd.daemon_threads = True
+    self.thread = threading.Thread(target=self.httpd.serve_forever, name="Metrics_Server", daemon=True)
+    self.thread.start()
+    print("Metrics served on http://" + str(self.server_address) + ":" + str(self.port) + "/metrics")
+
+  def close(self):
+    self.httpd.shutdown()
+    self.httpd.server_close()
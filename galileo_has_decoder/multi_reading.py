@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+'''
+Multi-receiver reading class
+
+Several receivers (e.g. redundant E6 receivers of a site) are read at once, each by its reader in
+a thread of its own, and all feed their pages to one HAS_Storage. A HAS message is thus completed
+from the pages of the satellites tracked by any of the receivers, and decoded and converted once:
+pages of a message decoded already are dropped by the storage (HAS_Storage.isDuplicate).
+'''
+
+import threading
+from galileo_has_decoder.has_classes import HAS_Storage
+
+class Multi_Reader:
+  readers = None
+  has_storage = None
+  def __init__(self, readers, has_storage=None):
+    #readers: reader objects (SBF_Reader, Binex_Reader, TCP_*_Reader, Serial_*_Reader), which from now
+    #on feed the pages they read to has_storage (a new HAS_Storage if not given)
+    self.readers = list(readers)
+    self.has_storage = has_storage if has_storage is not None else HAS_Storage()
+    self.has_storage.receivers = max(self.has_storage.receivers, len(self.readers))
+    for reader in self.readers:
+      reader.has_storage = self.has_storage
+
+  def read(self, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #Reads all receivers until each has read x messages (mode 'm'), for x seconds (mode 't') or until
+    #its source ended. Returns the messages, C/Nav messages and HAS messages summed over the receivers.
+    results = [None]*len(self.readers)
+    errors = [None]*len(self.readers)
+    def run(k):
+      try:
+        results[k] = self.readers[k].read(converter=converter, output=output, mode=mode, x=x, compact=compact,
+                                          HRclk=HRclk, lowerUDI=lowerUDI, verbose=verbose)
+      except Exception as e:
+        errors[k] = e
+    threads = [threading.Thread(target=run, args=(k,), name="Multi_Reader-"+str(k)) for k in range(len(self.readers))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    for k, e in enumerate(errors):
+      if e is not None:
+        print("Receiver " + str(k) + " stopped with an error: " + str(e))
+    j = cnavs = hasnum = 0
+    for res in results:
+      if res is not None:
+        j, cnavs, hasnum = j+res[0], cnavs+res[1], hasnum+res[2]
+    if verbose>=1:
+      print("Out of "+str(j)+" messages from "+str(len(self.readers))+" receivers, "+str(cnavs)+" were C/Nav messages. "
+            +str(hasnum)+" HAS messages have successfully been decoded and converted, "
+            +str(self.has_storage.duplicates)+" duplicate pages were dropped.")
+    return j, cnavs, hasnum
+
+  def close(self):
+    for reader in self.readers:
+      if hasattr(reader, "close"):
+        reader.close()
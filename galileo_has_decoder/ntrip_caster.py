@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+'''
+NTRIP caster class
+
+Serves the converted SSR messages (RTCM3 frames, as written to File_Writer/TCP_Server) on one
+mountpoint to any number of NTRIP v1 or v2 clients. The caster runs an asyncio server in its own
+thread: write() hands the messages over to the event loop and returns at once, every client has a
+bounded buffer of which the oldest messages are dropped when it falls behind.
+'''
+
+import asyncio
+import base64
+import collections
+import threading
+import time
+
+class NTRIP_Error(Exception):
+  #Base NTRIP Error class
+  pass
+
+class NTRIP_Client:
+  #A client of the mountpoint with its buffered messages. chunked: NTRIP v2 (HTTP chunked transfer)
+  writer = None
+  address = None
+  chunked = False
+  queue = None
+  ready = None
+  closed = False
+  dropped = 0
+  def __init__(self, writer, chunked=False):
+    self.writer = writer
+    self.address = writer.get_extra_info("peername")
+    self.chunked = chunked
+    self.queue = collections.deque()
+    self.ready = asyncio.Event()
+
+class NTRIP_Caster:
+  server_address = 'localhost'
+  port = 2101
+  mountpoint = "HAS"
+  identifier = "Galileo HAS"
+  maxQueue = 256
+  clients = None
+  tasks = None
+  error = None
+  dropped = 0
+  SERVER = "NTRIP HASlib"
+  def __init__(self, addr=None, port=None, mountpoint=None, user=None, password=None, maxQueue=None, identifier=None):
+    if addr != None:
+      self.server_address = addr
+    if port != None:
+      self.port = int(port)
+    if mountpoint != None:
+      self.mountpoint = mountpoint.strip("/")
+    if identifier != None:
+      self.identifier = identifier
+    if maxQueue != None:
+      self.maxQueue = int(maxQueue)
+    #Basic authentication, if a user is given
+    self.auth = None
+    if user != None:
+      self.auth = base64.b64encode((user + ":" + (password or "")).encode()).decode()
+    self.clients = []
+    self.tasks = set()
+    self.loop = asyncio.new_event_loop()
+    started = threading.Event()
+    self.thread = threading.Thread(target=self.serve, args=(started,), name="NTRIP_Caster", daemon=True)
+    self.thread.start()
+    started.wait()
+    if self.error is not None:
+      raise NTRIP_Error("The NTRIP caster could not be started: " + str(self.error))
+    print("NTRIP caster serving mountpoint /" + self.mountpoint + " on " + str(self.server_address) + ":" + str(self.port))
+
+  def serve(self, started):
+    asyncio.set_event_loop(self.loop)
+    self.error = None
+    try:
+      self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.server_address, self.port))
+    except OSError as e:
+      self.error = e
+      started.set()
+      return
+    #The port bound, if port 0 was passed
+    self.port = self.server.sockets[0].getsockname()[1]
+    started.set()
+    self.loop.run_forever()
+
+  def sourcetable(self):
+    #STR;mountpoint;identifier;format;format-details;carrier;nav-system;network;country;latitude;longitude;
+    #nmea;solution;generator;compr-encryp;authentication;fee;bitrate;misc
+    line = ";".join(["STR", self.mountpoint, self.identifier, "RTCM 3", "SSR", "0", "GPS+GAL", "HAS", "",
+                     "0.00", "0.00", "0", "0", "HASlib", "none", "B" if self.auth else "N", "N", "0", ""])
+    return line + "\r\nENDSOURCETABLE\r\n"
+
+  async def handle(self, reader, writer):
+    try:
+      request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+      writer.close()
+      return
+    lines = request.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+      if ":" in line:
+        key, value = line.split(":", 1)
+        headers[key.strip().lower()] = value.strip()
+    parts = lines[0].split()
+    v2 = "ntrip/2" in headers.get("ntrip-version", "").lower()
+    if len(parts) < 2 or parts[0].upper() != "GET":
+      await self.respond(writer, v2, "400 Bad Request")
+      return
+    if parts[1].strip("/") != self.mountpoint:
+      table = self.sourcetable().encode()
+      if v2:
+        head = ("HTTP/1.1 200 OK\r\nNtrip-Version: Ntrip/2.0\r\nServer: " + self.SERVER
+                + "\r\nContent-Type: gnss/sourcetable\r\nContent-Length: " + str(len(table)) + "\r\nConnection: close\r\n\r\n")
+      else:
+        head = "SOURCETABLE 200 OK\r\nServer: " + self.SERVER + "\r\nContent-Type: text/plain\r\nContent-Length: " + str(len(table)) + "\r\n\r\n"
+      writer.write(head.encode() + table)
+      await self.finish(writer)
+      return
+    if self.auth is not None and headers.get("authorization", "") != "Basic " + self.auth:
+      await self.respond(writer, v2, "401 Unauthorized", "WWW-Authenticate: Basic realm=\"/" + self.mountpoint + "\"\r\n")
+      return
+    if v2:
+      writer.write(("HTTP/1.1 200 OK\r\nNtrip-Version: Ntrip/2.0\r\nServer: " + self.SERVER
+                    + "\r\nContent-Type: gnss/data\r\nTransfer-Encoding: chunked\r\nCache-Control: no-store\r\n\r\n").encode())
+    else:
+      writer.write(b"ICY 200 OK\r\n\r\n")
+    client = NTRIP_Client(writer, chunked=v2)
+    self.clients.append(client)
+    self.tasks.add(asyncio.current_task())
+    print("NTRIP client connected: " + str(client.address))
+    #Requests the client sends later (e.g. NMEA positions) are not needed and discarded
+    discard = asyncio.ensure_future(self.discard(reader, client))
+    try:
+      await self.send(client)
+      if client.chunked:
+        #Last chunk
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    except (ConnectionError, OSError):
+      pass
+    self.clients.remove(client)
+    self.tasks.discard(asyncio.current_task())
+    discard.cancel()
+    await self.finish(writer)
+    print("NTRIP client disconnected: " + str(client.address) + ("" if client.dropped == 0 else
+          ", " + str(client.dropped) + " messages dropped"))
+
+  async def respond(self, writer, v2, status, extra=""):
+    writer.write((("HTTP/1.1 " if v2 else "HTTP/1.0 ") + status + "\r\nServer: " + self.SERVER + "\r\n" + extra
+                  + ("Ntrip-Version: Ntrip/2.0\r\n" if v2 else "") + "Connection: close\r\n\r\n").encode())
+    await self.finish(writer)
+
+  async def finish(self, writer):
+    #Closes the connection once the data written has been sent
+    try:
+      await writer.drain()
+      writer.close()
+      await writer.wait_closed()
+    except (ConnectionError, OSError):
+      pass
+
+  async def discard(self, reader, client):
+    try:
+      while len(await reader.read(4096)) > 0:
+        pass
+    except ConnectionError:
+      pass
+    #Closed by the client
+    client.closed = True
+    client.ready.set()
+
+  async def send(self, client):
+    while True:
+      await client.ready.wait()
+      client.ready.clear()
+      while len(client.queue) > 0 and not client.closed:
+        msg = client.queue.popleft()
+        if client.chunked:
+          msg = b"%x\r\n" % len(msg) + msg + b"\r\n"
+        client.writer.write(msg)
+        await client.writer.drain()
+      if client.closed:
+        return
+
+  def broadcast(self, msg):
+    for client in self.clients:
+      if len(client.queue) >= self.maxQueue:
+        client.queue.popleft()
+        client.dropped += 1
+        self.dropped += 1
+      client.queue.append(msg)
+      client.ready.set()
+
+  def write(self, msg):
+    #Queues msg for all clients of the mountpoint, without waiting for them
+    if len(msg) > 0:
+      self.loop.call_soon_threadsafe(self.broadcast, bytes(msg))
+
+  def pending(self):
+    #Number of messages buffered for all clients
+    return sum(len(client.queue) for client in list(self.clients))
+
+  def close(self, timeout=5.0):
+    #Sends the buffered messages for up to timeout seconds, then stops the caster
+    end = time.time() + timeout
+    time.sleep(0.01)
+    while self.pending() > 0 and time.time() < end:
+      time.sleep(0.01)
+    asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+    self.loop.call_soon_threadsafe(self.loop.stop)
+    self.thread.join()
+    self.loop.close()
+
+  async def stop(self):
+    self.server.close()
+    for client in list(self.clients):
+      client.closed = True
+      client.ready.set()
+    if len(self.tasks) > 0:
+      await asyncio.wait(list(self.tasks), timeout=1.0)
+    await self.server.wait_closed()
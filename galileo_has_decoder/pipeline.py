@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+'''
+Pipelined decoding classes
+
+The chain a reader otherwise runs inline for every HAS page (HAS_Storage.feedMessage,
+SSR_Converter.convertMessage, output.write) is split into stages, each running in a thread of its
+own and connected by bounded queues:
+  reader --> decode (HAS_Storage) --> encode (SSR_Converter) --> write (output)
+The reader hands its pages over with Pipeline.feedPage, which replaces Page_Feeding.feedPage, and
+writes its PPP Wizard pass-through data to the pipeline instead of the output. Everything passes all
+stages in the order read, so the output is the same as without the pipeline. A slow output (or
+converter) thus no longer holds up reading a serial port or TCP stream.
+With policy "block", a stage with a full queue holds up the previous one (back-pressure), with
+"drop", the items not fitting into the full queue of the encode or write stage are dropped. Pages
+are never dropped before decoding (a HAS message would be lost with them), the decode stage always
+holds up the reader.
+'''
+
+import atexit
+import queue
+import threading
+import time
+
+class Pipeline_Stage:
+  #A thread processing the items of a bounded queue, with the metrics: items processed and dropped,
+  #largest queue depth seen, latency (time from entering the queue until processed) total and maximum
+  name = None
+  queue = None
+  policy = None
+  count = 0
+  dropped = 0
+  maxDepth = 0
+  latency = 0.0
+  maxLatency = 0.0
+  def __init__(self, name, func, maxQueue=64, policy="block"):
+    self.name = name
+    self.func = func
+    self.policy = policy
+    self.queue = queue.Queue(maxsize=maxQueue)
+    self.lock = threading.Lock()
+    self.thread = threading.Thread(target=self.run, name="Pipeline-"+name, daemon=True)
+    self.thread.start()
+
+  def put(self, item):
+    entry = (time.perf_counter(), item)
+    if self.policy == "drop":
+      try:
+        self.queue.put_nowait(entry)
+      except queue.Full:
+        with self.lock:
+          self.dropped += 1
+        return
+    else:
+      self.queue.put(entry)
+    depth = self.queue.qsize()
+    if depth > self.maxDepth:
+      self.maxDepth = depth
+
+  def run(self):
+    while True:
+      t, item = self.queue.get()
+      if item is None:
+        #Stopped
+        self.queue.task_done()
+        return
+      try:
+        self.func(item)
+      except Exception as e:
+        print("Pipeline stage " + self.name + ": " + type(e).__name__ + ": " + str(e))
+      dt = time.perf_counter() - t
+      with self.lock:
+        self.count += 1
+        self.latency += dt
+        if dt > self.maxLatency:
+          self.maxLatency = dt
+      self.queue.task_done()
+
+  def metrics(self):
+    with self.lock:
+      return {"processed": self.count, "dropped": self.dropped, "depth": self.queue.qsize(),
+              "maxDepth": self.maxDepth, "meanLatency": self.latency/self.count if self.count > 0 else 0.0,
+              "maxLatency": self.maxLatency}
+
+class Pipeline:
+  #has_storage: storage decoding the pages, converter: SSR_Converter (or None), output: output object
+  #(or None). maxQueue: capacity of every queue, policy: "block" or "drop" for full queues of the
+  #encode and write stages (the decode stage always blocks).
+  has_storage = None
+  converter = None
+  output = None
+  pppWiz = False
+  stages = None
+  hasnum = 0
+  latency = None
+  def __init__(self, has_storage, converter=None, output=None, maxQueue=64, policy="block"):
+    if policy not in ["block", "drop"]:
+      raise ValueError("The policy of the pipeline must be 'block' or 'drop'")
+    self.has_storage = has_storage
+    self.converter = converter
+    self.output = output
+    self.pppWiz = converter is not None and converter.pppWiz
+    self.write_stage = Pipeline_Stage("write", self.writeItem, maxQueue, policy)
+    self.encode_stage = Pipeline_Stage("encode", self.encodeItem, maxQueue, policy)
+    self.decode_stage = Pipeline_Stage("decode", self.decodeItem, maxQueue, "block")
+    self.stages = [self.decode_stage, self.encode_stage, self.write_stage]
+    #The stages hold the output, which would not be flushed at exit while they run
+    atexit.register(self.close)
+
+  def attach(self, reader):
+    #Pages of reader (also of the readers of a Multi_Reader) are fed to the pipeline from now on
+    for r in getattr(reader, "readers", None) or [reader]:
+      r.feedPage = self.feedPage
+
+  def feedPage(self, has_msg, tow, epoch, converter=None, output=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #Replaces the reader's feedPage: the page is queued with the conversion options, HAS messages
+    #are counted in hasnum
+    options = {"compact":compact, "HRclk":HRclk, "lowerUDI":lowerUDI, "verbose":verbose}
+    self.decode_stage.put(("page", has_msg, tow, epoch, options, time.perf_counter()))
+    return False
+
+  def write(self, msg, *args):
+    #Output of the reader (PPP Wizard pass-through), kept in order with the converted messages
+    self.decode_stage.put(("raw", bytes(msg), args))
+
+  def decodeItem(self, item):
+    if item[0] != "page":
+      self.encode_stage.put(item)
+      return
+    _, has_msg, tow, epoch, options, arrival = item
+    if self.latency != None:
+      #Latency_Monitor: the page arrived when queued
+      self.latency.arrived(arrival)
+    with self.has_storage.lock:
+      if not self.has_storage.feedMessage(has_msg, tow, verbose=options["verbose"]):
+        return
+      msg, msg_tow = self.has_storage.lastMessage, self.has_storage.lastMessage_tow
+    self.hasnum += 1
+    if self.converter != None:
+      self.encode_stage.put(("message", msg, msg_tow, epoch, options))
+
+  def encodeItem(self, item):
+    if item[0] != "message":
+      self.write_stage.put(item)
+      return
+    _, msg, tow, epoch, options = item
+    converted = self.converter.convertMessage(msg, compact=options["compact"], HRclk=options["HRclk"], tow=tow,
+                                              lowerUDI=options["lowerUDI"], verbose=options["verbose"])
+    if converted != None:
+      self.write_stage.put(("converted", converted, epoch))
+
+  def writeItem(self, item):
+    if self.output == None:
+      return
+    if item[0] == "raw":
+      self.output.write(item[1], *item[2])
+      return
+    for msg_bytes in item[1]:
+      if self.pppWiz:
+        self.output.write(msg_bytes, 2, 1, item[2])
+      else:
+        self.output.write(msg_bytes)
+
+  def flush(self):
+    #Waits until all items queued so far have passed all stages
+    for stage in self.stages:
+      stage.queue.join()
+
+  def close(self):
+    #Processes everything queued, then stops the stages
+    for stage in self.stages:
+      if stage.thread.is_alive():
+        stage.queue.put((time.perf_counter(), None))
+        stage.thread.join()
+
+  def metrics(self):
+    #Metrics of every stage, by name
+    return {stage.name: stage.metrics() for stage in self.stages}
+
+  def printMetrics(self):
+    for name, m in self.metrics().items():
+      print("  %-6s processed %8d, dropped %6d, queue depth %4d (max %4d), latency mean %8.3f ms, max %8.3f ms"
+            % (name, m["processed"], m["dropped"], m["depth"], m["maxDepth"], m["meanLatency"]*1e3, m["maxLatency"]*1e3))
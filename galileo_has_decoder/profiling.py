@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+'''
+Profiling classes
+
+A Code_Profiler runs a profiler while the converter converts (HAS_Converter.convertX, convertAll,
+convertUntil) and writes the profile on exit and whenever the process receives SIGUSR1:
+  cprofile:     the deterministic cProfile of the standard library, written as .prof (pstats)
+  pyinstrument: the sampling profiler of the optional pyinstrument package, written as speedscope
+                JSON (.json), pstats (.prof) or HTML (.html)
+Either profiles the thread the converter reads in. The Stage_Timer is cheap enough to stay on in
+operation: it only sums up the time spent in the stages (decode: HAS_Storage.feedMessage, convert:
+SSR_Converter.convertMessage, write: output.write, read: the rest of the convert calls, i.e. the
+reader itself), also of the threads of the pipeline.
+'''
+
+import atexit
+import cProfile
+import json
+import signal
+import threading
+import time
+
+class Profiling_Error(Exception):
+  #Base Profiling Error class
+  pass
+
+def dumpOnSignal(profiler):
+  #profiler.dump() on SIGUSR1, besides the handler installed before. Only possible in the main
+  #thread of platforms with SIGUSR1.
+  if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+    return False
+  previous = signal.getsignal(signal.SIGUSR1)
+  def handler(signum, frame):
+    profiler.dump()
+    if callable(previous):
+      previous(signum, frame)
+  signal.signal(signal.SIGUSR1, handler)
+  return True
+
+class Code_Profiler:
+  #mode: "cprofile" or "pyinstrument", path: output file (default by mode), interval: sampling
+  #interval of pyinstrument in seconds
+  PATHS = {"cprofile": "haslib.prof", "pyinstrument": "haslib.speedscope.json"}
+  mode = None
+  path = None
+  depth = 0
+  def __init__(self, mode="cprofile", path=None, interval=0.001, atExit=True):
+    if mode not in self.PATHS:
+      raise Profiling_Error("Unknown profiler: " + str(mode) + ". Options are " + str(list(self.PATHS.keys())) + " and 'stages'")
+    self.mode = mode
+    self.path = path or self.PATHS[mode]
+    if mode == "cprofile":
+      if not self.path.endswith(".prof"):
+        raise Profiling_Error("cProfile profiles are written as .prof, use pyinstrument for speedscope or HTML")
+      self.profiler = cProfile.Profile()
+    else:
+      try:
+        import pyinstrument
+      except ImportError:
+        raise Profiling_Error("The pyinstrument package is required for the 'pyinstrument' profiler")
+      self.profiler = pyinstrument.Profiler(interval=interval, async_mode="disabled")
+    self.lock = threading.RLock()
+    dumpOnSignal(self)
+    if atExit:
+      atexit.register(self.dump)
+
+  def wrap(self, func):
+    #func, profiled while it runs (nested calls are profiled once)
+    def profiled(*args, **kwargs):
+      self.start()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        self.stop()
+    return profiled
+
+  def start(self):
+    with self.lock:
+      self.depth += 1
+      if self.depth == 1:
+        if self.mode == "cprofile":
+          self.profiler.enable()
+        else:
+          self.profiler.start()
+
+  def stop(self):
+    with self.lock:
+      self.depth -= 1
+      if self.depth == 0:
+        if self.mode == "cprofile":
+          self.profiler.disable()
+        else:
+          self.profiler.stop()
+
+  def dump(self):
+    #Writes the profile up to now, a running profiler continues afterwards
+    with self.lock:
+      running = self.depth > 0
+      if running:
+        if self.mode == "cprofile":
+          self.profiler.disable()
+        else:
+          self.profiler.stop()
+      try:
+        if self.mode == "cprofile":
+          self.profiler.dump_stats(self.path)
+        elif self.profiler.last_session is not None:
+          from pyinstrument import renderers
+          if self.path.endswith(".prof"):
+            renderer = renderers.PstatsRenderer()
+          elif self.path.endswith(".html"):
+            renderer = renderers.HTMLRenderer()
+          else:
+            renderer = renderers.SpeedscopeRenderer()
+          output = renderer.render(self.profiler.last_session)
+          with open(self.path, "wb" if isinstance(output, bytes) else "w") as f:
+            f.write(output)
+        else:
+          return
+        print("Profile written to " + self.path)
+      finally:
+        if running:
+          if self.mode == "cprofile":
+            self.profiler.enable()
+          else:
+            self.profiler.start()
+
+class Stage_Timer:
+  #Time spent in the stages of the converter, summed up per stage. threaded: the stages run in
+  #threads of their own (pipeline), so the reader's time is not the rest of the convert calls.
+  #path: Optional. JSON file the timings are written to, besides printing them.
+  STAGES = ["read", "decode", "convert", "write"]
+  path = None
+  threaded = False
+  total = 0.0
+  calls = 0
+  depth = 0
+  def __init__(self, path=None, threaded=False, atExit=True):
+    self.path = path
+    self.threaded = threaded
+    self.seconds = {stage: 0.0 for stage in self.STAGES}
+    self.counts = {stage: 0 for stage in self.STAGES}
+    dumpOnSignal(self)
+    if atExit:
+      atexit.register(self.dump)
+
+  def timed(self, stage, func):
+    seconds, counts = self.seconds, self.counts
+    def wrapper(*args, **kwargs):
+      t = time.perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        seconds[stage] += time.perf_counter()-t
+        counts[stage] += 1
+    return wrapper
+
+  def attach(self, has_storage, converter=None, output=None):
+    #Times the feedMessage of has_storage, the convertMessage of converter and the write of output
+    has_storage.feedMessage = self.timed("decode", has_storage.feedMessage)
+    if converter != None:
+      converter.convertMessage = self.timed("convert", converter.convertMessage)
+    if output != None:
+      output.write = self.timed("write", output.write)
+
+  def wrap(self, func):
+    #func, of which the run time is the total (nested calls are counted once)
+    def timed(*args, **kwargs):
+      self.depth += 1
+      t = time.perf_counter()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        self.depth -= 1
+        if self.depth == 0:
+          self.total += time.perf_counter()-t
+          self.calls += 1
+    return timed
+
+  def summary(self):
+    #Seconds, calls and share of the total time of every stage, by name
+    seconds = dict(self.seconds)
+    if not self.threaded:
+      seconds["read"] = max(self.total - sum(seconds[stage] for stage in self.STAGES[1:]), 0.0)
+      counts = dict(self.counts, read=self.calls)
+    else:
+      seconds["read"] = None
+      counts = dict(self.counts, read=None)
+    return {stage: {"seconds": seconds[stage], "count": counts[stage],
+                    "share": seconds[stage]/self.total if seconds[stage] is not None and self.total > 0 else None}
+            for stage in self.STAGES}
+
+  def dump(self):
+    if self.calls == 0:
+      return
+    summary = self.summary()
+    print("Stage times of " + "{:.3f}".format(self.total) + " s converting:")
+    for stage, s in summary.items():
+      if s["seconds"] is None:
+        continue
+      print("  %-7s %10.3f s %6.1f %% %9d calls %10.3f ms/call" % (stage, s["seconds"], (s["share"] or 0)*100, s["count"],
+            s["seconds"]/s["count"]*1e3 if s["count"] else 0))
+    if self.path != None:
+      with open(self.path, "w") as f:
+        json.dump({"total": self.total, "calls": self.calls, "threaded": self.threaded, "stages": summary}, f, indent=1)
+      print("Stage times written to " + self.path)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+'''
+Recording replay classes
+
+A Recording_Replay writes an SBF or BINEX recording to an output (see load_generator.openTarget:
+a TCP connection, a pseudo-terminal or a file) on the cadence of its GNSS time stamps: SBF blocks
+by TOW/WNc, BINEX records by the transmission time of their C/Nav subrecords. The recording can be
+replayed at real-time, any multiple of it or as fast as possible. All bytes are written, the ones
+between blocks (and blocks without a valid time) go with the block before them.
+The replay measures how far it runs behind its schedule (a blocking write means the consumer
+does not keep up) and samples the consumer's lag: the bytes written but not yet received, and the
+span of GNSS time they hold.
+'''
+
+import bisect
+import time
+import numpy as np
+from galileo_has_decoder.sbf_reading import SBF_Index
+from galileo_has_decoder.binex_reading import Binex_Reader, FileError
+from galileo_has_decoder.utils_binex import Binex_Record, BinexError
+from galileo_has_decoder.utils import Mapped_File
+
+class Recording_Replay:
+  #path: SBF or BINEX recording, fmt: "sbf" or "binex" (if not set, from the file ending).
+  #maxGap: time stamps going back or jumping ahead by more than maxGap seconds (e.g. a receiver
+  #restart or the next loop) continue the schedule without a pause.
+  fmt = None
+  maxGap = 10.0
+  path = None
+  #Byte offsets at which the epochs (runs of blocks with the same time stamp) end, and their times
+  ends = None
+  times = None
+  def __init__(self, path, fmt=None, maxGap=10.0):
+    if fmt is None:
+      if ".sbf" in str(path).lower():
+        fmt = "sbf"
+      elif ".bnx" in str(path).lower():
+        fmt = "binex"
+    if fmt not in ["sbf", "binex"]:
+      raise ValueError("The format of " + str(path) + " must be 'sbf' or 'binex'")
+    self.path = path
+    self.fmt = fmt
+    self.maxGap = maxGap
+    self.file = Mapped_File(path)
+    if fmt == "sbf":
+      starts, stamps = self.scanSBF()
+    else:
+      starts, stamps = self.scanBinex()
+    self.schedule(starts, stamps)
+
+  def scanSBF(self):
+    #Block offsets and GPS times of the blocks with a valid time stamp
+    blocks = SBF_Index(self.path).blocks
+    valid = (blocks["tow"] != 0xFFFFFFFF) & (blocks["wnc"] != 0xFFFF)
+    blocks = blocks[valid]
+    return blocks["offset"].astype(np.int64), blocks["wnc"].astype(np.float64)*604800 + blocks["tow"]/1000
+
+  def scanBinex(self):
+    #Record offsets and GPS times of the C/Nav records, as Binex_Reader finds them
+    reader = Binex_Reader(self.path)
+    data = reader.file.view
+    starts = []
+    stamps = []
+    binex = None
+    i = 0
+    try:
+      while True:
+        try:
+          pos = reader.findMessage(i)
+        except FileError:
+          break
+        binex = Binex_Record()
+        try:
+          i = binex.readBlock(data, pos)
+        except (BinexError, IndexError):
+          i = pos+1
+          continue
+        if binex.decodeBlock():
+          starts += [pos]
+          stamps += [binex.subrecord.transTime*60 + binex.subrecord.transTime_ms/1000]
+    finally:
+      #The records are views into the mapped file, which has to be released before closing it
+      data = binex = None
+      reader.close()
+    return np.array(starts, dtype=np.int64), np.array(stamps, dtype=np.float64)
+
+  def schedule(self, starts, stamps):
+    #Epochs: the blocks from one time stamp to the next different one
+    if len(starts) == 0:
+      self.ends = np.array([self.file.size], dtype=np.int64)
+      self.times = np.zeros(1)
+      return
+    change = np.flatnonzero(np.diff(stamps) != 0) + 1
+    self.ends = np.append(starts[change], self.file.size)
+    self.times = stamps[np.append(0, change)]
+
+  def epochs(self):
+    #Number of epochs in the recording
+    return len(self.ends)
+
+  def duration(self):
+    #GNSS time spanned, without gaps beyond maxGap
+    steps = np.diff(self.times)
+    return float(np.sum(steps[(steps >= 0) & (steps <= self.maxGap)]))
+
+  def run(self, output, speed=1.0, loops=1, interval=None, drain=5.0):
+    #Writes the recording loops times to output (an object with write and pending, e.g. of
+    #openTarget), speed epochs' seconds per wall clock second (0: as fast as possible). Every
+    #interval seconds, the progress is printed. In the end, up to drain seconds are waited for the
+    #consumer to receive everything. Returns the statistics of the run.
+    stats = {"epochs": 0, "bytes": 0, "span": 0.0, "elapsed": 0.0, "speed": None, "rate": None,
+             "behind": 0.0, "maxBehind": 0.0, "maxPending": 0, "maxLag": 0.0, "drained": None}
+    data = self.file.view
+    #GNSS time (without gaps) reached at the end of every byte offset written, to convert the bytes
+    #pending at the consumer into the span of GNSS time they hold
+    written = []
+    stamps = []
+    pending = getattr(output, "pending", lambda: None)
+    span = 0.0
+    start = 0
+    last = None
+    t0 = lastReport = time.perf_counter()
+    try:
+      for loop in range(loops):
+        start = 0
+        for end, stamp in zip(self.ends.tolist(), self.times.tolist()):
+          if last is not None and 0 <= stamp-last <= self.maxGap:
+            span += stamp-last
+          last = stamp
+          if speed > 0:
+            due = t0 + span/speed
+            now = time.perf_counter()
+            if due > now:
+              time.sleep(due-now)
+            else:
+              behind = now-due
+              stats["behind"] += behind
+              stats["maxBehind"] = max(stats["maxBehind"], behind)
+          if end > start:
+            output.write(data[start:end])
+          stats["bytes"] += end-start
+          stats["epochs"] += 1
+          start = end
+          written += [stats["bytes"]]
+          stamps += [span]
+          if len(written) > 4096:
+            del written[:2048], stamps[:2048]
+          queued = pending()
+          if queued is not None and queued > 0:
+            stats["maxPending"] = max(stats["maxPending"], queued)
+            stats["maxLag"] = max(stats["maxLag"], self.lag(written, stamps, stats["bytes"]-queued, span))
+          now = time.perf_counter()
+          if interval is not None and now-lastReport >= interval:
+            lastReport = now
+            self.report(stats, span, now-t0, queued)
+      stats["span"] = span
+      stats["elapsed"] = time.perf_counter()-t0
+      #Waiting for the consumer to catch up
+      queued = pending()
+      while queued and time.perf_counter()-t0-stats["elapsed"] < drain:
+        time.sleep(0.01)
+        queued = pending()
+      if queued == 0:
+        stats["drained"] = time.perf_counter()-t0-stats["elapsed"]
+    finally:
+      data = None
+    if stats["elapsed"] > 0:
+      stats["speed"] = stats["span"]/stats["elapsed"]
+      stats["rate"] = stats["bytes"]/stats["elapsed"]
+    if stats["epochs"] > 0:
+      stats["behind"] /= stats["epochs"]
+    return stats
+
+  def lag(self, written, stamps, received, span):
+    #GNSS time between the last epoch written and the one the consumer receives
+    idx = bisect.bisect_right(written, received)
+    if idx >= len(stamps):
+      return 0.0
+    return span - stamps[idx]
+
+  def report(self, stats, span, elapsed, queued):
+    print("%8.1f s GNSS time in %8.1f s (%.1fx), %10d bytes, behind schedule max %.3f s, pending %s bytes, lag max %.1f s"
+          % (span, elapsed, span/elapsed if elapsed > 0 else 0, stats["bytes"], stats["maxBehind"],
+             "-" if queued is None else str(queued), stats["maxLag"]))
+
+  def close(self):
+    self.file.close()
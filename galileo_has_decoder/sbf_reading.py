@@ -7,10 +7,11 @@ VER   DATE        AUTHOR
 1.0   09/12/2021  Oliver Horst / FGI
 '''
 
+import os
 import struct
-import math
-from galileo_has_decoder.utils import bits2Bytes, gpst2time
-from galileo_has_decoder.utils_sbf import splitStream, SBF_Block, IONO_Block
+import numpy as np
+from galileo_has_decoder.utils import gpst2time, Mapped_File, Page_Feeding
+from galileo_has_decoder.utils_sbf import crcValid, SBF_Block, IONO_Block
 from galileo_has_decoder.has_classes import HAS_Storage
 from galileo_has_decoder.ssr_converter import SSR_Converter
 from galileo_has_decoder.tcp_server import TCP_Server
@@ -19,97 +20,233 @@ class FileError(Exception):
   #Base File Error class
   pass
 
-class SBF_Reader:
+class SBF_Index:
+  #Index of the valid blocks of an SBF file, one entry per block in file order. It is built in one
+  #vectorized pass over the memory-mapped file and kept as a .npy sidecar, so later runs skip the scan.
+  DTYPE = np.dtype([("offset", "<u8"), ("blockType", "<u2"), ("length", "<u2"),
+                    ("tow", "<u4"), ("wnc", "<u2"), ("svid", "u1")])
+  SUFFIX = ".idx.npy"
+  #Bytes searched for sync patterns per step, bounds the temporary arrays
+  CHUNK = 1 << 26
+  path = None
+  blocks = None
+  def __init__(self, path, rebuild=False, save=True):
+    self.path = path
+    if not rebuild and self.fresh():
+      self.load()
+    else:
+      self.build()
+      if save:
+        try:
+          self.save()
+        except OSError:
+          #Read-only location: the index is still usable for this run
+          pass
+
+  def sidecar(self):
+    return self.path + self.SUFFIX
+
+  def fresh(self):
+    #The sidecar exists and is not older than the SBF file
+    side = self.sidecar()
+    return os.path.exists(side) and os.path.getmtime(side) >= os.path.getmtime(self.path)
+
+  def load(self):
+    self.blocks = np.load(self.sidecar(), allow_pickle=False)
+    if self.blocks.dtype != self.DTYPE:
+      raise ValueError("Unexpected SBF index layout in " + self.sidecar())
+
+  def save(self):
+    with open(self.sidecar(), "wb") as f:
+      np.save(f, self.blocks, allow_pickle=False)
+
+  def build(self):
+    file = Mapped_File(self.path)
+    try:
+      data = np.frombuffer(file.map, dtype="u1")
+      self.blocks = self.scan(data, file.view)
+    finally:
+      #The array exports the map's buffer, which has to be released before closing it
+      data = None
+      file.close()
+
+  def scan(self, data, view):
+    size = len(data)
+    #Sync candidates: "$@" with a complete 8-byte header behind it
+    parts = [np.zeros(0, dtype=np.int64)]
+    for lo in range(0, max(size-7, 0), self.CHUNK):
+      win = data[lo:min(lo+self.CHUNK, size-7)+1]
+      parts += [np.flatnonzero((win[:-1] == 0x24) & (win[1:] == 0x40)) + lo]
+    sync = np.concatenate(parts)
+
+    def field(off, n, valid):
+      #Little-endian unsigned field of n bytes at sync+off, 0 where the block is too short
+      idx = np.minimum(sync+off, size-n)
+      val = np.zeros(len(sync), dtype=np.uint64)
+      for k in range(n):
+        val |= data[idx+k].astype(np.uint64) << np.uint64(8*k)
+      val[~valid] = 0
+      return val
+
+    every = np.ones(len(sync), dtype=bool)
+    crc = field(2, 2, every)
+    blockType = field(4, 2, every)
+    length = field(6, 2, every)
+    ok = (length % 4 == 0) & (length >= 8) & (sync+length.astype(np.int64) <= size)
+    #ID, length and body are covered by the CRC
+    for k in np.flatnonzero(ok).tolist():
+      o = int(sync[k])
+      ok[k] = crcValid(int(crc[k]), view[o+4:o+int(length[k])])
+    sync, blockType, length = sync[ok], blockType[ok], length[ok]
+    #A sync pattern inside the body of a preceding valid block is not a block of its own
+    ends = sync+length.astype(np.int64)
+    reach = np.maximum.accumulate(ends)
+    keep = np.ones(len(sync), dtype=bool)
+    keep[1:] = sync[1:] >= reach[:-1]
+    sync, blockType, length = sync[keep], blockType[keep], length[keep]
+
+    blocks = np.zeros(len(sync), dtype=self.DTYPE)
+    blocks["offset"] = sync
+    blocks["blockType"] = blockType
+    blocks["length"] = length
+    #Every block body starts with TOW [ms] and WNc; the C/NAV block carries the SVID behind them
+    blocks["tow"] = field(8, 4, length >= 12)
+    blocks["wnc"] = field(12, 2, length >= 14)
+    blocks["svid"] = field(14, 1, (blockType == 4024) & (length >= 15))
+    return blocks
+
+  def times(self, blocks=None):
+    #GPS seconds (week*604800 + TOW) of the entries
+    if blocks is None:
+      blocks = self.blocks
+    return blocks["wnc"].astype(np.float64)*604800 + blocks["tow"]/1000
+
+  def select(self, blockType=None, start=None, end=None):
+    #Entries of one block ID and/or within the GPS time window [start, end), in seconds
+    blocks = self.blocks
+    if blockType is not None:
+      blocks = blocks[blocks["blockType"] == blockType]
+    if start is not None or end is not None:
+      #TOW and WNc do-not-use values never fall into a window
+      t = self.times(blocks)
+      mask = (blocks["tow"] != 0xFFFFFFFF) & (blocks["wnc"] != 0xFFFF) & (blocks["length"] >= 14)
+      if start is not None:
+        mask &= t >= start
+      if end is not None:
+        mask &= t < end
+      blocks = blocks[mask]
+    return blocks
+
+  def seek(self, start):
+    #Byte offset of the first block at or after the GPS time start, or the file end
+    blocks = self.select(start=start)
+    if len(blocks) == 0:
+      return int(self.blocks["offset"][-1]+self.blocks["length"][-1]) if len(self.blocks) else 0
+    return int(blocks["offset"][0])
+
+class SBF_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
   file = None
+  pos = None
   has_storage = None
-  def __init__(self, path, msgnum=0, skip=0):
-    self.file = open(path, "rb")
-    lines = self.file.readlines()
-    lines = lines[int(skip*len(lines)):]
-    self.pNum = math.ceil(len(lines) / 20000)
-    self.fileC = b''.join(lines)
-    self.pages = splitStream(self.fileC, self.pNum)
+  rejectedBlocks = None
+  index = None
+  window = None
+  #Optional: offset at which the search for further blocks stops, and a list to which the search
+  #start of every block is appended (used to read a file in shards)
+  end = None
+  trace = None
+  def __init__(self, path, msgnum=0, skip=0, index=False, window=None, skipBytes=0):
+    self.file = Mapped_File(path)
+    #Byte offset of the next unread data
+    self.pos = self.file.offset(skip, skipBytes)
     self.has_storage = HAS_Storage()
     self.msgnum = msgnum
     self.pppWiz = False
+    self.rejectedBlocks = 0
+    #With an index (True, or an SBF_Index of the file), only the indexed blocks are visited.
+    #window: (start, end) GPS time in seconds to read, either bound may be None; requires the index.
+    if window is not None:
+      self.window = tuple(window)
+      index = index or True
+    if index is True:
+      index = SBF_Index(path)
+    if index:
+      self.index = index
 
   def read(self, path=None, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
     if mode != 'm':
         raise Exception("File Reading does only support message-number constraints")
     if x != None: self.msgnum = x
     if path != None:
-      self.file = open(path, "rb")
-      self.fileC = b''.join(self.file.readlines())
-      self.pages = splitStream(self.fileC, self.pNum)
+      self.file.close()
+      self.file = Mapped_File(path)
+      self.pos = 0
+      if self.index is not None:
+        self.index = SBF_Index(path)
     
     if converter is not None:
       if converter.pppWiz:
         self.output = output
         self.pppWiz = True
-    i = 0
+    if self.index is not None:
+      j, cnavs, hasnum = self.readIndexed(converter, output, compact, HRclk, lowerUDI, verbose)
+      if verbose>=1:
+        print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
+              +" HAS messages have successfully been decoded and converted.")
+      return j, cnavs, hasnum
+    data = self.file.view
     j = 0
-    pC = 0
-    content = self.pages[pC]
     cnavs = 0
     hasnum=0
 
     while j<self.msgnum or self.msgnum==0:
+      if self.end is not None and self.pos >= self.end:
+        break
+      if self.trace is not None:
+        self.trace.append(self.pos)
       j += 1
+      self.blocks += 1
       if verbose >= 5:
         print("Message no. " + str(j))
       try:
-        content, pC = self.findMessage(content, pC, verbose)
+        start = self.findMessage(self.pos, verbose)
       except(FileError):
         j-=1
+        self.blocks -= 1
         if verbose >= 1:
           print("EOF REACHED: Ending operation")
         break
       if verbose >= 5:
         print("   Found start of block")
-      i = 0
-      header, i = struct.unpack("<HHH", content[i:i+6]), i+6
-      header = list(header)
-      if header[2] % 4 != 0:
+      #start: offset of the block CRC, directly behind the sync bytes
+      self.pos = start
+      header = list(struct.unpack_from("<HHH", data, start))
+      if header[2] % 4 != 0 or header[2] < 8:
         if verbose >= 5:
           print("SBF Reader: Invalid header, continuing search...")
         continue
       _crc = header[0]
       blockType = header[1]
       blockLength = header[2]-8
+      end = start+header[2]-2
+      #ID, length and body follow the CRC field; a block cut off by the end of file fails as well
+      if end > self.file.size or not crcValid(_crc, data[start+2:end]):
+        self.rejectedBlocks += 1
+        if verbose >= 5:
+          print("SBF Reader: Block CRC error, continuing search...")
+        continue
       if blockType&65528 == 4024:
-        block = content[i:i+blockLength]
-        content = content[i+blockLength:]
+        self.pos = end
         if blockType&7 == 0:
           #_______________________
           #4024 Block: C/NAV Message
           cnavs += 1
-          hasbyteL = 4+2+6*1+16*4
-          pad = blockLength-hasbyteL
-          line, i = list(struct.unpack("<IHBBBBBB16I"+str(pad)+"x", block[:i+blockLength])), i+blockLength 
-          if verbose >= 5:
-            print("   CNAV Block")
-          #Use Septentrio CRC check
-          if line[3] == 1:
-            sbf = SBF_Block(header, line)
-            has_msg = sbf.returnBinary()
-            if self.has_storage.feedMessage(has_msg, line[0]/1000, verbose=verbose):
-              hasnum += 1
-              if converter != None:
-                decoded_msg = self.has_storage.lastMessage
-                tow = self.has_storage.lastMessage_tow
-                converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
-                if output != None and converted != None:
-                  for msg_conv in converted:
-                    msg_bytes = bits2Bytes(msg_conv)
-                    gpst2time(line[1], line[0]/1000)
-                    if self.pppWiz:
-                      output.write(msg_bytes, 2, 1, gpst2time(line[1], line[0]/1000))
-                    else:
-                      output.write(msg_bytes)
-              pass
-          else:
-            if verbose >= 5:
-                print("SBF Reader: CRC error: "+str(line[3]))
+          self.cnavBlocks += 1
+          if self.readCNAV(header, start, converter, output, compact, HRclk, lowerUDI, verbose):
+            hasnum += 1
           #_______________________
         elif blockType&7 == 6:
           #_______________________
@@ -127,28 +264,70 @@ class SBF_Reader:
         else:
           pass
       else:
-        i = i+blockLength
         if verbose >= 5:
           print("   Err: Non-CNAV block: " + str(blockType))
     if verbose>=1:
+      if self.rejectedBlocks > 0:
+        print(str(self.rejectedBlocks)+" SBF blocks were rejected due to a CRC error.")
       print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
             +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
+
+  def readIndexed(self, converter=None, output=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #Walks the index instead of searching the file: blocks were validated when it was built, and only
+    #C/NAV blocks are parsed. The other blocks in range still count as messages and are passed
+    #through to the PPP Wizard output.
+    start, end = self.window if self.window is not None else (None, None)
+    blocks = self.index.select(start=start, end=end)
+    blocks = blocks[blocks["offset"] >= self.pos]
+    if self.msgnum != 0:
+      blocks = blocks[:self.msgnum]
+    j = len(blocks)
+    self.blocks += j
+    if j > 0:
+      self.pos = int(blocks["offset"][-1]+blocks["length"][-1])
+    if not self.pppWiz:
+      blocks = blocks[blocks["blockType"] == 4024]
+    data = self.file.view
+    cnavs = hasnum = 0
+    for offset, blockType, length in zip(blocks["offset"].tolist(), blocks["blockType"].tolist(), blocks["length"].tolist()):
+      if blockType != 4024:
+        self.output.write(data[offset:offset+length], 1, 12)
+        continue
+      cnavs += 1
+      self.cnavBlocks += 1
+      if verbose >= 5:
+        print("Indexed block at byte " + str(offset))
+      header = list(struct.unpack_from("<HHH", data, offset+2))
+      if self.readCNAV(header, offset+2, converter, output, compact, HRclk, lowerUDI, verbose):
+        hasnum += 1
+    return j, cnavs, hasnum
+
+  def readCNAV(self, header, start, converter=None, output=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #4024 Block behind the sync bytes at start: the page is fed to the HAS storage, a completed
+    #HAS message is converted and written. Returns True if a HAS message was decoded.
+    hasbyteL = 4+2+6*1+16*4
+    if header[2]-8 < hasbyteL:
+      return False
+    line = list(struct.unpack_from("<IHBBBBBB16I", self.file.view, start+6))
+    if verbose >= 5:
+      print("   CNAV Block")
+    #Use Septentrio CRC check
+    if line[3] != 1:
+      if verbose >= 5:
+        print("SBF Reader: CRC error: "+str(line[3]))
+      return False
+    sbf = SBF_Block(header, line)
+    return self.feedPage(sbf.returnBinary(), line[0]/1000, gpst2time(line[1], line[0]/1000), converter, output, compact, HRclk, lowerUDI, verbose)
+
+  def findMessage(self, pos, verbose=0):
+    prefix = b'$@'
+    idx = self.file.map.find(prefix, pos)
+    if idx == -1 or idx+8 > self.file.size:
+      raise FileError("EOF REACHED: Ending operation")
+    if self.pppWiz and idx-pos>1:
+      self.output.write(prefix + self.file.view[pos:idx], 1, 12)
+    return idx+2
 
-  def findMessage(self, stream, pC, verbose=0):
-    prefix = bytearray([36, 64])
-    while True:
-        idx = stream.find(prefix)
-        if len(stream[idx:]) < 84 or idx == -1:
-          if pC >= self.pNum-1:
-            raise FileError("EOF REACHED: Ending operation")
-          else:
-            pC += 1
-            stream = stream + self.pages[pC]
-            #test
-            if verbose >= 3:
-              print("SBF File: Next page, " + str(pC+1) + "/" + str(self.pNum))
-            continue
-        elif idx > -1:
-          if self.pppWiz and idx>1:
-            self.output.write(prefix + stream[:idx], 1, 12)
-          return stream[idx+2:], pC
+  def close(self):
+    self.file.close()
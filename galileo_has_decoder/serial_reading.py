@@ -10,9 +10,10 @@ VER   DATE        AUTHOR
 import serial
 import struct
 import time
-from galileo_has_decoder.utils import bits2Bytes
-from galileo_has_decoder.utils_sbf import SBF_Block, IONO_Block
-from galileo_has_decoder.utils_binex import Binex_Record, readUbnxi, BinexError
+from galileo_has_decoder.utils import gpst2time, Page_Feeding
+from galileo_has_decoder.utils_sbf import crcValid, SBF_Block, IONO_Block
+from galileo_has_decoder.utils_binex import Binex_Record, BinexError
+from galileo_has_decoder.binex_reading import Binex_Reader
 from galileo_has_decoder.has_classes import HAS_Storage
 from galileo_has_decoder.ssr_converter import SSR_Converter
 from galileo_has_decoder.tcp_server import TCP_Server
@@ -21,13 +22,18 @@ class FileError(Exception):
   #Base File Error class
   pass
 
-class Serial_SBF_Reader:
+class Serial_SBF_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
   serial = None
+  rejectedBlocks = None
   def __init__(self, port, baudr, msgnum=0):
     self.serial = serial.Serial(port, baudrate=baudr)
     self.has_storage = HAS_Storage()
     self.msgnum = msgnum
     self.pppWiz = False
+    self.rejectedBlocks = 0
 
   def read(self, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
     j = cnavs = hasnum = 0
@@ -46,6 +52,7 @@ class Serial_SBF_Reader:
       if timecurr != 0:
         timecurr = time.time()
       j += 1
+      self.blocks += 1
       if verbose >= 4:
         print("Message " + str(j))
       _data = self.serial.read_until(b'$@')
@@ -54,12 +61,12 @@ class Serial_SBF_Reader:
       if verbose >= 4:
         print("   Found start of block")
       i = 0
-      header = self.serial.read(6)
-      if self.pppWiz and len(header)>0:
-        self.output.write(header, 1, 12)
-      header, i = struct.unpack("<HHH", header), i+6
+      rawHeader = self.serial.read(6)
+      if self.pppWiz and len(rawHeader)>0:
+        self.output.write(rawHeader, 1, 12)
+      header, i = struct.unpack("<HHH", rawHeader), i+6
       header = list(header)
-      if header[2] % 4 != 0:
+      if header[2] % 4 != 0 or header[2] < 8:
         if verbose >= 4:
           print("Invalid header, continuing search...")
         continue
@@ -69,11 +76,17 @@ class Serial_SBF_Reader:
       block = self.serial.read(blockLength)
       if self.pppWiz and len(block)>0:
         self.output.write(block, 1, 12)
+      if not crcValid(_crc, rawHeader[2:], block):
+        self.rejectedBlocks += 1
+        if verbose >= 4:
+          print("Block CRC error, continuing search...")
+        continue
       if blockType&65528 == 4024:
         if blockType&7 == 0:
           #_______________________
           #4024 Block: HAS Message
           cnavs += 1
+          self.cnavBlocks += 1
           hasbyteL = 4+2+6*1+16*4
           pad = blockLength-hasbyteL
           line = list(struct.unpack("<IHBBBBBB16I"+str(pad)+"x", block))
@@ -84,17 +97,8 @@ class Serial_SBF_Reader:
             sbf = SBF_Block(header, line)
             has_msg = sbf.returnBinary()
             #sbf.printNavBits()
-            if self.has_storage.feedMessage(has_msg, line[0]/1000, verbose=verbose):
+            if self.feedPage(has_msg, line[0]/1000, gpst2time(line[1], line[0]/1000), converter, output, compact, HRclk, lowerUDI, verbose):
               hasnum += 1
-              decoded_msg = self.has_storage.lastMessage  
-              if converter != None:
-                tow = self.has_storage.lastMessage_tow
-                converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
-                if output != None and converted != None:
-                  for msg_conv in converted:
-                    msg_bytes = bits2Bytes(msg_conv)
-                    output.write(msg_bytes)
-              pass
           else:
             if verbose >= 4:
                 print("CRC error: "+str(line[3]))
@@ -116,16 +120,27 @@ class Serial_SBF_Reader:
       elif verbose >= 5:
         print("   Err: Non-CNAV block: " + str(blockType))
     if verbose>=1:
+      if self.rejectedBlocks > 0:
+        print(str(self.rejectedBlocks)+" SBF blocks were rejected due to a CRC error.")
       print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
           +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
 
-class Serial_Binex_Reader:
+class Serial_Binex_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
   serial = None
+  #Data received and not yet read. Records are parsed in it as Binex_Reader does in the file, with
+  #more data received while one is cut off, up to MAXRECORD bytes (else it was a false sync byte).
+  buffer = None
+  MAXRECORD = 1 << 12
   def __init__(self, port, baudr=115200, msgnum=0):
     self.serial = serial.Serial(port, baudrate=baudr)
     self.has_storage = HAS_Storage()
     self.msgnum = msgnum
     self.pppWiz = False
+    self.buffer = bytearray()
 
   def read(self, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
     j = cnavs = hasnum = 0
@@ -144,68 +159,66 @@ class Serial_Binex_Reader:
       if timecurr != 0:
         timecurr = time.time()
       j += 1
+      self.blocks += 1
       if verbose >= 4:
           print("Message " + str(j))
-      block = self.serial.read_until(b'\x01')
-      if self.pppWiz and len(block)>0:
-        self.output.write(block, 1, 10)
+      try:
+        start = self.findMessage(verbose)
+      except FileError:
+        j -= 1
+        self.blocks -= 1
+        if verbose >= 1:
+          print("Warning: EOS reached")
+        break
       if verbose >= 5:
-        print("  Pontential Block found")
-      if len(block)>=2:
-        if block[-2] in Binex_Record.syncbytes[:-2]:
-          #Forward readable record found. Now read length & then rest
-          block = block[-2:] + self.serial.read(4)
-          length, _ = readUbnxi(block, 2)
-          block += self.serial.read(length + Binex_Record.crcLen(length))
-          if block[0] in Binex_Record.syncbytes[2:]:
-            try:
-              block += self.serial.read_until(Binex_Record.termBytes[block[0]], 5)
-            except TypeError:
-              continue
-          if self.pppWiz and len(block[2:])>0:
-            self.output.write(block[2:], 1, 10)
-        else:
-          temp = self.serial.read(size=1)
-          if self.pppWiz and len(temp)>0:
-            self.output.write(temp, 1, 10)
-          if temp in Binex_Record.syncbytes[-2:]:
-            #Reverse readable record found. Read reverse length & then drop all but message
-            block += temp
-            total_length, i = readUbnxi(block[-6:-2][::-1])
-            if self.pppWiz and len(block[:-2-i-total_length])>0:
-              self.output.write(block[-2-i-total_length], 1, 10)
-            block = block[-2-i-total_length:]
-          else: block = None
-      else: 
-        if self.pppWiz and len(block)>0:
-          self.output.write(block, 1, 10)
-        block = None
-      if block != None:
-        if verbose >= 5:
-            print("   Found start of block")
-        binex = Binex_Record()
+          print("   Found start of block")
+      binex = Binex_Record()
+      end = None
+      while end is None:
         try:
-          binex.readBlock(block)
-        except BinexError:
-          continue
-        if binex.decodeBlock(verbose):
-            cnavs+=1
-            if self.has_storage.feedMessage(binex.returnBinary(), binex.subrecord.tow, verbose=verbose):
-                hasnum += 1
-                if converter != None:
-                    decoded_msg = self.has_storage.lastMessage
-                    tow = self.has_storage.lastMessage_tow
-                    converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
-                    if output != None and converted != None:
-                        for msg_conv in converted:
-                            msg_bytes = bits2Bytes(msg_conv)
-                            if self.pppWiz:
-                              output.write(msg_bytes, 2, 1, binex.subrecord.epochTime())
-                            else:
-                              output.write(msg_bytes)   
-        elif verbose >= 5:
-            print("     Faulty- or non-C/Nav block")
-      else: j-= 1
+          end = binex.readBlock(self.buffer, start)
+        except (BinexError, IndexError) as e:
+          #Cut off by the end of the data received so far, or a false sync byte
+          if len(self.buffer)-start >= self.MAXRECORD or not self.receive():
+            if verbose >= 5:
+              print("   Err:", e)
+            break
+      if end is None:
+        self.consume(start+1)
+        continue
+      self.consume(end)
+      if binex.decodeBlock(verbose):
+          cnavs+=1
+          self.cnavBlocks += 1
+          if self.feedPage(binex.returnBinary(), binex.subrecord.tow, binex.subrecord.epochTime(), converter, output, compact, HRclk, lowerUDI, verbose):
+              hasnum += 1
+      elif verbose >= 5:
+          print("     Faulty- or non-C/Nav block")
     if verbose>=1:
       print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
           +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
+
+  def findMessage(self, verbose=0):
+    #Offset of the next record start in the buffer (the sync patterns of Binex_Reader), receiving
+    #data until there is one
+    while True:
+      hits = [hit for hit in (self.buffer.find(sync) for sync in Binex_Reader.SYNC_PATTERNS) if hit != -1]
+      if len(hits) > 0:
+        return min(hits)
+      #The last byte may be the sync byte of a pattern
+      self.consume(max(len(self.buffer)-1, 0))
+      if not self.receive():
+        raise FileError("EOS reached: Ending operation.")
+
+  def receive(self):
+    #Appends what the port has received, waiting for at least one byte. False if nothing came.
+    data = self.serial.read(max(1, self.serial.in_waiting))
+    self.buffer += data
+    return len(data) > 0
+
+  def consume(self, n):
+    #Drops the first n bytes of the buffer, passed through to the PPP Wizard output
+    if self.pppWiz and n > 0:
+      self.output.write(bytes(self.buffer[:n]), 1, 10)
+    del self.buffer[:n]
@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+'''
+Sharded file reading class
+
+A single SBF or BINEX file is split at byte offsets into shards which are read in parallel worker
+processes. The result is identical to reading the file with one SBF_Reader or Binex_Reader:
+  1. Workers walk their shard like the file reader, feed the valid HAS pages to a HAS_Storage of
+     their own and record the pages, the outcome of feeding them and the PPP Wizard pass-through
+     data, each with the number of the block/record it was found in. The messages still being
+     assembled at the end of the shard (received pages and t0) are returned with the storage.
+  2. The shards are stitched in file order. Every shard walk is continued past its end until the
+     next one is reached; the following shard is taken from the block at which the serial walk
+     enters it (a shard that never met the serial walk is re-read from there). The worker's
+     storage started empty, so the pages of a shard are fed to the storage of this reader again
+     until both storages are in the same state (messages being assembled and last message ID).
+     From there, the decodings of the worker are used and its storage state is taken over at the
+     end of the shard, so partial HAS messages and the TIMELIMIT carry over as in a serial run.
+  3. The decoded messages are converted in consecutive groups in the workers, each from an empty
+     mask and IOD state of SSR_HAS (HAS_MASKS, HAS_IODs). A message that reads a mask or IOD set
+     not set within its group is left out by the worker and converted here, with the state of the
+     serial run, as is the final state of every group.
+'''
+
+import contextlib
+import copy
+import io
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from galileo_has_decoder.utils import Mapped_File, readHeader, dataValid, processContext
+from galileo_has_decoder.sbf_reading import SBF_Reader
+from galileo_has_decoder.binex_reading import Binex_Reader
+from galileo_has_decoder.has_classes import HAS, HAS_Storage
+from galileo_has_decoder.ssr_classes import Header, SSR_HAS
+
+def messageState(has):
+  #State of a HAS message being assembled, None before its first page: two messages in the same
+  #state take all further pages alike
+  if has.t0 is None:
+    return None
+  return (has.status, has.mType, has.mSize, has.t0, tuple(has.rec), zlib.crc32(b"".join(has.pages[r] for r in has.rec)))
+
+def storageState(storage):
+  #State of a HAS_Storage (single receiver) that decoding further pages depends on: the messages
+  #being assembled with their pages, and the last message ID
+  pending = {}
+  for mID, has in enumerate(storage.HASobjects):
+    if has.t0 is not None:
+      pending[mID] = (has.status, has.mType, has.mSize, has.t0, list(has.rec), [has.pages[r] for r in has.rec])
+  return {"pending":pending, "lastMID":storage.lastMID, "newest":storage.newest, "decoded":storage.decoded}
+
+def restoreStorage(storage, state):
+  for mID in range(32):
+    has = HAS()
+    if mID in state["pending"]:
+      has.status, has.mType, has.mSize, has.t0, has.rec, pages = state["pending"][mID]
+      has.mID = mID
+      for r, page in zip(has.rec, pages):
+        has.pages[r] = page
+    storage.HASobjects[mID] = has
+  storage.lastMID = state["lastMID"]
+  storage.newest = state["newest"]
+  storage.decoded = state["decoded"]
+
+class Walk_Joined(Exception):
+  #Raised by Walk_Trace when the walk reaches one of the stop states
+  pass
+
+class Walk_Trace:
+  #Search state before each block/record of a shard, for the first LIMIT ones, together with the
+  #number of blocks rejected until then. count numbers all blocks/records. A walk reaching one of the
+  #states in stops (a walk over the same blocks from there on) ends with Walk_Joined.
+  LIMIT = 1 << 16
+  reader = None
+  states = None
+  rejected = None
+  count = None
+  stops = None
+  def __init__(self, reader, stops=None):
+    self.reader = reader
+    self.states = []
+    self.rejected = []
+    self.count = 0
+    self.stops = stops if stops is not None else set()
+
+  def append(self, state):
+    if state in self.stops:
+      raise Walk_Joined(state)
+    self.count += 1
+    if self.count <= self.LIMIT:
+      self.states.append(state)
+      self.rejected.append(getattr(self.reader, "rejectedBlocks", 0) or 0)
+
+class Shard_Reading:
+  #Mixin for the file readers: valid HAS pages are fed to a storage of the shard and recorded with the
+  #number of the block/record they were read in and the outcome, as is the PPP Wizard pass-through data
+  pages = None
+  raw = None
+  #Numbers of the blocks/records C/Nav pages were read in (cnavBlocks is the reader's running total)
+  cnavEvents = None
+  #Printed output of the storage, of which every page records its part
+  log = None
+  def startShard(self, state, end, pppWiz=False, verbose=0, stops=None):
+    self.restore(state)
+    self.end = end
+    self.trace = Walk_Trace(self, stops)
+    self.pages = []
+    self.raw = []
+    self.cnavEvents = []
+    self.pppWiz = pppWiz
+    self.output = self
+    self.verbose = verbose
+    self.log = io.StringIO()
+
+  def write(self, msg, n, fmt, epch=0):
+    #Pass-through output of findMessage
+    self.raw += [(self.trace.count, 0, bytes(msg), n, fmt)]
+
+  def feedPage(self, has_msg, tow, epoch, *args):
+    #Invalid pages are dropped by HAS_Storage.feedMessage without any change of state anyway. The
+    #outcome: message ID, its state and the last message ID after the page, the message decoded,
+    #the output printed and the storage's running totals of timeouts and duplicates.
+    hdr = readHeader(has_msg[14:])
+    if not dataValid(has_msg, hdr):
+      return False
+    storage = self.has_storage
+    start = self.log.tell()
+    decoded = None
+    if storage.feedMessage(has_msg, tow, verbose=self.verbose):
+      decoded = (storage.lastMessage, storage.lastMessage_tow)
+    log = self.log.getvalue()[start:] if self.log.tell() > start else ""
+    outcome = (hdr[3], messageState(storage.HASobjects[hdr[3]]), storage.lastMID, decoded, log,
+               storage.timeouts, storage.duplicates)
+    self.pages += [(self.trace.count, 1, has_msg, tow, epoch, outcome)]
+    return decoded is not None
+
+class SBF_Shard_Reader(Shard_Reading, SBF_Reader):
+  def state(self):
+    return self.pos
+
+  def restore(self, state):
+    self.pos = state
+
+  def readCNAV(self, header, start, *args):
+    self.cnavEvents += [self.trace.count]
+    return SBF_Reader.readCNAV(self, header, start, *args)
+
+class Binex_Shard_Reader(Shard_Reading, Binex_Reader):
+  def state(self):
+    return (self.nextPos, self.pos)
+
+  def restore(self, state):
+    self.nextPos, self.pos = state
+
+  def feedPage(self, *args):
+    self.cnavEvents += [self.trace.count]
+    return Shard_Reading.feedPage(self, *args)
+
+def readShard(job):
+  #Worker: walks a file from the search state until the search reaches the offset end (None: the
+  #end of the file) or one of the states stops, decoding the pages from an empty HAS storage. Returns
+  #the recorded events, the counts, the final search and storage states, eof if the file ended and
+  #the stop state reached, if any.
+  modeIn, path, state, end, pppWiz, verbose = job[:6]
+  stops = job[6] if len(job) > 6 else None
+  reader = SBF_Shard_Reader(path) if modeIn == 1 else Binex_Shard_Reader(path)
+  reader.startShard(state, end, pppWiz, verbose, stops)
+  joined = None
+  with contextlib.redirect_stdout(reader.log):
+    try:
+      j = reader.read()[0]
+      final = reader.state()
+    except Walk_Joined as e:
+      j = reader.trace.count
+      final = joined = e.args[0]
+  reader.close()
+  storage = reader.has_storage
+  return {"states":reader.trace.states, "rejected":reader.trace.rejected, "j":j,
+          "cnavBlocks":reader.cnavEvents, "events":sorted(reader.raw+reader.pages, key=lambda e: e[:2]),
+          "rejectedBlocks":getattr(reader, "rejectedBlocks", 0) or 0, "state":final,
+          "eof":joined is None and (end is None or (final if modeIn == 1 else final[0]) < end), "joined":joined,
+          "storage":storageState(storage), "timeouts":storage.timeouts, "duplicates":storage.duplicates}
+
+def convertShard(job):
+  #Worker: converts consecutive decoded HAS messages, starting from an empty mask and IOD state. Known
+  #masks and IOD sets are those set by the messages converted here, they are the same in the serial
+  #run. A message reading another one is left out (None) and may change both of its entries, which
+  #are then no longer known. For these messages, the known entries read are returned with their IDs.
+  #Returns the converted messages, the output printed for each, the messages left out, the known
+  #entries at the end and the totals counted by the converter.
+  messages, converter, compact, HRclk, lowerUDI, verbose = job
+  SSR_HAS.HAS_MASKS[:] = None
+  SSR_HAS.HAS_IODs[:] = None
+  masks, iods = set(), set()
+  totals = (converter.converted, converter.discarded, converter.messagesOut, converter.bytesOut)
+  log = io.StringIO()
+  converted, logs, left = [], [], {}
+  with contextlib.redirect_stdout(log):
+    for k, (msg, tow) in enumerate(messages):
+      header = Header(msg)
+      content = header.msgContent
+      maskID, iodID = header.maskID, header.IODsetID
+      if not (content["mask"] or maskID in masks) or not (content["orb"] or SSR_HAS.HAS_IODs[iodID] is not None):
+        #A set IOD set stays set, the known ones also hold the values of the serial run
+        left[k] = (maskID, copy.deepcopy(SSR_HAS.HAS_MASKS[maskID]) if maskID in masks else None,
+                   iodID, SSR_HAS.HAS_IODs[iodID] if iodID in iods else None)
+        masks.discard(maskID)
+        iods.discard(iodID)
+        converted += [None]
+        logs += [""]
+        continue
+      start = log.tell()
+      converted += [converter.convertMessage(msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)]
+      logs += [log.getvalue()[start:] if log.tell() > start else ""]
+      if content["mask"] and SSR_HAS.HAS_MASKS[maskID] is converter.ssr.masks:
+        masks.add(maskID)
+      if content["orb"] and converter.ssr.IODs is not None and SSR_HAS.HAS_IODs[iodID] is converter.ssr.IODs:
+        iods.add(iodID)
+  totals = (converter.converted-totals[0], converter.discarded-totals[1],
+            converter.messagesOut-totals[2], converter.bytesOut-totals[3])
+  return {"converted":converted, "logs":logs, "left":left, "masks":{m: SSR_HAS.HAS_MASKS[m] for m in masks},
+          "iods":{i: SSR_HAS.HAS_IODs[i] for i in iods}, "totals":totals}
+
+class Sharded_Reader:
+  path = None
+  modeIn = None
+  shards = None
+  start = None
+  has_storage = None
+  rejectedBlocks = None
+  def __init__(self, path, modeIn=1, shards=None, skip=0, skipBytes=0):
+    #modeIn: 1 for SBF, 2 for BINEX files. shards: number of shards and worker processes.
+    self.path = path
+    self.modeIn = int(modeIn)
+    self.shards = shards if shards != None else (os.cpu_count() or 1)
+    file = Mapped_File(path)
+    self.start = file.offset(skip, skipBytes)
+    file.close()
+    self.has_storage = HAS_Storage()
+    self.msgnum = 0
+    self.pppWiz = False
+    self.rejectedBlocks = 0
+
+  def read(self, path=None, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    if mode != 'm':
+      raise Exception("File Reading does only support message-number constraints")
+    if x != None: self.msgnum = x
+    if self.msgnum != 0:
+      raise Exception("Sharded reading does only support reading whole files")
+    if path != None:
+      self.path = path
+      self.start = 0
+    if converter is not None and converter.pppWiz:
+      self.pppWiz = True
+    size = os.path.getsize(self.path)
+    #The last shard is read to the end of the file
+    edges = [self.start + (size-self.start)*k//self.shards for k in range(self.shards)] + [None]
+    initial = lambda offset: offset if self.modeIn == 1 else (offset, offset)
+
+    storage = self.has_storage
+    with ProcessPoolExecutor(max_workers=self.shards, mp_context=processContext()) as pool:
+      futures = [pool.submit(readShard, (self.modeIn, self.path, initial(edges[k]), edges[k+1], self.pppWiz, verbose))
+                 for k in range(self.shards)]
+      plan, messages = [], []
+      j = cnavs = rejected = 0
+      state = None
+      eof = False
+      for k, future in enumerate(futures):
+        res = future.result()
+        n = 0
+        if state is not None and state not in res["states"]:
+          #The serial walk enters this shard at state, the shard's walk started at its edge. The
+          #blocks from state are read here until the walk reaches a state of the shard's walk.
+          bridge = readShard((self.modeIn, self.path, state, edges[k+1], self.pppWiz, verbose, set(res["states"])))
+          if bridge["joined"] is None and verbose >= 2:
+            print("Shard " + str(k) + " is re-read from the end of the previous one.")
+          counts = self.stitch(bridge, 0, plan, messages, verbose)
+          j, cnavs, rejected = j+counts[0], cnavs+counts[1], rejected+counts[2]
+          if bridge["joined"] is None:
+            res = None
+          else:
+            state = bridge["joined"]
+        if res is not None:
+          #The serial walk enters this shard at state: continue from the shard's block read there
+          if state is not None:
+            n = res["states"].index(state)
+          counts = self.stitch(res, n, plan, messages, verbose)
+          j, cnavs, rejected = j+counts[0], cnavs+counts[1], rejected+counts[2]
+        else:
+          res = bridge
+        state = res["state"]
+        if res["eof"]:
+          eof = True
+          break
+
+      converted = []
+      if converter != None and len(messages) > 0:
+        #The messages left out by a group are converted here in order, from the state of the serial
+        #run with the known entries of the group. The final state of a group is its known entries
+        #over the state here.
+        groups = [len(messages)*g//self.shards for g in range(self.shards)] + [len(messages)]
+        futures = [pool.submit(convertShard, (messages[groups[g]:groups[g+1]], converter, compact, HRclk, lowerUDI, verbose))
+                   for g in range(self.shards)]
+        for g, future in enumerate(futures):
+          res = future.result()
+          for k, out in enumerate(res["converted"]):
+            if k in res["left"]:
+              maskID, mask, iodID, iods = res["left"][k]
+              if mask is not None:
+                SSR_HAS.HAS_MASKS[maskID] = mask
+              if iods is not None:
+                SSR_HAS.HAS_IODs[iodID] = iods
+              msg, tow = messages[groups[g]+k]
+              out = converter.convertMessage(msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
+            else:
+              print(res["logs"][k], end="")
+            converted += [out]
+          for maskID, mask in res["masks"].items():
+            SSR_HAS.HAS_MASKS[maskID] = mask
+          for iodID, iods in res["iods"].items():
+            SSR_HAS.HAS_IODs[iodID] = iods
+          converter.converted += res["totals"][0]
+          converter.discarded += res["totals"][1]
+          converter.messagesOut += res["totals"][2]
+          converter.bytesOut += res["totals"][3]
+
+    if output != None:
+      for item in plan:
+        if len(item) == 3:
+          output.write(*item)
+        elif converter != None and converted[item[0]] != None:
+          for msg_bytes in converted[item[0]]:
+            if self.pppWiz:
+              output.write(msg_bytes, 2, 1, item[1])
+            else:
+              output.write(msg_bytes)
+    self.rejectedBlocks += rejected
+    hasnum = len(messages)
+    if eof and verbose >= 1:
+      print("EOF REACHED: Ending operation")
+    if verbose>=1:
+      if self.rejectedBlocks > 0:
+        print(str(self.rejectedBlocks)+" SBF blocks were rejected due to a CRC error.")
+      print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
+            +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
+
+  def stitch(self, res, n, plan, messages, verbose=0):
+    #Appends the events of a shard walk after its block n to plan and the HAS messages decoded to
+    #messages. The worker's storage started empty: its pages are fed to this storage as well until
+    #both are in the same state (by the state of the message of every ID and the last message ID
+    #after the page last fed to the worker's), then the worker's decodings are used and its storage
+    #state is taken over at the end. Returns the counts of blocks, C/Nav blocks and rejected blocks.
+    storage = self.has_storage
+    workerStates = {}
+    workerLast = -1
+    workerTotals = (0, 0)
+    differ = None
+    taken = None
+    for event in res["events"]:
+      if event[1] == 0:
+        if event[0] > n:
+          plan += [event[2:]]
+        continue
+      mID, messageAfter, lastMID, decoded, log, timeouts, duplicates = event[5]
+      if event[0] > n and taken is None:
+        if differ is None:
+          differ = set(m for m in range(32) if messageState(storage.HASobjects[m]) != workerStates.get(m))
+        if len(differ) == 0 and storage.lastMID == workerLast:
+          taken = workerTotals
+      if event[0] <= n:
+        pass
+      elif taken is not None:
+        print(log, end="")
+        storage.pages[mID] += 1
+        if decoded is not None:
+          storage.messages += 1
+          storage.lastMessage, storage.lastMessage_tow = decoded
+          messages += [decoded]
+          plan += [(len(messages)-1, event[4])]
+      else:
+        if storage.feedMessage(event[2], event[3], verbose=verbose):
+          messages += [(storage.lastMessage, storage.lastMessage_tow)]
+          plan += [(len(messages)-1, event[4])]
+        if messageState(storage.HASobjects[mID]) == messageAfter:
+          differ.discard(mID)
+        else:
+          differ.add(mID)
+      workerStates[mID] = messageAfter
+      workerLast = lastMID
+      workerTotals = (timeouts, duplicates)
+    if taken is not None:
+      restoreStorage(storage, res["storage"])
+      storage.timeouts += res["timeouts"] - taken[0]
+      storage.duplicates += res["duplicates"] - taken[1]
+    return (res["j"] - n, sum(1 for c in res["cnavBlocks"] if c > n),
+            res["rejectedBlocks"] - (res["rejected"][n] if n < len(res["rejected"]) else 0))
+
+  def close(self):
+    pass
@@ -9,7 +9,7 @@ VER   DATE        AUTHOR
 1.0.2 31/05/2023  Martti Kirkko-Jaakkola / FGI
 '''
 
-from galileo_has_decoder.utils import sign, bidict, findNth
+from galileo_has_decoder.utils import bidict, BitReader
 import numpy as np
 
 class HAS_Error(Exception):
@@ -17,100 +17,132 @@ class HAS_Error(Exception):
   pass 
   
 
+#Status bits of the clock and bias corrections, 0 if the correction is available
+NA = 1  #Not available
+DNU = 2 #Do not use
+
+#Per-system arrays of the corrections: clocks (satellites of the mask or subset), biases (satellites
+#x signals of the mask)
+CLOCK_DTYPE = np.dtype([("deltaClock", np.float64), ("status", np.uint8)])
+BIAS_DTYPE = np.dtype([("bias", np.float64), ("discont", np.uint8), ("status", np.uint8)])
+
 class Header:
-  toh = maskID = IODsetID = None
-  msgContent = None
+  __slots__ = ("toh", "maskID", "IODsetID", "msgContent", "reserved")
   def __init__(self, msg, i=0):
-    #Header Message length should be 24
-    self.toh, i = int(msg[i:i+12],2), i+12
-    self.msgContent, i = self.readContent(msg[i:i+6]), i+6
-    self.reserved, i = msg[i:i+4], i+4
-    self.maskID, i = int(msg[i:i+5],2), i+5
-    self.IODsetID, i = int(msg[i:i+5],2), i+5
-
-  def readContent(self, msg):
+    #Header Message length should be 32
+    if not isinstance(msg, BitReader):
+      msg = BitReader(msg)
+    msg.seek(i)
+    self.toh = msg.read_uint(12)
+    self.msgContent = self.readContent(msg.read_flags(6))
+    self.reserved = msg.read_uint(4)
+    self.maskID = msg.read_uint(5)
+    self.IODsetID = msg.read_uint(5)
+
+  def readContent(self, flags):
     content = {}
-    content["mask"]      = msg[0]=="1"
-    content["orb"]       = msg[1]=="1"
-    content["clockFull"] = msg[2]=="1"
-    content["clockSub"]  = msg[3]=="1"
-    content["codeB"]     = msg[4]=="1"
-    content["phaseB"]    = msg[5]=="1"
+    content["mask"]      = flags[0]
+    content["orb"]       = flags[1]
+    content["clockFull"] = flags[2]
+    content["clockSub"]  = flags[3]
+    content["codeB"]     = flags[4]
+    content["phaseB"]    = flags[5]
     return content
 
+def flagString(flags):
+  return "".join("1" if f else "0" for f in flags)
+
+def clockCorrections(raw, mult):
+  #CLOCK_DTYPE array of the raw 13bit clock corrections of a system
+  raw = np.asarray(raw, dtype=np.int64)
+  clocks = np.zeros(len(raw), dtype=CLOCK_DTYPE)
+  clocks["status"] = (raw == -4096)*NA | (raw == 4095)*DNU
+  clocks["deltaClock"] = np.where(clocks["status"] == 0, raw, 0)*0.0025*mult
+  return clocks
+
 class Mask:
-  id = None #4bit
-  satMask = None #40bit
-  sigMask = None #16bit
-  dnuMask = None
-  cellMaskFlag = None #1bit flag, 0=all sigs for all sats
-  cellMask = None #n_sat*n_sig bit mask
-  navMsg = None #3bit
-  nsat = None
-  totalSignals = None
+  __slots__ = ("id", "satMask", "sigMask", "dnuMask", "cellMaskFlag", "cellMask", "navMsg", "nsat",
+               "sats", "sigs", "totalSignals")
   def __init__(self):
-    self.dnuMask = 40*"0"
-    pass
+    self.id = None #4bit
+    self.satMask = None #40 flags
+    self.sigMask = None #16 flags
+    self.dnuMask = 0 #Bit n-1 set: satellite n do-not-use
+    self.cellMaskFlag = None #1bit flag, 0=all sigs for all sats
+    self.cellMask = None #n_sat x n_sig flags
+    self.navMsg = None #3bit
+    self.nsat = None
+    self.sats = None #PRNs of the masked satellites
+    self.sigs = None #IDs of the masked signals
+    self.totalSignals = None
+
   def readData(self, msg, i):
-    self.id, i = int(msg[i:i+4], 2), i+4
-    self.satMask, i = msg[i:i+40], i+40
-    self.sigMask, i = msg[i:i+16], i+16
-    self.cellMaskFlag, i = msg[i]=="1", i+1
-    satnum, signum = self.satMask.count("1"), self.sigMask.count("1")
+    msg.seek(i)
+    self.id = msg.read_uint(4)
+    self.satMask = msg.read_flags(40)
+    self.sigMask = msg.read_flags(16)
+    self.cellMaskFlag = msg.read_uint(1) == 1
+    self.sats = [j+1 for j, f in enumerate(self.satMask) if f]
+    self.sigs = [j for j, f in enumerate(self.sigMask) if f]
+    satnum, signum = len(self.sats), len(self.sigs)
     self.nsat = satnum
-    cellMaskSize = satnum*signum*self.cellMaskFlag
     if self.cellMaskFlag: 
-      self.cellMask, i = msg[i:i+cellMaskSize], i+cellMaskSize
+      self.cellMask = np.array(msg.read_flags(satnum*signum), dtype=bool).reshape(satnum, signum)
 
-    self.navMsg, i = int(msg[i:i+3], 2), i+3
-    return i
+    self.navMsg = msg.read_uint(3)
+    return msg.tell()
 
   def setDNU(self, n, dnu=True):
-    satID = self.satID(n)-1
-    self.dnuMask = self.dnuMask[:satID] + str(dnu*1) + self.dnuMask[satID+1:]
+    bit = 1 << (self.satID(n)-1)
+    self.dnuMask = self.dnuMask | bit if dnu else self.dnuMask & ~bit
 
   def getDNU(self, n):
-    satID = self.satID(n)-1
-    return self.dnuMask[satID]=="1"
+    return (self.dnuMask >> (self.satID(n)-1)) & 1 == 1
+
+  def dnuFlags(self):
+    #Do-not-use flags of all satellites in the mask
+    return (self.dnuMask >> (np.array(self.sats, dtype=np.int64)-1)) & 1 == 1
 
   def satID(self, n):
-    return [j for j, ltr in enumerate(self.satMask) if ltr == "1"][n]+1
+    return self.sats[n]
 
   def sigID(self, n):
-    return [j for j, ltr in enumerate(self.sigMask) if ltr == "1"][n]
+    return self.sigs[n]
 
   def printData(self):
     print("  HAS Mask Data:")
     print("  System:", self.id)
-    print("    Satellite Mask:", self.satMask)
+    print("    Satellite Mask:", flagString(self.satMask))
     print("    ", self.nsat,"satellites corrected.")
-    print("    Signal Mask:", self.sigMask)
+    print("    Signal Mask:", flagString(self.sigMask))
     if self.cellMaskFlag:
-      print("    Cell Mask available, subset:", self.cellMask[:20])
+      print("    Cell Mask available, subset:", flagString(self.cellMask.ravel()[:20]))
     else:
       print("    Cell mask unavailable, all signals for all satellites included.")
-    print("    DNU mask:", self.dnuMask)
+    print("    DNU mask:", flagString((self.dnuMask >> j) & 1 for j in range(40)))
 
 class Masks:
-  nSys = None
-  gnss = None
-  keys = None
+  __slots__ = ("nSys", "gnss", "keys")
   def __init__(self):
-    self.gnss = np.array([], dtype=object)
+    self.nSys = None
+    self.gnss = []
+    self.keys = None
+
   def readData(self, msg, i):
-    self.nSys, i = int(msg[i:i+4], 2), i+4
+    msg.seek(i)
+    self.nSys = msg.read_uint(4)
     for _j in range(self.nSys):
       mask = Mask()
-      i = mask.readData(msg, i)
-      self.gnss = np.append(self.gnss, mask)
-    _reserved, i = msg[i:i+6], i+6
+      mask.readData(msg, msg.tell())
+      self.gnss += [mask]
+    msg.skip(6) #reserved
     self.keys = [m.id for m in self.gnss]
-    return i
+    return msg.tell()
   
   def satNums(self):
     systems = {}
     for sys in self.gnss:
-      systems[sys.id] = sys.satMask.count("1")
+      systems[sys.id] = sys.nsat
     nums = np.zeros(max(systems.keys())+1, dtype=int)
     for j in range(max(systems.keys())+1):
       try:
@@ -136,229 +168,200 @@ class Masks:
     for s in self.gnss:
       s.printData()
 
-class SatOrbit:
-  iod = None
-  deltaRad = None          # in the HAS sign convention
-  deltaInTrack = None
-  deltaCrossTrack = None
-  NAcount = None
-  system = None
-  iodS = None #IOD size, 10bits for Galileo, 8 bits for GPS
-  def __init__(self, _system):
-    self.NAcount = 0
-    self.system = _system
-    if _system==2: self.iodS = 10
-    elif _system==0: self.iodS = 8
-    else: raise HAS_Error("Unknown System encountered: " + str(_system))
-
-  def readData(self, msg, i):
-    self.iod, i = int(msg[i:i+self.iodS], 2), i+self.iodS
-    dRad, i = msg[i:i+13], i+13
-    if dRad == "1000000000000":
-      self.deltaRad="N/A"
-      self.NAcount += 1
-    else:
-      self.deltaRad = sign(dRad)*0.0025
-
-    dIn, i = msg[i:i+12], i+12
-    if dIn == "100000000000" : 
-      self.deltaInTrack="N/A"
-      self.NAcount += 1
-    else:
-      self.deltaInTrack = sign(dIn)*0.008 
-    
-    dCross, i = msg[i:i+12], i+12
-    if dCross == "100000000000" : 
-      self.deltaCrossTrack="N/A"
-      self.NAcount += 1
-    else:
-      self.deltaCrossTrack = sign(dCross)*0.008
-    return i
-
-  def printData(self):
-    print("   ", self.system, "IOD:",self.iod, "# Rad", self.deltaRad, "# InT", 
-    self.deltaInTrack, "# CrossT", self.deltaCrossTrack)
-
 class Orbits:
-  satNum = None
-  orbits = None
-  validityIdx = None
-  IODs = None
+  #orbits: per system ID, an array of DTYPE with the corrections of the satellites in the mask.
+  #status: bits of the components not available (RAD_NA, INTRACK_NA, CROSSTRACK_NA)
+  DTYPE = np.dtype([("iod", np.uint16), ("deltaRad", np.float64), ("deltaInTrack", np.float64),
+                    ("deltaCrossTrack", np.float64), ("status", np.uint8)])
+  RAD_NA = 1
+  INTRACK_NA = 2
+  CROSSTRACK_NA = 4
+  IOD_SIZES = {0: 8, 2: 10} #IOD size, 10bits for Galileo, 8 bits for GPS
+  __slots__ = ("satNum", "orbits", "validityIdx", "IODs")
   def __init__(self, _satNum):
     self.orbits = []
     self.IODs = []
     self.satNum = _satNum
+    self.validityIdx = None
 
   def readData(self, msg, i):
-    self.validityIdx, i = int(msg[i:i+4], 2), i+4
+    msg.seek(i)
+    self.validityIdx = msg.read_uint(4)
     for sys in range(len(self.satNum)):
-      self.orbits += [[]]
-      self.IODs += [[]]
-      for _sat in range(self.satNum[sys]):
-        orb = SatOrbit(sys)
-        i = orb.readData(msg, i)
-        self.orbits[sys] += [orb]
-        self.IODs[sys] += [orb.iod]
-    return i
+      satnum = self.satNum[sys]
+      if satnum > 0 and sys not in self.IOD_SIZES:
+        raise HAS_Error("Unknown System encountered: " + str(sys))
+      raw = []
+      for _sat in range(satnum):
+        raw += [msg.read_uint(self.IOD_SIZES[sys]), msg.read_int(13), msg.read_int(12), msg.read_int(12)]
+      raw = np.array(raw, dtype=np.int64).reshape(satnum, 4)
+      orbs = np.zeros(satnum, dtype=self.DTYPE)
+      orbs["iod"] = raw[:, 0]
+      orbs["status"] = (raw[:, 1] == -4096)*self.RAD_NA | (raw[:, 2] == -2048)*self.INTRACK_NA | (raw[:, 3] == -2048)*self.CROSSTRACK_NA
+      orbs["deltaRad"] = np.where(orbs["status"] & self.RAD_NA, 0, raw[:, 1])*0.0025
+      orbs["deltaInTrack"] = np.where(orbs["status"] & self.INTRACK_NA, 0, raw[:, 2])*0.008
+      orbs["deltaCrossTrack"] = np.where(orbs["status"] & self.CROSSTRACK_NA, 0, raw[:, 3])*0.008
+      self.orbits += [orbs]
+      self.IODs += [orbs["iod"].copy()]
+    return msg.tell()
 
   def printData(self):
     print("  HAS Orbit Data:")
-    for sys in self.orbits:
-      for sat in sys:
-        sat.printData()
+    for sys in range(len(self.orbits)):
+      for orb in self.orbits[sys]:
+        print("   ", sys, "IOD:", orb["iod"],
+              "# Rad", "N/A" if orb["status"] & self.RAD_NA else orb["deltaRad"],
+              "# InT", "N/A" if orb["status"] & self.INTRACK_NA else orb["deltaInTrack"],
+              "# CrossT", "N/A" if orb["status"] & self.CROSSTRACK_NA else orb["deltaCrossTrack"])
+
+def printClocks(clocks):
+  for clock in clocks:
+    if clock["status"] & DNU:
+      print("   ", "DNU")
+    elif clock["status"] & NA:
+      print("   ", "N/A")
+    else:
+      print("   ", clock["deltaClock"])
 
 class ClockFull:
-  validityIdx = None
-  mults = None
-  corrections = None
-  satNums = None
-  dnu = None
+  #corrections: per system ID, an array of CLOCK_DTYPE of the satellites in the mask
+  __slots__ = ("validityIdx", "mults", "corrections", "satNums", "masks")
   def __init__(self, satNum, masks):
     self.satNums = satNum
     self.mults = {}
     self.corrections = []
     self.masks = masks
+    self.validityIdx = None
   
   def readData(self, msg, i,):
-    self.validityIdx, i = int(msg[i:i+4], 2), i+4
+    msg.seek(i)
+    self.validityIdx = msg.read_uint(4)
     for j in range(len(self.satNums)):
       if self.satNums[j]>0:
-        mult, i = int(msg[i:i+2], 2)+1, i+2
+        mult = msg.read_uint(2)+1
         self.mults[j] = mult
     for j in range(len(self.satNums)):
-      self.corrections += [[]]
+      raw = []
       for y in range(self.satNums[j]):
-        deltaClock, i = sign(msg[i:i+13])*0.0025*self.mults[j], i+13
-        if deltaClock == sign("1000000000000")*0.0025*self.mults[j]:
-          deltaClock = "N/A"
-        elif deltaClock == sign("0111111111111")*0.0025*self.mults[j]:
-          deltaClock = "DNU"
-          if self.masks!=None:
-            self.masks.gnss[self.masks.keys.index(j)].setDNU(y)
-        self.corrections[j] += [deltaClock]
-    return i
+        raw += [msg.read_int(13)]
+        if raw[-1] == 4095 and self.masks!=None:
+          self.masks.gnss[self.masks.keys.index(j)].setDNU(y)
+      self.corrections += [clockCorrections(raw, self.mults.get(j, 1))]
+    return msg.tell()
 
   def printData(self):
     print("  HAS Clock Data (Full):")
     for sys in self.corrections:
-      for sat in sys:
-        print("   ", sat)
+      printClocks(sys)
 
 
 class ClockSub:
-  validityIdx = None
-  mults = None
-  corrections = None
-  satNums = None
-  satNumsSub = None
-  subMasks = None
-  nSys = None
-  satIDs = None
+  #corrections: per system ID, an array of CLOCK_DTYPE of the satellites in the subset, satIDs: their PRNs
+  __slots__ = ("validityIdx", "mults", "corrections", "satNums", "satNumsSub", "subMasks", "nSys",
+               "satIDs", "masks")
 
   def __init__(self, satNums, masks):
     self.satNums = satNums
     self.satNumsSub = satNums * 0
     self.mults = {}
-    self.corrections = [[]]*len(satNums)
+    self.corrections = [np.zeros(0, dtype=CLOCK_DTYPE)]*len(satNums)
     self.subMasks = {}
     self.satIDs = {}
     self.masks = masks
+    self.validityIdx = None
+    self.nSys = None
 
   def readData(self, msg, i):
-    self.validityIdx, i = int(msg[i:i+4], 2), i+4
-    self.nSys, i = int(msg[i:i+4], 2), i+4
+    msg.seek(i)
+    self.validityIdx = msg.read_uint(4)
+    self.nSys = msg.read_uint(4)
     for _j in range(self.nSys):
-      sysID, i = int(msg[i:i+4], 2), i+4
-      mult, i = int(msg[i:i+2], 2)+1, i+2
+      sysID = msg.read_uint(4)
+      mult = msg.read_uint(2)+1
       self.mults[sysID] = mult
-      self.subMasks[sysID], i = msg[i:i+self.satNums[sysID]], i+self.satNums[sysID]
-      self.satNumsSub[sysID] = self.subMasks[sysID].count("1")
+      self.subMasks[sysID] = np.array(msg.read_flags(self.satNums[sysID]), dtype=bool)
+      self.satNumsSub[sysID] = np.count_nonzero(self.subMasks[sysID])
+      sats = np.flatnonzero(self.subMasks[sysID])
+      raw = []
       for y in range(self.satNumsSub[sysID]):
-        deltaClock, i = sign(msg[i:i+13])*0.0025*mult, i+13
-        if deltaClock == sign("1000000000000")*0.0025*mult:
-          deltaClock = "N/A"
-        elif deltaClock == sign("0111111111111")*0.0025*mult:
-          deltaClock = "DNU"
-          prn = ([j for j, ltr in enumerate(self.subMasks[sysID]) if ltr == "1"][y])
-          self.masks.gnss[self.masks.keys.index(sysID)].setDNU(prn)
+        raw += [msg.read_int(13)]
+        if raw[-1] == 4095:
+          self.masks.gnss[self.masks.keys.index(sysID)].setDNU(sats[y])
           #ToDo: Remove do-not-use sats from ssr
-        self.corrections[sysID] = self.corrections[sysID] + [deltaClock]
-    return i
+      self.corrections[sysID] = np.concatenate((self.corrections[sysID], clockCorrections(raw, mult)))
+    return msg.tell()
   
   def storeIDs(self, mask):
     for j in range(len(self.satNumsSub)):
       if self.satNumsSub[j] > 0:
-        self.satIDs[j] = []
-        for y in range(self.satNums[j]):
-          if self.subMasks[j][y] == "1":
-            self.satIDs[j] = self.satIDs[j] + [mask.getSatNum(j, y)]
+        self.satIDs[j] = np.array([mask.getSatNum(j, y) for y in np.flatnonzero(self.subMasks[j])], dtype=np.uint8)
 
   def printData(self):
     print("  HAS Clock Data (Sub):")
     for i in range(len(self.satNumsSub)):
       if len(self.corrections[i]) > 0:
         print("    System:", i)
-        for sat in self.corrections[i]:
-          print(sat)
+        printClocks(self.corrections[i])
 
 class GNSSBiases:
-  biases = None
-  cMask = None
-  mask = None
-  mode = None
+  #biases: array of BIAS_DTYPE, a row per satellite (PRNs in sats) and a column per signal (IDs in
+  #sigs) of the mask. The cells not in the cell mask (cMask) have the status NA.
+  __slots__ = ("biases", "cMask", "mask", "mode", "signum", "sats", "sigs")
+  SCALES = {'c': 0.02, 'p': 0.01}
   def __init__(self, _mode, _mask,):
-    self.biases = {}
     self.mode = _mode #can be 'c' for code biases or 'p' for phase biases
-    satnum, self.signum = _mask.satMask.count("1"), _mask.sigMask.count("1")
+    satnum, self.signum = _mask.nsat, len(_mask.sigs)
     self.mask = _mask
+    self.sats = np.array(_mask.sats, dtype=np.uint8)
+    self.sigs = np.array(_mask.sigs, dtype=np.uint8)
     if _mask.cellMaskFlag:
       self.cMask = _mask.cellMask #Cell mask
     else:
-      self.cMask = (satnum * self.signum) * "1"
-    for sat in range(satnum):
-      sigs = self.cMask[sat*self.signum:(sat+1)*self.signum].count("1") 
-      self.biases[_mask.satID(sat)] = {"num":sigs}
+      self.cMask = np.ones((satnum, self.signum), dtype=bool)
+    self.biases = np.zeros((satnum, self.signum), dtype=BIAS_DTYPE)
+    self.biases["status"] = NA
 
   def readData(self, msg, i):
-    xC = 0
-    for sat in self.biases:
-      for sig in range(self.biases[sat]["num"]):
-        if self.mode == 'c':
-          bias, i = sign(msg[i:i+11])*0.02, i+11
-          correctedSig = findNth(self.cMask[xC*self.signum:(xC+1)*self.signum], "1", sig)
-          if bias == -20.48:
-            bias = "N/A"
-          self.biases[sat][self.mask.sigID(correctedSig)] = bias
-        elif self.mode == 'p':
-          bias, i = sign(msg[i:i+11])*0.01, i+11
-          if bias == -10.24:
-            bias = "N/A"
-          discont, i = int(msg[i:i+2],2), i+2
-          correctedSig = findNth(self.cMask[xC*self.signum:(xC+1)*self.signum], "1", sig)
-          self.biases[sat][self.mask.sigID(correctedSig)] = [bias, discont]
-      xC += 1
-    return i
+    msg.seek(i)
+    if self.mode not in self.SCALES:
+      return msg.tell()
+    raw = []
+    disconts = []
+    for _cell in range(np.count_nonzero(self.cMask)):
+      raw += [msg.read_int(11)]
+      if self.mode == 'p':
+        disconts += [msg.read_uint(2)]
+    raw = np.array(raw, dtype=np.int64)
+    #Cells in the order of the message: satellite by satellite, signals in the order of the mask
+    self.biases["status"][self.cMask] = (raw == -1024)*NA
+    self.biases["bias"][self.cMask] = np.where(raw == -1024, 0, raw)*self.SCALES[self.mode]
+    if self.mode == 'p':
+      self.biases["discont"][self.cMask] = disconts
+    return msg.tell()
 
   def printData(self):
-    for sat in self.biases.keys():
-      print("      Sat", sat, "-", self.biases[sat])
+    for sat in range(len(self.sats)):
+      biases = {}
+      for sig in np.flatnonzero(self.cMask[sat]):
+        bias, discont, status = self.biases[sat, sig].tolist()
+        bias = "N/A" if status & NA else bias
+        biases[int(self.sigs[sig])] = [bias, discont] if self.mode == 'p' else bias
+      print("      Sat", int(self.sats[sat]), "-", biases)
 
 class Biases:
-  nSys = None
-  mode = None
-  biases = None
-  biases_dict = None
-  validityIdx = None
+  __slots__ = ("nSys", "mode", "biases_dict", "validityIdx")
   def __init__(self, _masks, _mode):
     self.nSys = _masks.nSys
-    self.biases = np.array([], dtype=object)
     self.biases_dict = {}
     self.mode = _mode
+    self.validityIdx = None
     for mask in _masks.gnss:
       self.biases_dict[mask.id] = GNSSBiases(_mode, mask)
   
   def readData(self, msg, i):
-    self.validityIdx, i = int(msg[i:i+4], 2), i+4
+    msg.seek(i)
+    self.validityIdx = msg.read_uint(4)
+    i = msg.tell()
     for b in self.biases_dict.keys():
       i = self.biases_dict[b].readData(msg, i)
     return i
@@ -371,18 +374,12 @@ class Biases:
       self.biases_dict[sys].printData()
 
 class SSR:
-  IODs = None
-  read = None
-  header = None
-  masks = None
-  orbits = None
-  clockFull = None
-  clockSub = None
-  codeBiases = None
-  phaseBiases = None
+  __slots__ = ("IODs", "read", "header", "masks", "orbits", "clockFull", "clockSub", "codeBiases",
+               "phaseBiases")
   sysKeys = bidict({"GPS": 0, "GAL": 2})
   def __init__(self):
-    pass
+    self.IODs = self.read = self.header = self.masks = self.orbits = None
+    self.clockFull = self.clockSub = self.codeBiases = self.phaseBiases = None
 
   def printData(self):
     print("######################################\n     HAS Printouts. ToH:", self.header.toh)
@@ -402,8 +399,7 @@ class SSR:
 
 
 class SSR_HAS:
-  ssr = None
-  valid = None
+  __slots__ = ("ssr", "valid")
   HAS_MASKS = np.empty(32, dtype=object)
   HAS_IODs = np.empty(32, dtype=object)
   def __init__(self, msg, ssr=None, verb=0):
@@ -415,6 +411,8 @@ class SSR_HAS:
     self.ssr.read = {0:self.rdMasks, 1:self.rdOrbits, 
             2:self.rdClockFull, 3:self.rdClockSub, 
             4:self.rdCodeBias, 5:self.rdPhaseBias}
+    if not isinstance(msg, BitReader):
+      msg = BitReader(msg)
     self.ssr.header = Header(msg)
     i = 32
     blocks = list(zip(self.ssr.header.msgContent.values(), range(6)))        
@@ -25,6 +25,11 @@ class SSR_Converter:
   content = None
   pppWiz = None
   verbose = None
+  #Running totals: HAS messages converted, discarded (mask or IOD set unavailable), SSR messages and bytes output
+  converted = 0
+  discarded = 0
+  messagesOut = 0
+  bytesOut = 0
   def __init__(self, mode=None, compact=None, pppWiz=False, verbose=0):
     self.verbose = 0
     if mode != None:
@@ -37,7 +42,7 @@ class SSR_Converter:
     pass
 
   def feedMessage(self, msg):
-    #Input msg: Bitstring of decoded HAS message
+    #Input msg: bytes of the decoded HAS message (or a BitReader over them)
     self.ssr = SSR()
     self.ssr_has = SSR_HAS(msg, self.ssr, self.verbose)
     self.content = list(self.ssr.header.msgContent.values())
@@ -48,7 +53,14 @@ class SSR_Converter:
 
   def convertMessage(self, msg, mode=None, compact=True, HRclk=False, tow=None, lowerUDI=True, verbose=None):
     self.feedMessage(msg)
-    return self.convert(mode, compact=compact, HRclk=HRclk, tow=tow, verbose=verbose)
+    res = self.convert(mode, compact=compact, HRclk=HRclk, tow=tow, verbose=verbose)
+    if self.ssr_has.valid:
+      self.converted += 1
+      self.messagesOut += len(res)
+      self.bytesOut += sum(len(m) for m in res)
+    else:
+      self.discarded += 1
+    return res
 
   def setVerbose(self, verbose):
     self.verbose = verbose
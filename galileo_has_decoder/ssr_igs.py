@@ -7,10 +7,10 @@ VER   DATE        AUTHOR
 1.0   09/12/2021  Oliver Horst / FGI
 1.0.2 31/05/2023  Martti Kirkko-Jaakkola / FGI
 '''
-import numpy as np
 from galileo_has_decoder import crc
-from galileo_has_decoder.utils import bidict, bits2Bytes
+from galileo_has_decoder.utils import bidict, BitWriter
 import math
+import numpy as np
 
 HAS_PROVIDER_ID = 270 #Placeholder
 
@@ -80,41 +80,41 @@ class SSR_IGS:
     pL = 8192-(headerL+3*8)
     pageNum = self.pages(msg, headerL)
     for i in range(pageNum):
-      i_page = msg[i*pL:(i+1)*pL]
+      i_page = msg.slice(i*pL, (i+1)*pL)
       pages += [i_page]
     return pages
 
   def IGM01(self, sys, ssr, tow, lowerUDI=True):
     # Orbit correction message is constructed without header first
-    msg = ""
+    msg = BitWriter()
     # 6bit no. of satellites
     try:
       orbs = ssr.orbits.orbits[ssr.sysKeys[sys]]
       satNo = ssr.orbits.satNum[ssr.sysKeys[sys]]
     except IndexError:
       raise CorrectionNotAvailable("HAS orbit corrections are not available!")
-    nSat = satNo
-    for sat in range(satNo):
+    mask = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])]
+    # Satellites with all orbit components available and usable
+    sats = np.flatnonzero((orbs["status"][:satNo] == 0) & ~mask.dnuFlags()[:satNo])
+    prns = np.array(mask.sats, dtype=np.int64)[sats]
+    dEph = self.translateOrbit(orbs[sats])
+    nSat = len(sats)
+    for prn, iod, (dRad, dAlong, dCross) in zip(prns.tolist(), orbs["iod"][sats].tolist(), dEph.tolist()):
       # __Sat. Specific__
-      dnu = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].getDNU(sat)
-      if orbs[sat].NAcount == 0 and not dnu: 
-        # 6bit Sat. ID
-        prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat)
-        msg += np.binary_repr(prn, 6)
-        # 8bit GNSS IOD
-        iod = orbs[sat].iod &255
-        msg+= np.binary_repr(iod, 8)
-        # 22bit Delta Orb. Radial
-        # 20bit Delta Orbit Along-Track
-        # 20bit Delta Orbit Cross-Track
-        orbitCorr = self.translateOrbit(orbs[sat])
-        msg += orbitCorr
-        # 21bit Dot Orb. Radial  <- Not possible
-        # 19bit Dot Orbit Along-Track  <- Not possible
-        # 19bit Dot Orbit Cross-Track  <- Not possible
-        msg += "0"*59
-      else:
-        nSat -= 1
+      # 6bit Sat. ID
+      msg.write_uint(prn, 6)
+      # 8bit GNSS IOD
+      msg.write_uint(iod &255, 8)
+      # 22bit Delta Orb. Radial
+      # 20bit Delta Orbit Along-Track
+      # 20bit Delta Orbit Cross-Track
+      msg.write_int(dRad, 22)
+      msg.write_int(dAlong, 20)
+      msg.write_int(dCross, 20)
+      # 21bit Dot Orb. Radial  <- Not possible
+      # 19bit Dot Orbit Along-Track  <- Not possible
+      # 19bit Dot Orbit Cross-Track  <- Not possible
+      msg.write_zeros(59)
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
     if nSat == 0:
@@ -123,44 +123,30 @@ class SSR_IGS:
     for i in range(len(pages)-1):
       # 79bit header(msgnum)
       hdr = self.const_common_header(sys, ssr, 1, tow, nSat, True, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 1, tow, nSat, False, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
   def IGM02(self, sys, ssr, tow, lowerUDI=True):
     # Clock correction message
-    msg = ""
-    sub = False
+    msg = BitWriter()
     # is constructed without header first
     # 6bit no. of satellites
-    clocks = ssr.clockFull
-    if clocks!= None: 
-      satNo = ssr.masks.satNums()[ssr.sysKeys[sys]]
-    else:
-      clocks = ssr.clockSub
-      if clocks==None:
-        raise CorrectionNotAvailable("HAS clock corrections are not available!")
-      sub = True
-      satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
-    nSat = satNo
-    for sat in range(satNo):
+    corrections, prns = self.clocks(sys, ssr)
+    sats = np.flatnonzero(corrections["status"] == 0)
+    nSat = len(sats)
+    for prn, c0 in zip(prns[sats].tolist(), self.translateClock(corrections["deltaClock"][sats], sys, prns[sats], tow).tolist()):
       # __Sat. Specific__
-      if type(clocks.corrections[ssr.sysKeys[sys]][sat])!= str:
-        # 6bit Sat. ID
-        if not sub:
-          prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat)
-        else:
-          prn = clocks.satIDs[ssr.sysKeys[sys]][sat]
-        msg += np.binary_repr(prn, 6)
-        # 22bit Delta Clock C0
-        c0 = self.translateClock(clocks.corrections[ssr.sysKeys[sys]][sat], sys, prn, tow)
-        msg += c0
-        # 21bit Delta Clock C1  <- Not available
-        # 27bit Delta Clock C2  <- Not available
-        msg += 48*"0"
-      else:
-        nSat -= 1
+      # 6bit Sat. ID
+      msg.write_uint(prn, 6)
+      # 22bit Delta Clock C0
+      msg.write_int(c0, 22)
+      # 21bit Delta Clock C1  <- Not available
+      # 27bit Delta Clock C2  <- Not available
+      msg.write_zeros(48)
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
     if nSat == 0:
@@ -169,66 +155,71 @@ class SSR_IGS:
     for i in range(len(pages)-1):
       # 78bit header(msgnum)
       hdr = self.const_common_header(sys, ssr, 2, tow, nSat, True, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 2, tow, nSat, False, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
 
   def translateClock(self, clock, sys, prn, tow):
-    c0 = round(clock / 0.0001)
-    return np.binary_repr(c0, 22)
+    # clock, prn: a single correction or an array of them
+    c0 = np.rint(clock / 0.0001).astype(np.int64)
+    return c0
+
+  def clocks(self, sys, ssr):
+    # Clock corrections (full set, else subset) of a system, and the PRNs of their satellites
+    clocks = ssr.clockFull
+    if clocks!= None: 
+      satNo = ssr.masks.satNums()[ssr.sysKeys[sys]]
+      prns = ssr.masks.getMask(ssr.sysKeys[sys]).sats
+    else:
+      clocks = ssr.clockSub
+      if clocks==None:
+        raise CorrectionNotAvailable("HAS clock corrections are not available!")
+      satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
+      prns = clocks.satIDs.get(ssr.sysKeys[sys], [])
+    return clocks.corrections[ssr.sysKeys[sys]][:satNo], np.array(prns, dtype=np.int64)
 
   def IGM03(self, sys, ssr, tow, lowerUDI=True):
     # Combined Orbit + Clock correction message
-    msg = ""
-    sub = False
+    msg = BitWriter()
     # __Header__
     # 79bit header (constructed without for now)
     # 6bit no. of satellites
     try:
       orbs = ssr.orbits.orbits[ssr.sysKeys[sys]]
-      satNo = ssr.orbits.satNum[ssr.sysKeys[sys]]
-      clocks = ssr.clockFull
-      if clocks==None: 
-        clocks = ssr.clockSub
-        if clocks==None:
-          raise CorrectionNotAvailable("HAS clock corrections are not available!")
-        sub = True
-        satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
+      corrections, prns = self.clocks(sys, ssr)
     except IndexError:
       raise CorrectionNotAvailable("HAS orbit corrections are not available!")
-    nSat = satNo
-    for sat in range(satNo):
-      sat_clk = clocks.corrections[ssr.sysKeys[sys]][sat]
-      if orbs[sat].NAcount == 0 and type(sat_clk)!= str:
-        # __Sat. Specific__
-        # 6bit Sat. ID
-        if not sub:
-          prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat)
-        else:
-          prn = clocks.satIDs[ssr.sysKeys[sys]][sat]
-        msg += np.binary_repr(prn, 6)
-        # 8bit GNSS IOD
-        iod = orbs[sat].iod &255
-        msg+= np.binary_repr(iod, 8)
-        # 22bit Delta Orb. Radial
-        # 20bit Delta Orbit Along-Track
-        # 20bit Delta Orbit Cross-Track
-        orbitCorr = self.translateOrbit(orbs[sat])
-        msg += orbitCorr
-        # 21bit Dot Orb. Radial  <- Not possible
-        # 19bit Dot Orbit Along-Track  <- Not possible
-        # 19bit Dot Orbit Cross-Track  <- Not possible
-        msg += "0"*59
-        # 22bit Delta Clock C0
-        clk = self.translateClock(sat_clk, sys, prn, tow)
-        msg += clk
-        # 21bit Delta Clock C1  <- Not available
-        # 27bit Delta Clock C2  <- Not available
-        msg += 48*"0"
-      else:
-        nSat -= 1
+    satNo = len(corrections)
+    # Satellites (of the subset, if so) with the orbit and clock corrections available
+    sats = np.flatnonzero((orbs["status"][:satNo] == 0) & (corrections["status"] == 0))
+    dEph = self.translateOrbit(orbs[sats])
+    clks = self.translateClock(corrections["deltaClock"][sats], sys, prns[sats], tow)
+    nSat = len(sats)
+    for prn, iod, (dRad, dAlong, dCross), clk in zip(prns[sats].tolist(), orbs["iod"][sats].tolist(), dEph.tolist(), clks.tolist()):
+      # __Sat. Specific__
+      # 6bit Sat. ID
+      msg.write_uint(prn, 6)
+      # 8bit GNSS IOD
+      msg.write_uint(iod &255, 8)
+      # 22bit Delta Orb. Radial
+      # 20bit Delta Orbit Along-Track
+      # 20bit Delta Orbit Cross-Track
+      msg.write_int(dRad, 22)
+      msg.write_int(dAlong, 20)
+      msg.write_int(dCross, 20)
+      # 21bit Dot Orb. Radial  <- Not possible
+      # 19bit Dot Orbit Along-Track  <- Not possible
+      # 19bit Dot Orbit Cross-Track  <- Not possible
+      msg.write_zeros(59)
+      # 22bit Delta Clock C0
+      msg.write_int(clk, 22)
+      # 21bit Delta Clock C1  <- Not available
+      # 27bit Delta Clock C2  <- Not available
+      msg.write_zeros(48)
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
     if nSat == 0:
@@ -237,41 +228,27 @@ class SSR_IGS:
     for i in range(len(pages)-1):
       # 79bit header(msgnum)
       hdr = self.const_common_header(sys, ssr, 3, tow, nSat, True, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 3, tow, nSat, False, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
   def IGM04(self, sys, ssr, tow, lowerUDI=True):
     # Alternative HR Clock correction message
-    msg = ""
-    sub = False
+    msg = BitWriter()
     # is constructed without header first
     # 6bit no. of satellites
-    clocks = ssr.clockFull
-    if clocks!= None: 
-      satNo = ssr.masks.satNums()[ssr.sysKeys[sys]]
-    else:
-      clocks = ssr.clockSub
-      if clocks==None:
-        raise CorrectionNotAvailable("HAS clock corrections are not available!")
-      sub = True
-      satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
-    nSat = satNo
-    for sat in range(satNo):
+    corrections, prns = self.clocks(sys, ssr)
+    sats = np.flatnonzero(corrections["status"] == 0)
+    nSat = len(sats)
+    for prn, c0 in zip(prns[sats].tolist(), self.translateClock(corrections["deltaClock"][sats], sys, prns[sats], tow).tolist()):
       # __Sat. Specific__
-      if type(clocks.corrections[ssr.sysKeys[sys]][sat])!= str:
-        # 6bit Sat. ID
-        if not sub:
-          prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat)
-        else:
-          prn = clocks.satIDs[ssr.sysKeys[sys]][sat]
-        msg += np.binary_repr(prn, 6)
-        # 22bit Delta Clock C0
-        c0 = self.translateClock(clocks.corrections[ssr.sysKeys[sys]][sat], sys, prn, tow)
-        msg += c0
-      else:
-        nSat -= 1
+      # 6bit Sat. ID
+      msg.write_uint(prn, 6)
+      # 22bit Delta Clock C0
+      msg.write_int(c0, 22)
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
     if nSat == 0:
@@ -280,14 +257,16 @@ class SSR_IGS:
     for i in range(len(pages)-1):
       # 78bit header(msgnum)
       hdr = self.const_common_header(sys, ssr, 4, tow, nSat, True, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 4, tow, nSat, False, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
   def IGM05(self, sys, ssr, tow, lowerUDI=True):
     #Code bias message
-    msg = ""
+    msg = BitWriter()
     # 78bit header (constructed without at first)
     # 6bit no. of satellites
     try:
@@ -295,50 +274,28 @@ class SSR_IGS:
     except TypeError:
       raise CorrectionNotAvailable("HAS Code Biases not available!")
     satNo = codes.mask.nsat
-    sats = list(codes.biases.keys())
-    assert satNo == len(sats)
-    nSat = satNo
-    for sat in range(satNo):
+    assert satNo == len(codes.sats)
+    available = codes.biases["status"] == 0
+    mapped = self.mapped(sys, codes.sigs)
+    # 5bit No. of biases
+    codeNos = available @ self.biasCounts(sys, codes.sigs, mapped)
+    sats = np.flatnonzero((codeNos > 0) & ~ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].dnuFlags())
+    biases = self.translateBias(codes.biases["bias"], "c")
+    nSat = len(sats)
+    for sat in sats.tolist():
       # __Sat. Specific__
       # 6bit Sat. ID
-      prn = sats[sat]
-      msg += np.binary_repr(prn, 6)
-      # 5bit No. of biases
-      satCodes = list(codes.biases[prn].keys())
-      codeNo = len(satCodes)
-      for i in satCodes:
-        if codes.biases[prn][i] == "N/A":
-          codeNo -= 1
-        else:
-          if sys=="GPS" and i in [5, 8, 13]:
-            codeNo += 1
-          elif sys=="GAL" and i in [2, 5, 8, 14]:
-            codeNo += 1
-          elif i not in self.HAScode2PPPcode[sys].keys():
-            codeNo -= 1
-      dnu = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].getDNU(sat)
-      if codeNo > 0 and not dnu:
-        msg += np.binary_repr(codeNo, 5)
-        # __Bias Specific__
-        for code in satCodes:
-          if codes.biases[prn][code] != "N/A":
-            if code in self.HAScode2PPPcode[sys].keys():
-              # 5bit Signal&Tracking mode identifier
-              codeID = self.HAScode2PPPcode[sys][code]
-              if type(codeID)==list:
-                bias = self.translateBias(codes.biases[prn][code], "c")
-                for c in codeID:
-                  msg += np.binary_repr(c, 5)
-                  # 14bit Code Bias
-                  msg += np.binary_repr(bias, 14)
-              else:
-                msg += np.binary_repr(codeID, 5)
-                # 14bit Code Bias
-                bias = self.translateBias(codes.biases[prn][code], "c")
-                msg += np.binary_repr(bias, 14)
-      else:
-        nSat -= 1
-        msg = msg[:len(msg)-6]
+      msg.write_uint(int(codes.sats[sat]), 6)
+      msg.write_uint(int(codeNos[sat]), 5)
+      # __Bias Specific__
+      for sig in np.flatnonzero(available[sat] & mapped).tolist():
+        # 5bit Signal&Tracking mode identifier
+        codeID = self.HAScode2PPPcode[sys][int(codes.sigs[sig])]
+        bias = biases[sat, sig]
+        for c in (codeID if type(codeID)==list else [codeID]):
+          msg.write_uint(c, 5)
+          # 14bit Code Bias
+          msg.write_int(bias, 14)
     
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -348,14 +305,16 @@ class SSR_IGS:
     for i in range(len(pages)-1):
       # 78bit header(msgnum)
       hdr = self.const_common_header(sys, ssr, 5, tow, nSat, True, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 5, tow, nSat, False, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
   def IGM06(self, sys, ssr, tow, lowerUDI=True):
     # Phase biases correction message
-    msg = ""
+    msg = BitWriter()
     # __Header__
     # 78bit header (added later)
     # 6bit no. of satellites
@@ -364,67 +323,41 @@ class SSR_IGS:
     except TypeError:
       raise CorrectionNotAvailable("HAS Phase Biases not available!")
     satNo = phases.mask.nsat
-    sats = list(phases.biases.keys())
-    assert satNo == len(sats)
-    nSat = satNo
-    for sat in range(satNo):
+    assert satNo == len(phases.sats)
+    available = phases.biases["status"] == 0
+    mapped = self.mapped(sys, phases.sigs)
+    # 5bit No. of biases
+    phaseNos = available @ self.biasCounts(sys, phases.sigs, mapped)
+    sats = np.flatnonzero((phaseNos > 0) & ~ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].dnuFlags())
+    usable = available & mapped
+    # Biases per signal (of the satellites the message contains them of), of all satellites at once
+    biases = np.zeros(phases.biases.shape, dtype=np.int64)
+    for sig in np.flatnonzero(usable[sats].any(axis=0)).tolist():
+      phaseID = self.HAScode2PPPcode[sys][int(phases.sigs[sig])]
+      biases[:, sig] = self.translateBias(phases.biases["bias"][:, sig], "p", sys, phaseID[0] if type(phaseID)==list else phaseID)
+    nSat = len(sats)
+    for sat in sats.tolist():
       # __Sat. Specific__
       # 6bit Sat. ID
-      prn = sats[sat]
-      msg += np.binary_repr(prn, 6)
-      # 5bit No. of biases
-      satPhases = list(phases.biases[prn].keys())
-      phaseNo = len(satPhases)
-      for i in satPhases:
-        if i not in self.HAScode2PPPcode[sys].keys():
-          phaseNo -= 1
-        elif phases.biases[prn][i][0] == "N/A":
-          phaseNo -= 1
-        elif sys=="GPS" and i in [5, 8, 13]:
-          phaseNo += 1
-        elif sys=="GAL" and i in [2, 5, 8, 14]:
-          phaseNo += 1
-      dnu = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].getDNU(sat)
-      if phaseNo > 0 and not dnu:
-        msg += np.binary_repr(phaseNo, 5)
-        # 9bit Yaw angle
-        # 8bit Yaw rate
-        msg += "0"*(9+8)
-        for phase in satPhases:
-          if phase != "num":
-            if phases.biases[prn][phase][0] != "N/A":
-              #   __Bias Specific__
-              if phase in self.HAScode2PPPcode[sys].keys():
-                # 5bit Signal&Tracking mode identifier
-                phaseID = self.HAScode2PPPcode[sys][phase]
-                if type(phaseID)==list:
-                  bias = self.translateBias(phases.biases[prn][phase][0], "p", sys, phaseID[0])
-                  discont = phases.biases[prn][phase][1]
-                  for p in phaseID:
-                    msg += np.binary_repr(p, 5)
-                    # 1bit Signal Integer Ind.
-                    # 2bit Signals Wide-Lane Integer Ind.
-                    # In the Galileo HAS SIS ICD 1.4, these properties are inevident
-                    msg += "000"
-                    # 4bit Signal Discont. Counter
-                    msg += np.binary_repr(discont, 4)
-                    # 20bit Phase Bias
-                    msg += np.binary_repr(bias, 20)
-                else:
-                  msg += np.binary_repr(phaseID, 5)
-                  # 1bit Signal Integer Ind.
-                  # 2bit Signals Wide-Lane Integer Ind.
-                  # In the Galileo HAS SIS ICD 1.4, these properties are inevident
-                  msg += "000"
-                  # 4bit Signal Discont. Counter
-                  discont = phases.biases[prn][phase][1]
-                  msg += np.binary_repr(discont, 4)
-                  # 20bit Phase Bias
-                  bias = self.translateBias(phases.biases[prn][phase][0], "p", sys, phaseID)
-                  msg += np.binary_repr(bias, 20)
-      else:
-        nSat -= 1
-        msg = msg[:len(msg)-6]
+      msg.write_uint(int(phases.sats[sat]), 6)
+      msg.write_uint(int(phaseNos[sat]), 5)
+      # 9bit Yaw angle
+      # 8bit Yaw rate
+      msg.write_zeros(9+8)
+      for sig in np.flatnonzero(usable[sat]).tolist():
+        #   __Bias Specific__
+        # 5bit Signal&Tracking mode identifier
+        phaseID = self.HAScode2PPPcode[sys][int(phases.sigs[sig])]
+        for p in (phaseID if type(phaseID)==list else [phaseID]):
+          msg.write_uint(p, 5)
+          # 1bit Signal Integer Ind.
+          # 2bit Signals Wide-Lane Integer Ind.
+          # In the Galileo HAS SIS ICD 1.4, these properties are inevident
+          msg.write_zeros(3)
+          # 4bit Signal Discont. Counter
+          msg.write_uint(phases.biases["discont"][sat, sig], 4)
+          # 20bit Phase Bias
+          msg.write_int(biases[sat, sig], 20)
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
     if nSat == 0:
@@ -433,20 +366,32 @@ class SSR_IGS:
     for i in range(len(pages)-1):
       # 80bit header(msgnum)
       hdr = self.const_common_header(sys, ssr, 6, tow, nSat, True, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 6, tow, nSat, False, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
     
+  def mapped(self, sys, sigs):
+    # Flags of the HAS signal IDs sigs with a signal and tracking mode identifier
+    return np.array([sig in self.HAScode2PPPcode[sys] for sig in sigs.tolist()], dtype=bool)
+
+  def biasCounts(self, sys, sigs, mapped):
+    # Number of biases a message counts per available bias of the signals sigs
+    counted = {"GPS": [5, 8, 13], "GAL": [2, 5, 8, 14]}.get(sys, [])
+    return np.array([2 if sig in counted else int(m) for sig, m in zip(sigs.tolist(), mapped.tolist())], dtype=np.int64)
+
   def translateBias(self, HASbias, mode, sys=None, signal=None):
+    # HASbias: a single bias or an array of them (of the same signal, if phase biases)
     if mode=="c":
-      IGSbias = round(HASbias / 0.01)
+      IGSbias = np.rint(HASbias / 0.01)
     elif mode=="p":
       cycles = HASbias
       #Converting cycles (HAS) to m (IGS): cycles*wavelength[mm] / 0.1
       #/0.1 for IGS resolution of 0.0001m
-      IGSbias = round(cycles * self.cycleLens[sys][signal] / 0.1)
-    return IGSbias
+      IGSbias = np.rint(cycles * self.cycleLens[sys][signal] / 0.1)
+    return IGSbias.astype(np.int64)
 
   def IGM07(self, sys, ssr, tow):
     # URA message, not possible via HAS
@@ -476,53 +421,51 @@ class SSR_IGS:
     raise CorrectionNotAvailable("HAS messages do not contain atmospheric corrections yet")
 
   def const_common_header(self, sys, ssr, msgNum, tow, nSat, multMess=False, lowerUDI=True):
-    hdr = ""
+    hdr = BitWriter()
     # __Header__
     # 12bit RTCM Message number (always 4076)
-    hdr += "111111101100"
+    hdr.write_uint(4076, 12)
     # 3bit IGS SSR version (current document: v1.0)
-    hdr += "001"
+    hdr.write_uint(1, 3)
     # 8bit Sub-type number, dep on system
     subtype = self.systems[sys]*20+msgNum if type(msgNum)==int else 201
-    hdr += np.binary_repr(subtype, 8)
+    hdr.write_uint(subtype, 8)
     # 20bit SSR epoch time, 1s
-    hdr += self.calc_tow(ssr, tow)
+    hdr.write_uint(self.calc_tow(ssr, tow), 20)
     # 4bit update interval       
     # User flag to choose upper or lower UDI when in doubt: Use opt. lowerUDI
     udi = self.ret_udi(self.ssr_block(ssr, msgNum), lowerUDI=lowerUDI)
-    hdr += np.binary_repr(udi, 4)
+    hdr.write_uint(udi, 4)
     # 1bit multiple message indicator
-    hdr += np.binary_repr(multMess*1,1)
+    hdr.write_uint(multMess*1, 1)
     # 4bit IOD SSR
     iod = 1 #This code is v1.0 of the SSR generation
-    hdr += np.binary_repr(iod, 4)
+    hdr.write_uint(iod, 4)
     # 16bit Provider ID
     providID = HAS_PROVIDER_ID
-    hdr += np.binary_repr(providID, 16)
+    hdr.write_uint(providID, 16)
     # 4bit solution ID
-    hdr += np.binary_repr(0, 4)
+    hdr.write_uint(0, 4)
     if msgNum == 1 or msgNum == 3:
       # 1bit global/regional crs indicator
-      hdr += "0"
+      hdr.write_zeros(1)
     elif msgNum == 6:
       # 1bit Dispersive Bias Consist. ind.
       # 1bit MW Consistency Ind.
       # In the Galileo HAS SIS ICD 1.4, these properties are inevident
-      hdr += "00"
+      hdr.write_zeros(2)
     # 6bit number of satellites
-    hdr += np.binary_repr(nSat, 6)
+    hdr.write_uint(nSat, 6)
     # ---78-80bit---
     return hdr
 
-  def translateOrbit(self, orb):
+  def translateOrbit(self, orbs):
+    # orbs: Orbits.DTYPE array. Returns the radial, along- and cross-track corrections per satellite
     # Because of different sign convention between HAS and IGS-SSR, invert the signs
-    dRad = -round(orb.deltaRad / 0.0001)
-    dRad = np.binary_repr(dRad, 22)
-    dAlong = -round(orb.deltaInTrack / 0.0004)
-    dAlong = np.binary_repr(dAlong, 20)
-    dCross = -round(orb.deltaCrossTrack / 0.0004)
-    dCross = np.binary_repr(dCross, 20)
-    return dRad + dAlong + dCross
+    dRad = -np.rint(orbs["deltaRad"] / 0.0001)
+    dAlong = -np.rint(orbs["deltaInTrack"] / 0.0004)
+    dCross = -np.rint(orbs["deltaCrossTrack"] / 0.0004)
+    return np.stack((dRad, dAlong, dCross), axis=-1).astype(np.int64)
 
   def calc_tow(self, ssr, tow):
     tow_h = int(tow / 3600)
@@ -531,7 +474,7 @@ class SSR_IGS:
     if toh_rec <= 10 and toh_has/60 >= 50:
       tow_h -= 1
     tow = tow_h*3600 + toh_has
-    return np.binary_repr(tow, 20)
+    return tow
 
   def ssr_block(self, ssr, msgNum):
     read = {0:ssr.masks, 1:ssr.orbits, 
@@ -565,11 +508,11 @@ class SSR_IGS:
     return udi
 
   def frame(self, msg):
-    padded = msg + (8-(len(msg)%8))*"0"
-    mLen = int(len(padded)/8)
-    frame = "11010011" #Preamble, 11010011 (0xD3)
-    frame = frame + "000000" #zeros
-    frame = frame + np.binary_repr(mLen, 10)
-    parity = np.binary_repr(crc.crc24q(bits2Bytes(frame+padded), mLen+3), 24)
-    framed = frame + padded + parity
+    msg.write_zeros(8-(len(msg)%8))
+    mLen = len(msg)//8
+    frame = b'\xd3' #Preamble, 11010011 (0xD3)
+    frame = frame + mLen.to_bytes(2, "big") #6 zeros + 10bit length
+    body = msg.tobytes()
+    parity = crc.CRC24Q(frame).update(body).digest()
+    framed = frame + body + parity
     return framed
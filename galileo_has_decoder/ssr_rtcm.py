@@ -8,7 +8,7 @@ VER   DATE        AUTHOR
 1.0.2 31/05/2023  Martti Kirkko-Jaakkola / FGI
 '''
 
-from galileo_has_decoder.utils import bidict, bits2Bytes
+from galileo_has_decoder.utils import bidict, BitWriter
 from galileo_has_decoder.ssr_classes import SSR
 from galileo_has_decoder import crc
 import math
@@ -85,13 +85,28 @@ class SSR_RTCM():
     pL = 8192-(headerL+3*8)
     pageNum = self.pages(msg, headerL)
     for i in range(pageNum):
-      i_page = msg[i*pL:(i+1)*pL]
+      i_page = msg.slice(i*pL, (i+1)*pL)
       pages += [i_page]
     return pages
 
   def translateClock(self, clock):
-    c0 = round(clock / 0.0001)
-    return np.binary_repr(c0, 22)
+    #clock: a single correction or an array of them
+    c0 = np.rint(clock / 0.0001).astype(np.int64)
+    return c0
+
+  def clocks(self, sys, ssr):
+    #Clock corrections (full set, else subset) of a system, and the PRNs of their satellites
+    clocks = ssr.clockFull
+    if clocks!= None: 
+      satNo = ssr.masks.satNums()[ssr.sysKeys[sys]]
+      prns = ssr.masks.getMask(ssr.sysKeys[sys]).sats
+    else:
+      clocks = ssr.clockSub
+      if clocks==None:
+        raise CorrectionNotAvailable("HAS clock corrections are not available!")
+      satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
+      prns = clocks.satIDs.get(ssr.sysKeys[sys], [])
+    return clocks.corrections[ssr.sysKeys[sys]][:satNo], np.array(prns, dtype=np.int64)
 
   def ssr1(self, sys, ssr, tow, lowerUDI=True):
     #Orbit correction message
@@ -102,33 +117,33 @@ class SSR_RTCM():
     except IndexError:
       raise CorrectionNotAvailable("HAS orbit corrections are not available!")
     #Message generation
-    msg = ""
+    msg = BitWriter()
+    mask = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])]
+    #Satellites with all orbit components available and usable
+    sats = np.flatnonzero((orbs["status"][:satNo] == 0) & ~mask.dnuFlags()[:satNo])
+    prns = np.array(mask.sats, dtype=np.int64)[sats]
+    dEph = self.translateOrbit(orbs[sats])
     #per satellite:
-    nSat = satNo
-    for sat in range(satNo):
-      dnu = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].getDNU(sat)
-      if orbs[sat].NAcount == 0 and not dnu:
-        #6bit PRN
-        prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat)
-        msg += np.binary_repr(prn, 6)
-        #10bit IODE GAL, 8bit IOD GPS
-        iode = orbs[sat].iod
-        if sys == "GPS":
-          iode = iode & 255
-          msg+= np.binary_repr(iode, 8)
-        elif sys == "GAL":
-          msg+= np.binary_repr(iode, 10)
-        #22bit dEph[0]
-        #20bit dEph[1]
-        #20bit dEph[2]
-        orbitCorr = self.translateOrbit(orbs[sat])
-        msg += orbitCorr
-        #21bit ddEph[0] <- Not possible
-        #19bit ddEph[1] <- Not possible
-        #19bit ddEph[2] <- Not possible
-        msg += "0"*59
-      else:
-        nSat -= 1
+    nSat = len(sats)
+    for prn, iode, (dRad, dAlong, dCross) in zip(prns.tolist(), orbs["iod"][sats].tolist(), dEph.tolist()):
+      #6bit PRN
+      msg.write_uint(prn, 6)
+      #10bit IODE GAL, 8bit IOD GPS
+      if sys == "GPS":
+        iode = iode & 255
+        msg.write_uint(iode, 8)
+      elif sys == "GAL":
+        msg.write_uint(iode, 10)
+      #22bit dEph[0]
+      #20bit dEph[1]
+      #20bit dEph[2]
+      msg.write_int(dRad, 22)
+      msg.write_int(dAlong, 20)
+      msg.write_int(dCross, 20)
+      #21bit ddEph[0] <- Not possible
+      #19bit ddEph[1] <- Not possible
+      #19bit ddEph[2] <- Not possible
+      msg.write_zeros(59)
 
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -137,52 +152,36 @@ class SSR_RTCM():
     pages = self.splitPages(msg, 68)
     for i in range(len(pages)-1):
       hdr = self.const_common_header(sys, ssr, 1, True, tow, nSat, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 1, False, tow, nSat, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
-  def translateOrbit(self, orb):
+  def translateOrbit(self, orbs):
+    #orbs: Orbits.DTYPE array. Returns the radial, along- and cross-track corrections per satellite
     # Because of different sign convention between HAS and RTCM-SSR, invert the signs
-    dRad = -round(orb.deltaRad / 0.0001)
-    dAlong = -round(orb.deltaInTrack / 0.0004)
-    dCross = -round(orb.deltaCrossTrack / 0.0004)
-    dRad = np.binary_repr(dRad, 22)
-    dAlong = np.binary_repr(dAlong, 20)
-    dCross = np.binary_repr(dCross, 20)
-    return dRad + dAlong + dCross
+    dRad = -np.rint(orbs["deltaRad"] / 0.0001)
+    dAlong = -np.rint(orbs["deltaInTrack"] / 0.0004)
+    dCross = -np.rint(orbs["deltaCrossTrack"] / 0.0004)
+    return np.stack((dRad, dAlong, dCross), axis=-1).astype(np.int64)
 
   def ssr2(self, sys, ssr, tow, lowerUDI=True):
     #Clock correction message
-    msg = ""
-    sub = False
-    clocks = ssr.clockFull
-    if clocks!= None: 
-      satNo = ssr.masks.satNums()[ssr.sysKeys[sys]]
-    else:
-      clocks = ssr.clockSub
-      if clocks==None:
-        raise CorrectionNotAvailable("HAS clock corrections are not available!")
-      sub = True
-      satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
+    msg = BitWriter()
+    corrections, prns = self.clocks(sys, ssr)
+    sats = np.flatnonzero(corrections["status"] == 0)
     #per satellite:
-    nSat = satNo
-    for sat in range(satNo):
-      if type(clocks.corrections[ssr.sysKeys[sys]][sat])!= str:
-        # 6bit PRN
-        if not sub:
-          prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat) 
-        else:
-          prn = clocks.satIDs[ssr.sysKeys[sys]][sat]
-        msg += np.binary_repr(prn, 6)
-        # 22bit Delta Clock C0
-        c0 = self.translateClock(clocks.corrections[ssr.sysKeys[sys]][sat])
-        msg += c0
-        # 21bit Delta Clock C1  <- Not available
-        # 27bit Delta Clock C2  <- Not available
-        msg += 48*"0"
-      else:
-        nSat -= 1
+    nSat = len(sats)
+    for prn, c0 in zip(prns[sats].tolist(), self.translateClock(corrections["deltaClock"][sats]).tolist()):
+      # 6bit PRN
+      msg.write_uint(prn, 6)
+      # 22bit Delta Clock C0
+      msg.write_int(c0, 22)
+      # 21bit Delta Clock C1  <- Not available
+      # 27bit Delta Clock C2  <- Not available
+      msg.write_zeros(48)
 
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -192,14 +191,16 @@ class SSR_RTCM():
     for i in range(len(pages)-1):
       #12bit MT + 49bit Header
       hdr = self.const_common_header(sys, ssr, 2, True, tow, nSat, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 2, False, tow, nSat, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages 
 
   def ssr3(self, sys, ssr, tow, lowerUDI=True):
     #Code bias correction message
-    msg = ""
+    msg = BitWriter()
     #12bit MT + 49bit Header (added later)
     #6bit no. of satellites
     try:
@@ -207,39 +208,27 @@ class SSR_RTCM():
     except TypeError:
       raise CorrectionNotAvailable("HAS Code Biases not available!")
     satNo = codes.mask.nsat
-    sats = list(codes.biases.keys())
-    assert satNo == len(sats)
-    nSat = satNo
+    assert satNo == len(codes.sats)
+    #Available biases of the signals with an RTCM code
+    #(others should practically not occur, except HAS keys/extent changes)
+    usable = (codes.biases["status"] == 0) & self.mapped(sys, codes.sigs)
+    #5bit nbias
+    codeNos = np.count_nonzero(usable, axis=1)
+    sats = np.flatnonzero((codeNos > 0) & ~ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].dnuFlags())
+    biases = self.translateBias(codes.biases["bias"], "c")
+    nSat = len(sats)
     #per satellite:
-    for sat in range(satNo):
+    for sat in sats.tolist():
       #6bit PRN
-      prn = sats[sat]
-      msg += np.binary_repr(prn, 6)
-      #5bit nbias
-      satCodes = list(codes.biases[prn].keys())
-      codeNo = len(satCodes)
-      for i in satCodes:
-        if codes.biases[prn][i] == "N/A":
-          codeNo -= 1
-        elif i not in self.HAScode2PPPcode[sys].keys():
-          #should practically not occur (except HAS keys/extent changes)
-          codeNo -= 1
-      dnu = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].getDNU(sat)
-      if codeNo > 0 and not dnu:
-        msg += np.binary_repr(codeNo, 5)
-        #per bias:
-        for code in satCodes:
-          if codes.biases[prn][code] != "N/A":
-            if code in self.HAScode2PPPcode[sys].keys():
-              #5bit mode
-              codeID = self.HAScode2PPPcode[sys][code]
-              msg += np.binary_repr(codeID, 5)
-              #14bit bias
-              bias = self.translateBias(codes.biases[prn][code], "c")
-              msg += np.binary_repr(bias, 14)
-      else:
-        nSat -= 1
-        msg = msg[:len(msg)-6]
+      msg.write_uint(int(codes.sats[sat]), 6)
+      msg.write_uint(int(codeNos[sat]), 5)
+      #per bias:
+      for sig in np.flatnonzero(usable[sat]).tolist():
+        #5bit mode
+        codeID = self.HAScode2PPPcode[sys][int(codes.sigs[sig])]
+        msg.write_uint(codeID, 5)
+        #14bit bias
+        msg.write_int(biases[sat, sig], 14)
 
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -249,58 +238,48 @@ class SSR_RTCM():
     for i in range(len(pages)-1):
       # 12bit MT + 49bit Header
       hdr = self.const_common_header(sys, ssr, 3, True, tow, nSat, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 3, False, tow, nSat, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
   def ssr4(self, sys, ssr, tow, lowerUDI=True):
     #Combined Orbit + Clock correction message
-    msg = ""
-    sub = False
+    msg = BitWriter()
     #12bit MT + 50bit Header (constructed later)
     #6bit number of satellites
     try:
       orbs = ssr.orbits.orbits[ssr.sysKeys[sys]]
-      satNo = ssr.orbits.satNum[ssr.sysKeys[sys]]
-      clocks = ssr.clockFull
-      if clocks==None: 
-        clocks = ssr.clockSub
-        if clocks==None:
-          raise CorrectionNotAvailable("HAS clock corrections are not available!")
-        sub = True
-        satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
+      corrections, prns = self.clocks(sys, ssr)
     except IndexError:
       raise CorrectionNotAvailable("HAS orbit corrections are not available!")
-    nSat = satNo
+    satNo = len(corrections)
+    #Satellites (of the subset, if so) with the orbit and clock corrections available
+    sats = np.flatnonzero((orbs["status"][:satNo] == 0) & (corrections["status"] == 0))
+    dEph = self.translateOrbit(orbs[sats])
+    c0s = self.translateClock(corrections["deltaClock"][sats])
+    nSat = len(sats)
     #per satellite:
-    for sat in range(satNo):
-      sat_clk = clocks.corrections[ssr.sysKeys[sys]][sat]
-      if orbs[sat].NAcount == 0 and type(sat_clk)!= str:
-        #6bit PRN
-        if not sub:
-          prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat)
-        else:
-          prn = clocks.satIDs[ssr.sysKeys[sys]][sat]
-        msg += np.binary_repr(prn, 6)
-        #10bit IODE GAL, 8bit IOD GPS
-        iode = orbs[sat].iod
-        if sys == "GPS":
-          iode = iode & 255
-          msg+= np.binary_repr(iode, 8)
-        elif sys == "GAL":
-          msg+= np.binary_repr(iode, 10)
-        #62bit dEph
-        orbitCorr = self.translateOrbit(orbs[sat])
-        msg += orbitCorr
-        #59bit ddEph; Not available in HAS
-        msg += "0"*59
-        #70bit dClk, C1&C2 not available in HAS
-        c0 = self.translateClock(sat_clk)
-        msg += c0
-        msg += 48*"0"
-      else:
-        nSat -= 1
+    for prn, iode, (dRad, dAlong, dCross), c0 in zip(prns[sats].tolist(), orbs["iod"][sats].tolist(), dEph.tolist(), c0s.tolist()):
+      #6bit PRN
+      msg.write_uint(prn, 6)
+      #10bit IODE GAL, 8bit IOD GPS
+      if sys == "GPS":
+        iode = iode & 255
+        msg.write_uint(iode, 8)
+      elif sys == "GAL":
+        msg.write_uint(iode, 10)
+      #62bit dEph
+      msg.write_int(dRad, 22)
+      msg.write_int(dAlong, 20)
+      msg.write_int(dCross, 20)
+      #59bit ddEph; Not available in HAS
+      msg.write_zeros(59)
+      #70bit dClk, C1&C2 not available in HAS
+      msg.write_int(c0, 22)
+      msg.write_zeros(48)
 
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -310,9 +289,11 @@ class SSR_RTCM():
     for i in range(len(pages)-1):
       # 12bit MT + 49bit Header
       hdr = self.const_common_header(sys, ssr, 4, True, tow, nSat, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 4, False, tow, nSat, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
   def ssr5(self, sys, ssr, tow):
@@ -321,32 +302,16 @@ class SSR_RTCM():
 
   def ssr6(self, sys, ssr, tow, lowerUDI=True):
     #Alternative HR Clock correction message
-    msg = ""
-    sub = False
-    clocks = ssr.clockFull
-    if clocks!= None: 
-      satNo = ssr.masks.satNums()[ssr.sysKeys[sys]]
-    else:
-      clocks = ssr.clockSub
-      if clocks==None:
-        raise CorrectionNotAvailable("HAS clock corrections are not available!")
-      sub = True
-      satNo = clocks.satNumsSub[ssr.sysKeys[sys]]
+    msg = BitWriter()
+    corrections, prns = self.clocks(sys, ssr)
+    sats = np.flatnonzero(corrections["status"] == 0)
     #per satellite:
-    nSat = satNo
-    for sat in range(satNo):
-      if type(clocks.corrections[ssr.sysKeys[sys]][sat])!= str:
-        # 6bit PRN
-        if not sub:
-          prn = ssr.masks.getSatNum(ssr.sysKeys[sys], sat) 
-        else:
-          prn = clocks.satIDs[ssr.sysKeys[sys]][sat]
-        msg += np.binary_repr(prn, 6)
-        # 22bit Delta Clock C0
-        c0 = self.translateClock(clocks.corrections[ssr.sysKeys[sys]][sat])
-        msg += c0
-      else:
-        nSat -= 1
+    nSat = len(sats)
+    for prn, c0 in zip(prns[sats].tolist(), self.translateClock(corrections["deltaClock"][sats]).tolist()):
+      # 6bit PRN
+      msg.write_uint(prn, 6)
+      # 22bit Delta Clock C0
+      msg.write_int(c0, 22)
 
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -356,14 +321,16 @@ class SSR_RTCM():
     for i in range(len(pages)-1):
       #12bit MT + 49bit Header
       hdr = self.const_common_header(sys, ssr, 6, True, tow, nSat, lowerUDI) 
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, 6, False, tow, nSat, lowerUDI) 
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages 
 
   def ssrp(self, sys, ssr, tow, lowerUDI=True, version=3.2):
     # Phase biases correction message
-    msg = ""
+    msg = BitWriter()
     #12bit MT + 51bit Header (constructed later)
     #6bit number of satellites
     try:
@@ -371,54 +338,43 @@ class SSR_RTCM():
     except TypeError:
       raise CorrectionNotAvailable("HAS Phase Biases not available!")
     satNo = phases.mask.nsat
-    sats = list(phases.biases.keys())
-    assert satNo == len(sats)
-    nSat = satNo
+    assert satNo == len(phases.sats)
+    #Available biases of the signals with an RTCM code
+    #(others should practically not occur, except HAS keys/extent changes)
+    mapped = self.mapped(sys, phases.sigs)
+    usable = (phases.biases["status"] == 0) & mapped
+    #5bit nbias
+    phaseNos = np.count_nonzero(usable, axis=1)
+    sats = np.flatnonzero((phaseNos > 0) & ~ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].dnuFlags())
+    #Biases per signal, of all satellites at once
+    biases = np.zeros(phases.biases.shape, dtype=np.int64)
+    for sig in np.flatnonzero(mapped).tolist():
+      biases[:, sig] = self.translateBias(phases.biases["bias"][:, sig], "p", sys, int(phases.sigs[sig]))
+    nSat = len(sats)
     #per satellite:
-    for sat in range(satNo):
+    for sat in sats.tolist():
       #6bit PRN
-      prn = sats[sat]
-      msg += np.binary_repr(prn, 6)
-      #5bit nbias
-      satPhases = list(phases.biases[prn].keys())
-      phaseNo = len(satPhases)
-      for i in satPhases:
-        if i not in self.HAScode2PPPcode[sys].keys():
-          #Catches "num" entry
-          #should else practically not occur (except HAS keys/extent changes)
-          phaseNo -= 1
-        elif phases.biases[prn][i][0] == "N/A":
-          phaseNo -= 1
-      dnu = ssr.masks.gnss[ssr.masks.keys.index(ssr.sysKeys[sys])].getDNU(sat)
-      if phaseNo > 0 and not dnu:
-        msg += np.binary_repr(phaseNo, 5)
-        #9bit yaw angle
-        #8bit yaw rate
-        msg += "0"*(9+8)
-        #per bias:
-        for phase in satPhases:
-          if phase != "num":
-            if phases.biases[prn][phase][0] != "N/A":
-              if phase in self.HAScode2PPPcode[sys].keys():
-                #5bit mode
-                phaseID = self.HAScode2PPPcode[sys][phase]
-                msg += np.binary_repr(phaseID, 5)
-                #1bit integer
-                #2bit WLI
-                # In the Galileo HAS SIS ICD 1.4, these properties are inevident
-                msg += "000"
-                #4bit discontinuity counter
-                discont = phases.biases[prn][phase][1]
-                msg += np.binary_repr(discont, 4)
-                #20bit bias
-                bias = self.translateBias(phases.biases[prn][phase][0], "p", sys, phase)
-                msg += np.binary_repr(bias, 20)
-                #17bit std-dev
-                if version==3.3:
-                  msg += "0"*17
-      else:
-        nSat -= 1
-        msg = msg[:len(msg)-6]
+      msg.write_uint(int(phases.sats[sat]), 6)
+      msg.write_uint(int(phaseNos[sat]), 5)
+      #9bit yaw angle
+      #8bit yaw rate
+      msg.write_zeros(9+8)
+      #per bias:
+      for sig in np.flatnonzero(usable[sat]).tolist():
+        #5bit mode
+        phaseID = self.HAScode2PPPcode[sys][int(phases.sigs[sig])]
+        msg.write_uint(phaseID, 5)
+        #1bit integer
+        #2bit WLI
+        # In the Galileo HAS SIS ICD 1.4, these properties are inevident
+        msg.write_zeros(3)
+        #4bit discontinuity counter
+        msg.write_uint(phases.biases["discont"][sat, sig], 4)
+        #20bit bias
+        msg.write_int(biases[sat, sig], 20)
+        #17bit std-dev
+        if version==3.3:
+          msg.write_zeros(17)
 
     #In case the combination of header and message would be longer than the maximum length
     #saveable in 10bits (1024bytes), split message in pages
@@ -431,63 +387,69 @@ class SSR_RTCM():
       # 1bit Dispersive Bias Consist. ind.
       # 1bit MW Consistency Ind.
       # In the Galileo HAS SIS ICD 1.4, these properties are inevident
-      msg += "00"
-      pages[i] = self.frame(hdr + pages[i])
+      hdr.write_writer(pages[i])
+      pages[i] = self.frame(hdr)
     hdr = self.const_common_header(sys, ssr, "p", False, tow, nSat, lowerUDI) 
     # 1bit Dispersive Bias Consist. ind.
     # 1bit MW Consistency Ind.
-    hdr += "00"
-    pages[-1] = self.frame(hdr + pages[-1])
+    hdr.write_zeros(2)
+    hdr.write_writer(pages[-1])
+    pages[-1] = self.frame(hdr)
     return pages
 
+  def mapped(self, sys, sigs):
+    #Flags of the HAS signal IDs sigs with an RTCM signal and tracking mode
+    return np.array([sig in self.HAScode2PPPcode[sys] for sig in sigs.tolist()], dtype=bool)
+
   def translateBias(self, HASbias, mode, sys=None, signal=None):
+    #HASbias: a single bias or an array of them (of the same signal, if phase biases)
     if mode == "c":
-      RTCMbias = round(HASbias / 0.01)
+      RTCMbias = np.rint(HASbias / 0.01)
     elif mode == "p":
       cycles = HASbias
       #Converting cycles (HAS) to m (IGS): wavelength[mm]*cycles / 0.1
       #/0.1 for RTCM resolution of 0.0001m (0.1mm)
-      RTCMbias = round(self.cycleLens[sys][signal] * cycles / 0.1)
-    return RTCMbias
+      RTCMbias = np.rint(self.cycleLens[sys][signal] * cycles / 0.1)
+    return RTCMbias.astype(np.int64)
 
   def frame(self, msg):
-    padded = msg + (8-(len(msg)%8))*"0"
-    mLen = int(len(padded)/8)
-    intro = "11010011" + "000000" + np.binary_repr(mLen, 10)
-    _crc = crc.crc24q(bits2Bytes(intro+padded), mLen+3)
-    parity = np.binary_repr(_crc, 24)
-    framed = intro + padded + parity
-    return framed
+    msg.write_zeros(8-(len(msg)%8))
+    mLen = len(msg)//8
+    #8bit preamble + 6bit reserved + 10bit message length
+    intro = b'\xd3' + mLen.to_bytes(2, "big")
+    body = msg.tobytes()
+    _crc = crc.CRC24Q(intro).update(body)
+    return intro + body + _crc.digest()
 
   #existing types are: 1,2,3,4,5,6,p
   def const_common_header(self, sys, ssr, msgNum, _sync, tow, nSat, lowerUDI=True):
     #Common part of all headers (+ refd for 1&4)
-    hdr = ""
+    hdr = BitWriter()
     #12bit Message Number
-    hdr += np.binary_repr(self.msgNum(msgNum, sys), 12)
+    hdr.write_uint(self.msgNum(msgNum, sys), 12)
     #20bit time
-    hdr += self.calc_tow(ssr, tow) 
+    hdr.write_uint(self.calc_tow(ssr, tow), 20)
     #4bit UDI
     udi = self.ret_udi(self.block(ssr, msgNum), lowerUDI=lowerUDI)
-    hdr+= np.binary_repr(udi, 4)
+    hdr.write_uint(udi, 4)
     #1bit Sync flag (message following?)
     sync = _sync #as 0/1 bit
-    hdr += np.binary_repr(sync*1, 1)
+    hdr.write_uint(sync*1, 1)
     if msgNum == 1 or msgNum == 4:
       #1bit ITRF (standard Galileo reference datum)
-      refd = "0" 
-      hdr += refd
+      refd = 0
+      hdr.write_uint(refd, 1)
     #This code is v1.0 of the SSR generation
     iod = 1
-    hdr += np.binary_repr(iod, 4)
+    hdr.write_uint(iod, 4)
     #16bit provider ID
     providID = HAS_PROVIDER_ID
-    hdr += np.binary_repr(providID, 16)
+    hdr.write_uint(providID, 16)
     #4bit Solution ID: one service in HAS, so ID 1
-    solid = "0001"
-    hdr += solid
+    solid = 1
+    hdr.write_uint(solid, 4)
     #6bit number of satellites
-    hdr += np.binary_repr(nSat, 6)
+    hdr.write_uint(nSat, 6)
     return hdr
 
   def calc_tow(self, ssr, _tow):
@@ -496,7 +458,7 @@ class SSR_RTCM():
     if tow_h*3600 + toh_has > _tow:
       tow_h -= 1
     tow = tow_h*3600 + toh_has
-    return np.binary_repr(tow, 20)
+    return tow
 
   def ret_udi(self, ssr_block, lowerUDI=True):
     has_keys = {0:5, 1:10, 2:15, 3:20, 4:30, 5:60, 
@@ -10,7 +10,7 @@ VER   DATE        AUTHOR
 import struct
 import math
 import time
-from galileo_has_decoder.utils import bits2Bytes, gpst2time
+from galileo_has_decoder.utils import gpst2time, Page_Feeding
 from galileo_has_decoder.utils_binex import Binex_Record, readUbnxi, BinexError
 from galileo_has_decoder.has_classes import HAS_Storage
 from galileo_has_decoder.ssr_converter import SSR_Converter
@@ -20,11 +20,14 @@ class StreamError(Exception):
   #Base File Error class
   pass
 
-class TCP_Binex_Reader:
+class TCP_Binex_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
   tcp = None
   def __init__(self, src, msgnum=0):
     addr, port = src.split(":")
-    self.source = TCP_Server(addr, int(port))
+    self.source = TCP_Server(addr, int(port), wait=False)
     self.has_storage = HAS_Storage()
     self.msgnum = msgnum
     self.pppWiz = False
@@ -35,7 +38,7 @@ class TCP_Binex_Reader:
     if src != None:
       self.source.close()
       addr, port = src.split(":")
-      self.source = TCP_Server(addr, int(port))
+      self.source = TCP_Server(addr, int(port), wait=False)
     if converter is not None:
       if converter.pppWiz:
         self.output = output
@@ -55,12 +58,14 @@ class TCP_Binex_Reader:
       if timecurr != 0:
         timecurr = time.time()
       j += 1
+      self.blocks += 1
       if verbose >= 5:
           print("Message " + str(j))
       try:
           content = self.findMessage(content, verbose)
       except StreamError:
           j-=1
+          self.blocks -= 1
           print("Warning: EOS reached")
           break
       if verbose >= 5:
@@ -76,25 +81,16 @@ class TCP_Binex_Reader:
           content = self.receiveData(content, verbose=verbose)
       if binex.decodeBlock(verbose):
           cnavs+=1
-          if self.has_storage.feedMessage(binex.returnBinary(), binex.subrecord.tow, verbose=verbose):
+          self.cnavBlocks += 1
+          if self.feedPage(binex.returnBinary(), binex.subrecord.tow, binex.subrecord.epochTime(), converter, output, compact, HRclk, lowerUDI, verbose):
               hasnum += 1
-              if converter != None:
-                  decoded_msg = self.has_storage.lastMessage
-                  tow = self.has_storage.lastMessage_tow
-                  converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
-                  if output != None and converted != None:
-                      for msg_conv in converted:
-                          msg_bytes = bits2Bytes(msg_conv)
-                          if self.pppWiz:
-                              output.write(msg_bytes, 2, 1, binex.subrecord.epochTime())
-                          else:
-                              output.write(msg_bytes)   
       elif verbose >= 5:
           print("   Err: Non-CNAV block.")
       content = content[i:]
     if verbose>=1:
         print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
           +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
 
   def findMessage(self, stream, verbose=0):
     syncbytes = [0xc2, 0xe2, 0xd2, 
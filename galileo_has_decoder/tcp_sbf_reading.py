@@ -10,8 +10,8 @@ VER   DATE        AUTHOR
 import struct
 import math
 import time
-from galileo_has_decoder.utils import bits2Bytes, gpst2time
-from galileo_has_decoder.utils_sbf import splitStream, SBF_Block, IONO_Block
+from galileo_has_decoder.utils import gpst2time, Page_Feeding
+from galileo_has_decoder.utils_sbf import splitStream, crcValid, SBF_Block, IONO_Block
 from galileo_has_decoder.has_classes import HAS_Storage
 from galileo_has_decoder.ssr_converter import SSR_Converter
 from galileo_has_decoder.tcp_server import TCP_Server
@@ -23,14 +23,19 @@ class StreamError(Exception):
   #Base Stream Error class
   pass
 
-class TCP_SBF_Reader:
+class TCP_SBF_Reader(Page_Feeding):
+  #Running totals of the blocks and C/Nav blocks read
+  blocks = 0
+  cnavBlocks = 0
   has_storage = None
+  rejectedBlocks = None
   def __init__(self, src, msgnum=0):
     addr, port = src.split(":")
-    self.source = TCP_Server(addr, int(port))
+    self.source = TCP_Server(addr, int(port), wait=False)
     self.has_storage = HAS_Storage()
     self.msgnum = msgnum
     self.pppWiz = False
+    self.rejectedBlocks = 0
 
   def read(self, src=None, converter=None, output=None, mode='m', x=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
     i = 0
@@ -46,7 +51,7 @@ class TCP_SBF_Reader:
     if src != None:
       self.source.close()
       addr, port = src.split(":")
-      self.source = TCP_Server(addr, int(port))
+      self.source = TCP_Server(addr, int(port), wait=False)
     
     if converter is not None:
       if converter.pppWiz:
@@ -57,12 +62,14 @@ class TCP_SBF_Reader:
       if timecurr != 0:
         timecurr = time.time()
       j += 1
+      self.blocks += 1
       if verbose >= 5:
         print("Message no. " + str(j))
       try:
         content = self.findMessage(content, verbose, j==1)
       except(StreamError):
         j-=1
+        self.blocks -= 1
         print("TCP closed and last message read: Ending operation")
         break
       if verbose >= 5:
@@ -72,7 +79,7 @@ class TCP_SBF_Reader:
         content = self.receiveData(content, verbose=verbose)
       header, i = struct.unpack("<HHH", content[i:i+6]), i+6
       header = list(header)
-      if header[2] % 4 != 0:
+      if header[2] % 4 != 0 or header[2] < 8:
         if verbose >= 5:
           print("SBF Reader: Invalid header, continuing search...")
         continue
@@ -83,6 +90,11 @@ class TCP_SBF_Reader:
       blockLength = header[2]-8
       while(len(content[6:])<blockLength):
         content = self.receiveData(content, verbose=verbose)
+      if not crcValid(_crc, content[2:header[2]-2]):
+        self.rejectedBlocks += 1
+        if verbose >= 5:
+          print("SBF Reader: Block CRC error, continuing search...")
+        continue
       if blockType&65528 == 4024:
         block = content[i:i+blockLength]
         content = content[i+blockLength:]
@@ -90,6 +102,7 @@ class TCP_SBF_Reader:
           #_______________________
           #4024 Block: HAS Message
           cnavs += 1
+          self.cnavBlocks += 1
           hasbyteL = 4+2+6*1+16*4
           pad = blockLength-hasbyteL
           line, i = list(struct.unpack("<IHBBBBBB16I"+str(pad)+"x", block[:i+blockLength])), i+blockLength 
@@ -99,20 +112,8 @@ class TCP_SBF_Reader:
           if line[3] == 1:
             sbf = SBF_Block(header, line)
             has_msg = sbf.returnBinary()
-            if self.has_storage.feedMessage(has_msg, line[0]/1000, verbose=verbose):
+            if self.feedPage(has_msg, line[0]/1000, gpst2time(line[1], line[0]/1000), converter, output, compact, HRclk, lowerUDI, verbose):
               hasnum += 1
-              if converter != None:
-                decoded_msg = self.has_storage.lastMessage
-                tow = self.has_storage.lastMessage_tow
-                converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
-                if output != None and converted != None:
-                  for msg_conv in converted:
-                    msg_bytes = bits2Bytes(msg_conv)
-                    if self.pppWiz:
-                      output.write(msg_bytes, 2, 1, gpst2time(line[1], line[0]/1000))
-                    else:
-                      output.write(msg_bytes)
-              pass
           else:
             if verbose >= 5:
                 print("SBF Reader: CRC error: "+str(line[3]))
@@ -137,8 +138,11 @@ class TCP_SBF_Reader:
         if verbose >= 5:
           print("   Err: Non-CNAV block: " + str(blockType))
     if verbose>=1:
+      if self.rejectedBlocks > 0:
+        print(str(self.rejectedBlocks)+" SBF blocks were rejected due to a CRC error.")
       print("Out of "+str(j)+" messages, "+str(cnavs)+" were C/Nav messages. "+str(hasnum)
           +" HAS messages have successfully been decoded and converted.")
+    return j, cnavs, hasnum
 
   def findMessage(self, stream, verbose=0, start=False):
     prefix = bytearray([36, 64])
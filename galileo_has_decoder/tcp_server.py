@@ -7,18 +7,26 @@ VER   DATE        AUTHOR
 1.0   09/12/2021  Oliver Horst / FGI
 '''
 
+import collections
+import selectors
 import socket
+import threading
+import time
 
 class TCP_Server:
     server_address = 'localhost'
     port = 6947
     server = None
+    client = None
     alive = False
-    def __init__(self, addr=None, port=None, init=True):
+    #With wait False, the client is accepted by the first read/write instead of the constructor
+    wait = True
+    def __init__(self, addr=None, port=None, init=True, wait=True):
         if addr != None:
             self.server_address = addr
         if port != None:
             self.port = port
+        self.wait = wait
         if init:
             self.initServer()
 
@@ -26,10 +34,17 @@ class TCP_Server:
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server.bind((self.server_address, self.port))
         self.server.listen(5)
+        #The port bound, if port 0 was passed
+        self.port = self.server.getsockname()[1]
         print("Waiting for connection on " + str(self.server_address) + ":" + str(self.port))
+        self.client = None
+        self.alive = True
+        if self.wait:
+            self.accept()
+
+    def accept(self):
         (self.client, self.address) = self.server.accept()
         print("Connection established")
-        self.alive = True
 
     def close(self):
         self.server.close()
@@ -37,19 +52,212 @@ class TCP_Server:
 
     def write(self, msg):
         try:
+            if self.client is None:
+                self.accept()
             self.client.send(msg)
         except BrokenPipeError:
             self.initServer()
+            if self.client is None:
+                self.accept()
             self.client.send(msg)
 
     def read(self, n, timeout=0):
         try:
+            if self.client is None:
+                self.accept()
             if timeout != 0:
                 self.client.settimeout(timeout)
             data = self.client.recv(n)
         except BrokenPipeError:
             self.initServer()
+            if self.client is None:
+                self.accept()
             data = self.client.recv(n)
         except socket.timeout:
             return -1
         return data
+
+class Broadcast_Client:
+    #A subscriber of a Broadcast_Server: the queued messages, of which the first has been sent up to offset
+    sock = None
+    address = None
+    queue = None
+    offset = 0
+    dropped = 0
+    closing = False
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.queue = collections.deque()
+
+class Broadcast_Server:
+    #Output server for any number of clients (e.g. RTCM/IGS subscribers), which never blocks the decoder:
+    #write() only queues a message for every client, a separate thread accepts the clients and sends
+    #their queues on non-blocking sockets. A slow client whose queue already holds maxQueue messages
+    #either loses its oldest unsent message (policy "drop") or is disconnected (policy "disconnect").
+    server_address = 'localhost'
+    port = 6947
+    maxQueue = 256
+    policy = "drop"
+    server = None
+    clients = None
+    alive = False
+    dropped = 0
+    def __init__(self, addr=None, port=None, maxQueue=None, policy=None, init=True):
+        if addr != None:
+            self.server_address = addr
+        if port != None:
+            self.port = port
+        if maxQueue != None:
+            self.maxQueue = int(maxQueue)
+        if policy != None:
+            if policy not in ["drop", "disconnect"]:
+                raise ValueError("The policy for slow clients must be 'drop' or 'disconnect'")
+            self.policy = policy
+        self.clients = []
+        self.lock = threading.Lock()
+        if init:
+            self.initServer()
+
+    def initServer(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.server_address, self.port))
+        self.server.listen(64)
+        self.server.setblocking(False)
+        #Writes wake the selector through a socket pair
+        self.wakeIn, self.wakeOut = socket.socketpair()
+        self.wakeIn.setblocking(False)
+        self.wakeOut.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ, None)
+        self.selector.register(self.wakeOut, selectors.EVENT_READ, None)
+        self.alive = True
+        self.thread = threading.Thread(target=self.serve, name="Broadcast_Server", daemon=True)
+        self.thread.start()
+        print("Serving clients on " + str(self.server_address) + ":" + str(self.port))
+
+    def write(self, msg):
+        #Queues msg for all clients connected now
+        msg = bytes(msg)
+        with self.lock:
+            for client in self.clients:
+                if client.closing:
+                    continue
+                if len(client.queue) >= self.maxQueue:
+                    if self.policy == "disconnect":
+                        client.closing = True
+                        continue
+                    #The first message may be partially sent already and has to be completed
+                    oldest = 1 if client.offset > 0 else 0
+                    if oldest < len(client.queue):
+                        del client.queue[oldest]
+                        client.dropped += 1
+                        self.dropped += 1
+                client.queue.append(msg)
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wakeIn.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def serve(self):
+        while self.alive:
+            for key, events in self.selector.select(timeout=1.0):
+                if key.fileobj is self.server:
+                    self.accept()
+                elif key.fileobj is self.wakeOut:
+                    try:
+                        self.wakeOut.recv(4096)
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    if events & selectors.EVENT_READ and not self.receive(key.data):
+                        continue
+                    if events & selectors.EVENT_WRITE:
+                        self.send(key.data)
+            self.update()
+
+    def accept(self):
+        while True:
+            try:
+                sock, address = self.server.accept()
+            except (BlockingIOError, OSError):
+                return
+            sock.setblocking(False)
+            client = Broadcast_Client(sock, address)
+            with self.lock:
+                self.clients.append(client)
+            self.selector.register(sock, selectors.EVENT_READ, client)
+            print("Connection established: " + str(address))
+
+    def receive(self, client):
+        #Data sent by clients is discarded, False if the client has disconnected
+        try:
+            if len(client.sock.recv(4096)) > 0:
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self.disconnect(client)
+        return False
+
+    def send(self, client):
+        with self.lock:
+            try:
+                while len(client.queue) > 0:
+                    msg = client.queue[0]
+                    client.offset += client.sock.send(msg[client.offset:])
+                    if client.offset < len(msg):
+                        return
+                    client.queue.popleft()
+                    client.offset = 0
+            except BlockingIOError:
+                pass
+            except OSError:
+                client.closing = True
+
+    def update(self):
+        #Clients to disconnect, and the interest in writing for those with queued messages
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            if client.closing:
+                self.disconnect(client)
+                continue
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if len(client.queue) > 0 else 0)
+            if self.selector.get_key(client.sock).events != events:
+                self.selector.modify(client.sock, events, client)
+
+    def disconnect(self, client):
+        with self.lock:
+            if client not in self.clients:
+                return
+            self.clients.remove(client)
+        self.selector.unregister(client.sock)
+        client.sock.close()
+        print("Connection closed: " + str(client.address) + ("" if client.dropped == 0 else
+              ", " + str(client.dropped) + " messages dropped"))
+
+    def pending(self):
+        #Number of messages queued for all clients
+        with self.lock:
+            return sum(len(client.queue) for client in self.clients)
+
+    def close(self, timeout=5.0):
+        #Sends the queued messages for up to timeout seconds, then disconnects all clients
+        end = time.time() + timeout
+        while self.alive and self.pending() > 0 and time.time() < end:
+            time.sleep(0.01)
+        self.alive = False
+        self.wake()
+        self.thread.join()
+        for client in list(self.clients):
+            self.disconnect(client)
+        self.selector.close()
+        self.server.close()
+        self.wakeIn.close()
+        self.wakeOut.close()
@@ -9,6 +9,9 @@ VER   DATE        AUTHOR
 '''
 
 import numpy as np
+import mmap
+import multiprocessing
+import sys
 
 # def splitString(string, length):
 #     return (string[0+i:length+i] for i in range(0, len(string), length))
@@ -25,6 +28,90 @@ def bytesFromList(bs):
 def bits2Bytes(string):
   return bytesFromList(splitStringBytes(string))
 
+class BitWriter:
+  #MSB-first bit writer. Fields are collected in an integer accumulator and flushed
+  #to a bytearray for every full byte, so messages never pass through '0'/'1' strings.
+  def __init__(self):
+    self.buf = bytearray()
+    self.acc = 0
+    self.accbits = 0
+
+  def __len__(self):
+    return len(self.buf)*8 + self.accbits
+
+  def write_uint(self, val, n):
+    if n <= 0:
+      return
+    self.acc = (self.acc << n) | (int(val) & ((1 << n) - 1))
+    self.accbits += n
+    if self.accbits >= 8:
+      rest = self.accbits & 7
+      self.buf += (self.acc >> rest).to_bytes(self.accbits >> 3, "big")
+      self.acc &= (1 << rest) - 1
+      self.accbits = rest
+
+  def write_int(self, val, n):
+    #Two's complement
+    self.write_uint(int(val) & ((1 << n) - 1), n)
+
+  def write_zeros(self, n):
+    self.write_uint(0, n)
+
+  def write_writer(self, other):
+    self.write_uint(other.value(), len(other))
+
+  def value(self):
+    return (int.from_bytes(self.buf, "big") << self.accbits) | self.acc
+
+  def slice(self, start, end=None):
+    n = len(self)
+    end = n if end is None else min(end, n)
+    part = BitWriter()
+    if end > start:
+      part.write_uint(self.value() >> (n - end), end - start)
+    return part
+
+  def tobytes(self):
+    #Zero-padded to the next byte boundary
+    if self.accbits:
+      return bytes(self.buf) + (self.acc << (8 - self.accbits)).to_bytes(1, "big")
+    return bytes(self.buf)
+
+class Mapped_File:
+  #Read-only memory map of a whole input file. Readers walk byte offsets in it instead of
+  #copying the content, the OS pages data in on demand, so memory use stays flat.
+  file = None
+  map = None
+  view = None
+  size = None
+  def __init__(self, path):
+    self.file = open(path, "rb")
+    try:
+      self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+      #Empty files cannot be mapped
+      self.map = b""
+    self.view = memoryview(self.map)
+    self.size = len(self.map)
+
+  def offset(self, skip=0.0, skipBytes=0):
+    #Byte offset to start reading at: the fraction skip (0.0-1.0) of the file plus skipBytes bytes
+    return min(max(int(skip*self.size) + int(skipBytes), 0), self.size)
+
+  def close(self):
+    self.view.release()
+    if isinstance(self.map, mmap.mmap):
+      self.map.close()
+    self.file.close()
+
+def processContext():
+  #Start method of worker process pools (mp_context of ProcessPoolExecutor). Workers are forked, unless
+  #the galois package is loaded: its compiled functions run threads, after which forked workers can
+  #deadlock. They are then started by a fork server. None: the default context.
+  if "galois" in sys.modules and "forkserver" in multiprocessing.get_all_start_methods():
+    return multiprocessing.get_context("forkserver")
+  return None
+
 def gpst2time(week, tow):
   # Beginning of epoch time + weeks & seconds
   # NOT TO BE USED FOR EXACT MEASUREMENTS
@@ -68,6 +155,52 @@ def xor_int(a, b):
 def sign(n):
   return int(n[1:],2)-(2**(len(n)-1))*int(n[0])
 
+class BitReader:
+  #MSB-first bit reader over the raw bytes of a message, tracking its own position.
+  #Replaces slicing of '0'/'1' strings: each field is read directly from the covering bytes.
+  def __init__(self, data, pos=0):
+    if isinstance(data, str):
+      #Backwards compatibility with messages as strings of '0'/'1' characters
+      pad = (8 - len(data) % 8) % 8
+      data = int(data + pad*"0", 2).to_bytes((len(data)+pad)//8, "big") if data else b''
+    self.buf = memoryview(data).cast("B")
+    self.nbits = len(self.buf)*8
+    self.pos = pos
+
+  def seek(self, pos):
+    self.pos = pos
+
+  def tell(self):
+    return self.pos
+
+  def skip(self, n):
+    self.pos += n
+
+  def remaining(self):
+    return self.nbits - self.pos
+
+  def read_uint(self, n):
+    end = self.pos + n
+    if end > self.nbits:
+      raise IndexError("BitReader: read of " + str(n) + " bits beyond the end of the buffer")
+    b0 = self.pos >> 3
+    b1 = (end + 7) >> 3
+    val = int.from_bytes(self.buf[b0:b1], "big") >> (b1*8 - end)
+    self.pos = end
+    return val & ((1 << n) - 1)
+
+  def read_int(self, n):
+    #Two's complement
+    val = self.read_uint(n)
+    if val >> (n-1):
+      val -= 1 << n
+    return val
+
+  def read_flags(self, n):
+    #n single-bit flags as a list of bools, MSB first
+    val = self.read_uint(n)
+    return [bool((val >> k) & 1) for k in range(n-1, -1, -1)]
+
 def readContent(msg):
   content = {}
   content["mask"]      = msg[0]=="1"
@@ -150,3 +283,23 @@ def dataValid(data, hdr, verbose=0):
   if hdr[2] != "01":
     return False
   return True
+
+class Page_Feeding:
+  #Mixin of the reader classes, which have a has_storage and pppWiz. Pipeline.attach replaces feedPage.
+  def feedPage(self, has_msg, tow, epoch, converter=None, output=None, compact=True, HRclk=False, lowerUDI=True, verbose=0):
+    #Feeds a HAS page (bit string) received at tow to the HAS storage, a completed HAS message is
+    #converted and written, stamped with epoch for the PPP Wizard. Returns True if one was decoded.
+    with self.has_storage.lock:
+      if not self.has_storage.feedMessage(has_msg, tow, verbose=verbose):
+        return False
+      if converter != None:
+        decoded_msg = self.has_storage.lastMessage
+        tow = self.has_storage.lastMessage_tow
+        converted = converter.convertMessage(decoded_msg, compact=compact, HRclk=HRclk, tow=tow, lowerUDI=lowerUDI, verbose=verbose)
+        if output != None and converted != None:
+          for msg_bytes in converted:
+            if self.pppWiz:
+              output.write(msg_bytes, 2, 1, epoch)
+            else:
+              output.write(msg_bytes)
+      return True
@@ -9,7 +9,6 @@ Modified 15/09/2022 by Tuomo Malkamaki / FGI to notify the user of IndexError ex
 '''
 
 import struct
-import datetime
 import numpy as np
 PAGELENGTH = 64
 
@@ -57,13 +56,15 @@ class Binex_Record:
         pass
 
     def readBlock(self, msg, i=0):
+        # msg may be a whole (mapped) file with the record starting at i; the returned index is absolute
+        start = i
         self.syncByte = msg[i]
         i += 1
         self.layout = self.detLayout(self.syncByte)
         if self.layout[1]:
             raise BinexError("Enhanced CRC records not yet supported")
-        if self.layout[2]: i = self.readForward(msg, i)
-        else: i = self.readBackward(msg, i)
+        if self.layout[2]: i = self.readForward(msg, i, start=start)
+        else: i = self.readBackward(msg, i, start=start)
         return i
 
     def returnBinary(self):
@@ -72,20 +73,24 @@ class Binex_Record:
     def decodeBlock(self, verbose=0):
         if self.message != None:
             self.subrecord = Binex_Subrecord_Block()
-            suc = self.subrecord.readBinex(self.message, verbose=verbose)
+            try:
+                suc = self.subrecord.readBinex(self.message, verbose=verbose)
+            except (IndexError, struct.error):
+                #Truncated message, e.g. of a record found at a false sync byte
+                return False
             return suc
         return False
 
-    def readForward(self, msg, i, readSimple=False):
+    def readForward(self, msg, i, readSimple=False, start=0):
         self.recordID, i = readUbnxi(msg, i, self.layout[3])
         self.length , i = readUbnxi(msg, i, self.layout[3])
-        if len(msg)<self.length+20:
+        if len(msg)-start<self.length+20:
             raise BinexError("Warn: Buffer ran out while reading message")
         if self.layout[1]:
             self.bitFlippedLen, i = readUbnxi(msg, i, self.layout[3])
         self.message, i = msg[i:i+self.length], i+self.length
         try:
-            self.parity, i = self.readCRC(msg, i, self.layout[3])
+            self.parity, i = self.readCRC(msg, i, self.layout[3], start)
         except IndexError:
             print("Index Error exception raised in utils_binex.py readForward function")
             #pass
@@ -94,9 +99,9 @@ class Binex_Record:
                 i += 1
         return i
 
-    def readBackward(self, msg, i):
+    def readBackward(self, msg, i, start=0):
         self.length_rev, i = readUbnxi(msg, i, self.layout[3])
-        if len(msg)<self.length_rev+20:
+        if len(msg)-start<self.length_rev+20:
             raise BinexError("Warn: Buffer ran out while reading message")
         fullMess, i =  msg[i:i+self.length_rev], i+self.length_rev
         msg_rev = fullMess[::-1]
@@ -120,8 +125,8 @@ class Binex_Record:
                 return 2
             return 16
 
-    def readCRC(self, msg, i=0, bigE=True):
-        l = i - 1
+    def readCRC(self, msg, i=0, bigE=True, start=0):
+        l = i - start - 1
         if l < 128:
             return msg[i], i+1
         elif not bigE:
@@ -198,10 +203,8 @@ class Binex_Subrecord_Block:
         return int(minutes*60+315964800+millis/1000)
 
     def timeOfWeek(self, minutes, millis):
-        bot = datetime.datetime(1980, 1, 6)
-        ms = datetime.timedelta(milliseconds=millis)
-        sSinceBot = datetime.timedelta(minutes=minutes)
-        t = bot + sSinceBot
-        w_begin = t - datetime.timedelta(t.weekday(), hours=t.hour, minutes=t.minute, seconds=t.second, microseconds=t.microsecond)
-        tow = (sSinceBot - (w_begin-bot)) + ms
-        return(tow.total_seconds())
+        # Integer form of the former datetime computation: the week begins on Monday (datetime.weekday()),
+        # the GPS epoch 1980-01-06 is a Sunday
+        days, mins = divmod(minutes, 1440)
+        secs = ((days+6) % 7)*86400 + mins*60
+        return (secs*10**6 + millis*1000) / 10**6
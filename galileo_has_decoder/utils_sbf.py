@@ -8,6 +8,7 @@ VER   DATE        AUTHOR
 '''
 
 import numpy as np
+from galileo_has_decoder.crc import CRC16CCITT
 LIMIT = 1025
 
 def splitStream(stream, x):
@@ -18,6 +19,13 @@ def splitStream(stream, x):
     split += [stream[i*pL:(i+1)*pL]]
   return split
 
+def crcValid(_crc, *parts):
+  #SBF block CRC (CRC-16-CCITT) over block ID, length and body, given as one or more byte strings
+  blockCRC = CRC16CCITT()
+  for part in parts:
+    blockCRC.update(part)
+  return blockCRC.value() == _crc
+
 def satNum(num):
   if num < 1:
     return -1
@@ -7,8 +7,9 @@ VER   DATE        AUTHOR
 1.0   09/12/2021  Oliver Horst / FGI
 '''
 
-from galileo_has_decoder.utils import bytes2bits, bytesFromList, splitStringBytes
+from galileo_has_decoder.utils import bytes2bits, bytesFromList, splitStringBytes, bits2Bytes
 import numpy as np
+import struct
 from reedsolo import RSCodec
 def construct32s(pages):
   words = {}
@@ -178,3 +179,144 @@ def constructHASmsg(content, verb=0, dataAvailable=False, sys="GAL"):
   if verb>=1:
     print(lens)
   return msg
+
+def encodePages(msg, pids):
+  #Encodes a HAS message (bit string or bytes, padded to whole 53 byte pages) into the pages with
+  #the page IDs pids (1-255), as the satellites broadcast them: the rows pids of the generator
+  #matrix times the message pages, in GF(256). Returns the pages (53 bytes each) and mSize.
+  from galileo_has_decoder.has_classes import HAS, genMatrix
+  if isinstance(msg, str):
+    msg = bits2Bytes(msg + "0"*(-len(msg) % 424))
+  msg = bytes(msg) + bytes(-len(msg) % 53)
+  mSize = len(msg)//53
+  rows = genMatrix()[[pid-1 for pid in pids], :mSize]
+  pages = HAS.backend.matmul(rows, np.frombuffer(msg, dtype="u1").reshape(mSize, 53))
+  return [bytes(page) for page in np.asarray(pages, dtype="u1")], mSize
+
+def constructCNAVPage(mid, pid, msize, page, status="00"):
+  #C/Nav page bits (492): reserved bits, HAS page header, 53 byte HAS page, CRC and tail (zeroed)
+  header = constructPageHeader(mid, pid, msize-1)
+  return "1"*14 + status + header[2:] + "".join(format(b, "08b") for b in page) + "0"*30
+
+def constructSBFBlock(blockID, body):
+  #SBF block with sync bytes, CRC, ID and length, the body padded to a multiple of 4 bytes
+  from galileo_has_decoder.crc import CRC16CCITT
+  body = bytes(body) + bytes(-(len(body)+8) % 4)
+  idlen = struct.pack("<HH", blockID, len(body)+8)
+  blockCRC = CRC16CCITT()
+  blockCRC.update(idlen + body)
+  return b"$@" + struct.pack("<H", blockCRC.value()) + idlen + body
+
+def constructSBF4024(navbits, tow, wnc, svid, source=16):
+  #GALRawCNAV (4024) block of a C/Nav page (bit string of 492 bits), tow in ms
+  navbits = navbits + "0"*(512-len(navbits))
+  words = [int(navbits[32*i:32*(i+1)], 2) for i in range(16)]
+  return constructSBFBlock(4024, struct.pack("<IHBBBBBB16I", tow, wnc, svid, 1, 0, source, 0, 0, *words))
+
+#Signals per system (0:GPS, 2:GAL) with a representation in both RTCM3 and IGS SSR
+TEST_SIGNALS = {0: [0, 7, 11, 6, 12, 9], 2: [0, 4, 7, 1, 3, 6, 12, 13]}
+
+def clockValue(rnd, dnu=0.0):
+  #Random 13 bit clock correction, "do not use" (4095) with probability dnu
+  if dnu > 0 and rnd.random() < dnu:
+    return 4095
+  return rnd.randint(-400, 400)
+
+def constructSSRmsg(sats, sigs=None, content="111111", toh=0, maskID=1, IODset=1, rnd=None, dnu=0.0):
+  #HAS MT1 message (bytes) with random corrections of plausible size for the satellites
+  #sats ({system ID: [PRNs]}) and signals sigs ({system ID: [signal IDs]}, default: first two of
+  #TEST_SIGNALS). content: flags of the blocks [mask, orbit, full clock, clock subset, code bias,
+  #phase bias]. Messages without mask (orbit) refer to maskID (IODset) of an earlier message.
+  #dnu: probability of a clock correction to be "do not use" (4095).
+  from galileo_has_decoder.utils import BitWriter
+  import random
+  rnd = rnd or random.Random()
+  systems = sorted(sats)
+  if sigs is None:
+    sigs = {sys: TEST_SIGNALS[sys][:2] for sys in systems}
+  msg = BitWriter()
+  msg.write_uint(toh, 12)
+  for flag in content:
+    msg.write_uint(int(flag), 1)
+  msg.write_zeros(4)
+  msg.write_uint(maskID, 5)
+  msg.write_uint(IODset, 5)
+  if content[0] == "1":
+    msg.write_uint(len(systems), 4)
+    for sys in systems:
+      msg.write_uint(sys, 4)
+      msg.write_uint(sum(1 << (40-prn) for prn in sats[sys]), 40)
+      msg.write_uint(sum(1 << (15-sig) for sig in sigs[sys]), 16)
+      msg.write_zeros(1+3) #No cell mask, nav message 0
+    msg.write_zeros(6)
+  if content[1] == "1":
+    msg.write_uint(rnd.randrange(16), 4)
+    for sys in systems:
+      for _prn in sats[sys]:
+        msg.write_uint(rnd.randrange(1 << (10 if sys == 2 else 8)), 10 if sys == 2 else 8)
+        msg.write_int(rnd.randint(-400, 400), 13)
+        msg.write_int(rnd.randint(-250, 250), 12)
+        msg.write_int(rnd.randint(-250, 250), 12)
+  if content[2] == "1":
+    msg.write_uint(rnd.randrange(16), 4)
+    for sys in systems:
+      msg.write_uint(0, 2) #Multiplier 1
+    for sys in systems:
+      for _prn in sats[sys]:
+        msg.write_int(clockValue(rnd, dnu), 13)
+  if content[3] == "1":
+    msg.write_uint(rnd.randrange(16), 4)
+    msg.write_uint(len(systems), 4)
+    for sys in systems:
+      msg.write_uint(sys, 4)
+      msg.write_uint(0, 2)
+      msg.write_uint((1 << len(sats[sys]))-1, len(sats[sys]))
+      for _prn in sats[sys]:
+        msg.write_int(clockValue(rnd, dnu), 13)
+  for flag, bits, limit in [(content[4], 0, 100), (content[5], 2, 50)]:
+    if flag == "1":
+      msg.write_uint(rnd.randrange(16), 4)
+      for sys in systems:
+        for _prn in sats[sys]:
+          for _sig in sigs[sys]:
+            msg.write_int(rnd.randint(-limit, limit), 11)
+            msg.write_uint(rnd.randrange(4), bits)
+  return msg.tobytes()
+
+def constructBinexCNAV(navbits, minutes, millis, prn):
+  #BINEX record 0x01, subrecord 0x44 of a Galileo C/Nav page (bit string of 492 bits) transmitted at
+  #minutes (since the GPS epoch) and millis, with the 1 byte checksum of short records
+  navbits = navbits + "0"*(496-len(navbits))
+  body = bytes([0x44]) + struct.pack(">IHBB", minutes, millis, prn, 0x20 | 21) + int(navbits, 2).to_bytes(62, "big")
+  record = bytes([0x01, len(body)]) + body
+  checksum = 0
+  for b in record:
+    checksum ^= b
+  return bytes([0xe2]) + record + bytes([checksum])
+
+def writeRecording(path, fmt="sbf", messages=40, seed=5, dnu=0.0):
+  #Recording of the load generator (fmt "sbf" or "binex") with the given number of HAS messages
+  from galileo_has_decoder.load_generator import HAS_Load_Generator, File_Output
+  out = File_Output(path)
+  HAS_Load_Generator(fmt, seed=seed, start=1000000, dnu=dnu).run(out, messages=messages, speed=0)
+  out.close()
+
+def resetSSRState():
+  #Mask and IOD state of SSR_HAS as at start-up, kept by the class over all conversions
+  from galileo_has_decoder.ssr_classes import SSR_HAS
+  SSR_HAS.HAS_MASKS[:] = None
+  SSR_HAS.HAS_IODs[:] = None
+
+def convertFile(source, target, outFormat, **kwargs):
+  #Converts source to target (modeOut 2) from the start-up SSR_HAS state, with printing suppressed.
+  #kwargs are passed to HAS_Converter. Returns the counts of convertAll and the output written.
+  import contextlib
+  import io
+  from galileo_has_decoder import conv
+  resetSSRState()
+  with contextlib.redirect_stdout(io.StringIO()):
+    converter = conv.HAS_Converter(source, target, outFormat, modeOut=2, mute=1, **kwargs)
+    counts = converter.convertAll(verbose=1)
+    converter.output.file.close()
+  with open(target, "rb") as f:
+    return counts, f.read()